@@ -1,10 +1,113 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Iterator
+from typing import Any, Iterator, Mapping, Optional, Sequence
+
+from relayserve.internal.codec import json_codec
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.pool import CONNECT_TIMEOUT_S, post_json
 
 
 class Backend(ABC):
+    # True if generate_batch sends all its prompts upstream in one call.
+    supports_batch = False
+
     @abstractmethod
-    def generate(self, prompt: str, stream: bool = False) -> str | Iterator[dict[str, Any]]:
+    def generate(
+        self,
+        prompt: str,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> str | Iterator[dict[str, Any]]:
+        """Generate a reply.
+
+        `timeout` (seconds left before the request's deadline) caps the
+        backend's own socket timeout; cancelling `cancel` aborts the upstream
+        response. `params` are the request's sampling fields (temperature,
+        max_tokens, ...; see keys.sampling_params), sent with the prompt.
+        """
         raise NotImplementedError
+
+    def generate_batch(
+        self,
+        prompts: Sequence[str],
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> list[Optional[str]]:
+        """One reply per prompt, in order, all sampled with `params`.
+
+        Backends with `supports_batch` send the prompts as one upstream call,
+        through the same chat template as generate; a prompt upstream left
+        without a reply is None. This default calls generate once per prompt.
+        """
+        return [
+            self.generate(prompt, stream=False, timeout=timeout, cancel=cancel, params=params)
+            for prompt in prompts
+        ]
+
+
+# Stands in for the prompt when a chat template is rendered once for reuse.
+TEMPLATE_SLOT = "RELAYSERVE_PROMPT_SLOT"
+
+
+def cap_timeout(default: float, timeout: Optional[float]) -> float:
+    return default if timeout is None else min(default, timeout)
+
+
+def chat_payload(
+    prompt: str, stream: bool, params: Optional[Mapping[str, Any]] = None
+) -> dict[str, Any]:
+    """An OpenAI-style chat completion request for one user prompt."""
+    return {
+        **(params or {}),
+        "model": "default",
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": stream,
+    }
+
+
+def split_template(rendered: str) -> tuple[str, str]:
+    """The text a chat template puts before and after a lone user message,
+    from that template rendered with TEMPLATE_SLOT as the message."""
+    before, slot, after = rendered.partition(TEMPLATE_SLOT)
+    if not slot:
+        raise ValueError("chat template dropped the user message")
+    return before, after
+
+
+def complete_batch(
+    base_url: str,
+    prompts: Sequence[str],
+    timeout: float,
+    cancel: Optional[CancelToken] = None,
+    connect_timeout: float = CONNECT_TIMEOUT_S,
+    params: Optional[Mapping[str, Any]] = None,
+) -> list[Optional[str]]:
+    """Complete several prompts in one OpenAI-style `/v1/completions` call
+    (a prompt list, as vLLM and llama.cpp's server accept), in prompt order.
+
+    The prompts go as given, so a chat request's must already be templated.
+    A prompt with no choice in the response gets None.
+    """
+    payload = {
+        # /v1/completions stops at 16 tokens by default on vLLM; null is "as
+        # many as the context allows", like /v1/chat/completions.
+        "max_tokens": None,
+        **(params or {}),
+        "model": "default",
+        "prompt": list(prompts),
+        "stream": False,
+    }
+    with post_json(f"{base_url}/v1/completions", payload, timeout, cancel, connect_timeout) as resp:
+        out = json_codec.loads(resp.read())
+    replies: list[Optional[str]] = [None] * len(prompts)
+    for position, choice in enumerate(out.get("choices") or []):
+        if not isinstance(choice, dict):
+            continue
+        index = choice.get("index", position)
+        if isinstance(index, int) and 0 <= index < len(replies):
+            replies[index] = str(choice.get("text") or "").strip()
+    return replies
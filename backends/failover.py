@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Iterator, Mapping, Optional, Sequence, Tuple, TypeVar
+
+from relayserve.internal.runner.breaker import CircuitBreaker
+from relayserve.internal.runner.cancel import CancelToken
+
+from .backend_interface import Backend
+
+T = TypeVar("T")
+
+
+class FailoverChain(Backend):
+    """Backends tried in order until one answers.
+
+    Each member has a circuit breaker (shared by every chain it is in): a
+    member whose breaker is open is skipped without a call, and every call's
+    outcome and latency feed its breaker. A stream fails over only until its
+    first chunk; after that an error ends it. All members share the caller's
+    timeout as one deadline. Raises ConnectionError if no member answered.
+    """
+
+    def __init__(self, members: Sequence[Tuple[str, Backend, CircuitBreaker]]) -> None:
+        self._members = list(members)
+
+    @property
+    def members(self) -> list[Tuple[str, Backend, CircuitBreaker]]:
+        return list(self._members)
+
+    @property
+    def names(self) -> list[str]:
+        return [name for name, _, _ in self._members]
+
+    @property
+    def supports_batch(self) -> bool:
+        return bool(self._members) and getattr(self._members[0][1], "supports_batch", False)
+
+    def generate(
+        self,
+        prompt: str,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> str | Iterator[dict[str, Any]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if stream:
+            return self._stream(prompt, deadline, cancel, params)
+        return self._first_answer(
+            lambda backend, remaining: backend.generate(
+                prompt, stream=False, timeout=remaining, cancel=cancel, params=params
+            ),
+            deadline,
+            cancel,
+        )
+
+    def generate_batch(
+        self,
+        prompts: Sequence[str],
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> list[Optional[str]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return self._first_answer(
+            lambda backend, remaining: backend.generate_batch(
+                prompts, timeout=remaining, cancel=cancel, params=params
+            ),
+            deadline,
+            cancel,
+        )
+
+    def _first_answer(
+        self,
+        call: Callable[[Backend, Optional[float]], T],
+        deadline: Optional[float],
+        cancel: Optional[CancelToken],
+    ) -> T:
+        error: Optional[Exception] = None
+        for name, backend, breaker in self._members:
+            remaining = _remaining(deadline)
+            if remaining is not None and remaining <= 0:
+                break
+            if not breaker.allow():
+                continue
+            started = time.monotonic()
+            try:
+                answer = call(backend, remaining)
+            except Exception as exc:
+                if cancel is not None and cancel.cancelled:
+                    breaker.record(None)
+                    raise
+                breaker.record(False)
+                error = exc
+                continue
+            breaker.record(True, time.monotonic() - started)
+            return answer
+        raise error or ConnectionError(f"no backend available in {self.names}")
+
+    def _stream(
+        self,
+        prompt: str,
+        deadline: Optional[float],
+        cancel: Optional[CancelToken],
+        params: Optional[Mapping[str, Any]],
+    ) -> Iterator[dict[str, Any]]:
+        error: Optional[Exception] = None
+        for name, backend, breaker in self._members:
+            remaining = _remaining(deadline)
+            if remaining is not None and remaining <= 0:
+                break
+            if not breaker.allow():
+                continue
+            call = _StreamCall(breaker)
+            try:
+                chunks = backend.generate(
+                    prompt, stream=True, timeout=remaining, cancel=cancel, params=params
+                )
+                for chunk in chunks:
+                    call.chunk()
+                    yield chunk
+                call.ok = True
+                return
+            except Exception as exc:
+                if cancel is not None and cancel.cancelled:
+                    raise
+                call.ok = False
+                if call.started:
+                    raise
+                error = exc
+            finally:
+                call.record()
+        raise error or ConnectionError(f"no backend available in {self.names}")
+
+
+class _StreamCall:
+    """One member's stream, recorded on its breaker once, when it ends.
+
+    The member is judged by its time to first chunk, not the reply length. A
+    stream that fails after its first chunk counts as failed; one closed by
+    the consumer or cancelled counts as good once a chunk has arrived, and
+    gets no verdict before that.
+    """
+
+    def __init__(self, breaker: CircuitBreaker) -> None:
+        self._breaker = breaker
+        self._started_at = time.monotonic()
+        self.first_chunk_s: Optional[float] = None
+        self.ok: Optional[bool] = None
+
+    @property
+    def started(self) -> bool:
+        return self.first_chunk_s is not None
+
+    def chunk(self) -> None:
+        if self.first_chunk_s is None:
+            self.first_chunk_s = time.monotonic() - self._started_at
+
+    def record(self) -> None:
+        ok = True if self.ok is None and self.started else self.ok
+        latency = self.first_chunk_s
+        if latency is None:
+            latency = time.monotonic() - self._started_at
+        self._breaker.record(ok, latency)
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.monotonic()
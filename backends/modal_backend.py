@@ -1,67 +1,88 @@
 from __future__ import annotations
 
-import json
-from typing import Any, Iterator
-from urllib import request
+from typing import Any, Iterator, Mapping, Optional
 
-from .backend_interface import Backend
+from relayserve.internal.codec import json_codec
+from relayserve.internal.codec.sse import iter_events
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.pool import CONNECT_TIMEOUT_S, post_json
+
+from .backend_interface import Backend, cap_timeout
 
 
 class ModalBackend(Backend):
-    def __init__(self, url: str, timeout: int = 120) -> None:
+    def __init__(
+        self, url: str, timeout: float = 120, connect_timeout: float = CONNECT_TIMEOUT_S
+    ) -> None:
         self._base_url = url.rstrip("/")
         self._timeout = timeout
+        self._connect_timeout = connect_timeout
 
-    def generate(self, prompt: str, stream: bool = False) -> str | Iterator[dict[str, Any]]:
+    def generate(
+        self,
+        prompt: str,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> str | Iterator[dict[str, Any]]:
+        timeout = cap_timeout(self._timeout, timeout)
         if stream:
-            return self._stream(prompt)
-        return self._sync(prompt)
+            return self._stream(_completion_payload(prompt, True, params), timeout, cancel)
+        return self._sync(_completion_payload(prompt, False, params), timeout, cancel)
 
-    def _sync(self, prompt: str) -> str:
+    def _sync(self, payload: dict, timeout: float, cancel: Optional[CancelToken]) -> str:
         url = f"{self._base_url}/completion"
-        payload = {"prompt": prompt, "stream": False}
-        data = json.dumps(payload).encode("utf-8")
-        req = request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-        with request.urlopen(req, timeout=self._timeout) as resp:
-            out = json.loads(resp.read().decode("utf-8"))
+        with post_json(url, payload, timeout, cancel, self._connect_timeout) as resp:
+            out = json_codec.loads(resp.read())
         return _text_from_response(out)
 
-    def _stream(self, prompt: str) -> Iterator[dict[str, Any]]:
+    def _stream(
+        self, payload: dict, timeout: float, cancel: Optional[CancelToken]
+    ) -> Iterator[dict[str, Any]]:
         url = f"{self._base_url}/completion"
-        payload = {"prompt": prompt, "stream": True}
-        data = json.dumps(payload).encode("utf-8")
-        req = request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-        with request.urlopen(req, timeout=self._timeout) as resp:
-            buffer = ""
-            while True:
-                chunk = resp.read(4096).decode("utf-8", errors="replace")
-                if not chunk:
-                    break
-                buffer += chunk
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-                    if line.startswith("data: "):
-                        part = line[6:].strip()
-                        if part == "[DONE]":
-                            return
-                        try:
-                            obj = json.loads(part)
-                            text = _text_from_response(obj)
-                            if text:
-                                yield {"content": text}
-                        except json.JSONDecodeError:
-                            pass
+        # Through the keep-alive pool, like every other sync upstream call.
+        with post_json(url, payload, timeout, cancel, self._connect_timeout) as resp:
+            for data in iter_events(resp.read1):
+                if data == b"[DONE]":
+                    resp.mark_complete()
+                    return
+                yield from _event_chunks(data)
+
+
+def _completion_payload(
+    prompt: str, stream: bool, params: Optional[Mapping[str, Any]]
+) -> dict[str, Any]:
+    # llama.cpp's native /completion calls max_tokens n_predict.
+    payload = dict(params or {})
+    if "max_tokens" in payload:
+        payload["n_predict"] = payload.pop("max_tokens")
+    payload.update(prompt=prompt, stream=stream)
+    return payload
+
+
+def _event_chunks(data: bytes) -> list[dict[str, Any]]:
+    """The content chunk in one SSE event of a completion stream, if any."""
+    try:
+        obj = json_codec.loads(data)
+    except json_codec.JSONDecodeError:
+        return []
+    text = _text_from_response(obj, strip=False)
+    return [{"content": text}] if text else []
 
 
-def _text_from_response(obj: dict) -> str:
+def _text_from_response(obj: dict, strip: bool = True) -> str:
+    # Stream pieces keep their whitespace: a token may be just " " or "\n".
     if "content" in obj:
-        return str(obj["content"] or "").strip()
+        text = str(obj["content"] or "")
+        return text.strip() if strip else text
     for choice in obj.get("choices") or []:
         if not isinstance(choice, dict):
             continue
         msg = choice.get("message") or choice.get("delta") or {}
-        text = (msg.get("content") or msg.get("text") or "").strip()
+        text = msg.get("content") or msg.get("text") or ""
+        if strip:
+            text = text.strip()
         if text:
             return text
     return ""
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from typing import Any, Iterator, Mapping, Optional, Sequence
+
+from relayserve.internal.runner.affinity import AffinityRing, prefix_key
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.hedge import Hedger
+
+from .backend_interface import Backend
+
+
+class ReplicaSet(Backend):
+    """One configured backend served by several identical replicas.
+
+    Each request goes to a replica chosen by prefix affinity (AffinityRing),
+    so prompts sharing a prefix reuse that replica's prompt cache. With a
+    Hedger a slow request (or a stream slow to its first chunk) is also sent
+    to another replica and the first answer wins.
+    """
+
+    def __init__(
+        self,
+        replicas: dict[str, Backend],
+        load_factor: float = 1.25,
+        prefix_tokens: int = 64,
+        hedger: Optional[Hedger] = None,
+        stream_hedger: Optional[Hedger] = None,
+    ) -> None:
+        self._replicas = replicas
+        self._ring = AffinityRing(list(replicas), load_factor)
+        self._prefix_tokens = prefix_tokens
+        self._hedger = hedger
+        self._stream_hedger = stream_hedger
+
+    def generate(
+        self,
+        prompt: str,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> str | Iterator[dict[str, Any]]:
+        if stream:
+            return self._stream(prompt, timeout, cancel, params)
+        if self._hedger is None:
+            return self._generate_on(prompt, timeout, cancel, [], params)
+        return self._hedger.run(
+            lambda token, tried: self._generate_on(prompt, timeout, token, tried, params), cancel
+        )
+
+    @property
+    def supports_batch(self) -> bool:
+        return all(replica.supports_batch for replica in self._replicas.values())
+
+    def generate_batch(
+        self,
+        prompts: Sequence[str],
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> list[Optional[str]]:
+        # The whole batch goes to the replica its first prompt has affinity with.
+        key = prefix_key(prompts[0], self._prefix_tokens) if prompts else ""
+        with self._ring.lease(key) as url:
+            return self._replicas[url].generate_batch(
+                prompts, timeout=timeout, cancel=cancel, params=params
+            )
+
+    def affinity_report(self) -> dict:
+        return self._ring.report()
+
+    def hedge_report(self) -> dict:
+        return {
+            name: hedger.report()
+            for name, hedger in (("generate", self._hedger), ("stream", self._stream_hedger))
+            if hedger is not None
+        }
+
+    def _generate_on(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        cancel: Optional[CancelToken],
+        tried: list[str],
+        params: Optional[Mapping[str, Any]],
+    ) -> str:
+        with self._ring.lease(prefix_key(prompt, self._prefix_tokens), exclude=tried) as url:
+            if url is None:
+                raise ConnectionError("no replica left to try")
+            tried.append(url)
+            return self._replicas[url].generate(
+                prompt, stream=False, timeout=timeout, cancel=cancel, params=params
+            )
+
+    def _stream(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        cancel: Optional[CancelToken],
+        params: Optional[Mapping[str, Any]],
+    ) -> Iterator[dict[str, Any]]:
+        if self._stream_hedger is None:
+            yield from self._stream_on(prompt, timeout, cancel, [], params)
+            return
+
+        def open_stream(token: CancelToken, tried: list[str]):
+            chunks = self._stream_on(prompt, timeout, token, tried, params)
+            return next(chunks, None), chunks
+
+        first, chunks = self._stream_hedger.run(
+            open_stream, cancel, discard=lambda opened: opened[1].close()
+        )
+        try:
+            if first is None:
+                return
+            yield first
+            yield from chunks
+        finally:
+            chunks.close()
+
+    def _stream_on(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        cancel: Optional[CancelToken],
+        tried: list[str],
+        params: Optional[Mapping[str, Any]],
+    ) -> Iterator[dict[str, Any]]:
+        # The lease is held until the stream is exhausted or closed.
+        with self._ring.lease(prefix_key(prompt, self._prefix_tokens), exclude=tried) as url:
+            if url is None:
+                raise ConnectionError("no replica left to try")
+            tried.append(url)
+            yield from self._replicas[url].generate(
+                prompt, stream=True, timeout=timeout, cancel=cancel, params=params
+            )
@@ -1,59 +1,112 @@
 from __future__ import annotations
 
-import json
-from typing import Any, Iterator
-from urllib import request
+from typing import Any, Iterator, Mapping, Optional, Sequence
 
-from .backend_interface import Backend
+from relayserve.internal.codec import json_codec
+from relayserve.internal.codec.sse import iter_events
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.pool import CONNECT_TIMEOUT_S, post_json
+
+from .backend_interface import (
+    TEMPLATE_SLOT,
+    Backend,
+    cap_timeout,
+    chat_payload,
+    complete_batch,
+    split_template,
+)
 
 
 class VllmBackend(Backend):
-    def __init__(self, url: str, timeout: int = 120) -> None:
+    supports_batch = True
+
+    def __init__(
+        self, url: str, timeout: float = 120, connect_timeout: float = CONNECT_TIMEOUT_S
+    ) -> None:
         self._base_url = url.rstrip("/")
         self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        # The chat template around one user message, fetched on the first batch.
+        self._template: Optional[tuple[str, str]] = None
 
-    def generate(self, prompt: str, stream: bool = False) -> str | Iterator[dict[str, Any]]:
+    def generate(
+        self,
+        prompt: str,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> str | Iterator[dict[str, Any]]:
+        timeout = cap_timeout(self._timeout, timeout)
         if stream:
-            return self._stream(prompt)
-        return self._sync(prompt)
+            return self._stream(chat_payload(prompt, True, params), timeout, cancel)
+        return self._sync(chat_payload(prompt, False, params), timeout, cancel)
+
+    def generate_batch(
+        self,
+        prompts: Sequence[str],
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> list[Optional[str]]:
+        timeout = cap_timeout(self._timeout, timeout)
+        before, after = self._chat_template(timeout, cancel)
+        templated = [before + prompt + after for prompt in prompts]
+        # The template already carries the special tokens (BOS and the like).
+        params = {**(params or {}), "add_special_tokens": False}
+        return complete_batch(
+            self._base_url, templated, timeout, cancel, self._connect_timeout, params
+        )
 
-    def _sync(self, prompt: str) -> str:
+    def _chat_template(self, timeout: float, cancel: Optional[CancelToken]) -> tuple[str, str]:
+        # vLLM renders a chat only as tokens (/tokenize); /detokenize turns them back into text.
+        if self._template is None:
+            messages = [{"role": "user", "content": TEMPLATE_SLOT}]
+            payload = {"model": "default", "messages": messages, "add_generation_prompt": True}
+            with post_json(
+                f"{self._base_url}/tokenize", payload, timeout, cancel, self._connect_timeout
+            ) as resp:
+                tokens = json_codec.loads(resp.read()).get("tokens") or []
+            payload = {"model": "default", "tokens": tokens}
+            with post_json(
+                f"{self._base_url}/detokenize", payload, timeout, cancel, self._connect_timeout
+            ) as resp:
+                rendered = json_codec.loads(resp.read()).get("prompt")
+            self._template = split_template(str(rendered or ""))
+        return self._template
+
+    def _sync(self, payload: dict, timeout: float, cancel: Optional[CancelToken]) -> str:
         url = f"{self._base_url}/v1/chat/completions"
-        payload = {"model": "default", "messages": [{"role": "user", "content": prompt}], "stream": False}
-        data = json.dumps(payload).encode("utf-8")
-        req = request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-        with request.urlopen(req, timeout=self._timeout) as resp:
-            out = json.loads(resp.read().decode("utf-8"))
+        with post_json(url, payload, timeout, cancel, self._connect_timeout) as resp:
+            out = json_codec.loads(resp.read())
         choices = out.get("choices") or []
         if not choices:
             return ""
         msg = (choices[0] or {}).get("message") or {}
         return str(msg.get("content") or "").strip()
 
-    def _stream(self, prompt: str) -> Iterator[dict[str, Any]]:
+    def _stream(
+        self, payload: dict, timeout: float, cancel: Optional[CancelToken]
+    ) -> Iterator[dict[str, Any]]:
         url = f"{self._base_url}/v1/chat/completions"
-        payload = {"model": "default", "messages": [{"role": "user", "content": prompt}], "stream": True}
-        data = json.dumps(payload).encode("utf-8")
-        req = request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
-        with request.urlopen(req, timeout=self._timeout) as resp:
-            buffer = ""
-            while True:
-                chunk = resp.read(4096).decode("utf-8", errors="replace")
-                if not chunk:
-                    break
-                buffer += chunk
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-                    if line.startswith("data: "):
-                        part = line[6:].strip()
-                        if part == "[DONE]":
-                            return
-                        try:
-                            obj = json.loads(part)
-                            for c in obj.get("choices") or []:
-                                content = (c.get("delta") or {}).get("content") or ""
-                                if content:
-                                    yield {"content": content}
-                        except json.JSONDecodeError:
-                            pass
+        # Through the keep-alive pool, like every other sync upstream call.
+        with post_json(url, payload, timeout, cancel, self._connect_timeout) as resp:
+            for data in iter_events(resp.read1):
+                if data == b"[DONE]":
+                    resp.mark_complete()
+                    return
+                yield from _event_chunks(data)
+
+
+def _event_chunks(data: bytes) -> list[dict[str, Any]]:
+    """The content chunks in one SSE event of a chat completion stream."""
+    try:
+        obj = json_codec.loads(data)
+    except json_codec.JSONDecodeError:
+        return []
+    chunks = []
+    for c in obj.get("choices") or []:
+        content = (c.get("delta") or {}).get("content") or ""
+        if content:
+            chunks.append({"content": content})
+    return chunks
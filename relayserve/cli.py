@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import argparse
+import dataclasses
 import os
 import sys
+from typing import Optional, Sequence
 
 # Ensure RelayServe root is on path so router and backends can be imported
 def _relay_serve_root() -> str:
@@ -12,7 +15,19 @@ def _relay_serve_root() -> str:
     return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
-def main() -> None:
+def _parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="relayserve")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of server processes sharing the port (overrides RELAYSERVE_WORKERS)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = _parse_args(argv)
     root = _relay_serve_root()
     if root not in sys.path:
         sys.path.insert(0, root)
@@ -22,5 +37,12 @@ def main() -> None:
     from relayserve.internal.server.http_server import run_server
 
     settings = Settings.from_env()
+    if args.workers is not None:
+        settings = dataclasses.replace(settings, workers=args.workers)
+    if settings.workers > 1:
+        from relayserve.internal.server.workers import run_workers
+
+        run_workers(settings)
+        return
     app = build_app(settings)
     run_server(settings, app)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from relayserve.internal.codec import json_codec
+
+# Disk-tier housekeeping (expired rows, size cap) runs once per this many writes.
+_DISK_SWEEP_EVERY = 64
+
+
+class ResponseCache:
+    """Two-tier cache of deterministic completions.
+
+    The memory tier is an LRU bounded by the bytes of its keys and values; the
+    optional disk tier is a sqlite database that survives restarts (and is
+    shared by worker processes). Every entry expires ttl_s after it was stored.
+    get() looks in memory, then on disk, promoting disk hits into memory;
+    put() writes through to both tiers. Values are JSON-serializable dicts.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_s: float,
+        path: str = "",
+        disk_max_bytes: int = 0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._max_bytes = max(0, max_bytes)
+        self._ttl_s = ttl_s
+        self._disk_max_bytes = max(0, disk_max_bytes)
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Serializes use of the sqlite connection; never held with _lock.
+        self._db_lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = _open_db(path)
+        self._writes = 0
+        self._stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+    @property
+    def on_disk(self) -> bool:
+        return self._db is not None
+
+    def get(self, key: str) -> Optional[Tuple[dict, str]]:
+        """(value, tier) for a live entry, tier being "memory" or "disk"; None on a miss."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+            elif entry is not None:
+                self._drop(key)
+                self._stats["expirations"] += 1
+                entry = None
+        if entry is not None:
+            return json_codec.loads(entry[1]), "memory"
+        # The disk tier is read outside the memory lock, so memory hits never
+        # wait on sqlite.
+        row = self._disk_get(key, now)
+        with self._lock:
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            expires, data = row
+            self._remember(key, expires, data)
+            self._stats["disk_hits"] += 1
+        return json_codec.loads(data), "disk"
+
+    def put(self, key: str, value: dict) -> None:
+        data = json_codec.dumps(value)
+        now = self._clock()
+        expires = now + self._ttl_s
+        with self._lock:
+            self._remember(key, expires, data)
+        self._disk_put(key, expires, data, now)
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            hits = stats["memory_hits"] + stats["disk_hits"]
+            stats.update(
+                {
+                    "hit_ratio": hits / lookups if lookups else 0.0,
+                    "miss_ratio": stats["misses"] / lookups if lookups else 0.0,
+                    "entries": len(self._entries),
+                    "bytes": self._bytes,
+                    "max_bytes": self._max_bytes,
+                    "disk": self._db is not None,
+                }
+            )
+            return stats
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, expires: float, data: bytes) -> None:
+        size = len(key) + len(data)
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (expires, data)
+        self._bytes += size
+        while self._bytes > self._max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def _drop(self, key: str) -> None:
+        _, data = self._entries.pop(key)
+        self._bytes -= len(key) + len(data)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, bytes]]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT expires, value FROM responses WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+            except sqlite3.Error:
+                self._count("disk_errors")
+                return None
+        if row is None:
+            return None
+        return row[0], bytes(row[1])
+
+    def _disk_put(self, key: str, expires: float, data: bytes, now: float) -> None:
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, expires, stored, size)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (key, data, expires, now, len(key) + len(data)),
+                    )
+                self._writes += 1
+                if self._writes % _DISK_SWEEP_EVERY == 0:
+                    self._disk_sweep(now)
+            except sqlite3.Error:
+                self._count("disk_errors")
+
+    def _disk_sweep(self, now: float) -> None:
+        """Delete expired rows, then the oldest ones while over disk_max_bytes."""
+        with self._db:
+            removed = self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,)).rowcount
+            if self._disk_max_bytes > 0:
+                (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+                excess = total - self._disk_max_bytes
+                if excess > 0:
+                    # Oldest first, until at least `excess` bytes are gone.
+                    cursor = self._db.execute(
+                        "DELETE FROM responses WHERE key IN (SELECT key FROM (SELECT key, size,"
+                        " SUM(size) OVER (ORDER BY stored, key) AS running FROM responses)"
+                        " WHERE running - size < ?)",
+                        (excess,),
+                    )
+                    removed += cursor.rowcount
+        self._count("disk_evictions", max(0, removed))
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[stat] += amount
+
+
+def _open_db(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL,"
+        " stored REAL NOT NULL, size INTEGER NOT NULL)"
+    )
+    db.commit()
+    return db
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Callable, Union
+
+# Same class every decoder raises here, so callers keep catching one type.
+JSONDecodeError = json.JSONDecodeError
+
+
+def _stdlib_dumps(obj: Any, pretty: bool = False) -> bytes:
+    if pretty:
+        return json.dumps(obj, indent=2).encode("utf-8")
+    return json.dumps(obj).encode("utf-8")
+
+
+def _stdlib_loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    if not isinstance(data, str):
+        try:
+            data = bytes(data).decode("utf-8")
+        except UnicodeDecodeError as exc:
+            raise JSONDecodeError(str(exc), "", 0) from exc
+    return json.loads(data)
+
+
+def _load_orjson() -> tuple[Callable[..., bytes], Callable[[Any], Any]]:
+    import orjson
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+        except TypeError:
+            # Non-str keys, oversized ints and the like: let stdlib handle them.
+            return _stdlib_dumps(obj, pretty)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        # orjson.JSONDecodeError already subclasses json.JSONDecodeError.
+        return orjson.loads(data)
+
+    return dumps, loads
+
+
+def _load_ujson() -> tuple[Callable[..., bytes], Callable[[Any], Any]]:
+    import ujson
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        try:
+            return ujson.dumps(obj, indent=2 if pretty else 0, ensure_ascii=False).encode("utf-8")
+        except (TypeError, OverflowError):
+            return _stdlib_dumps(obj, pretty)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        try:
+            return ujson.loads(data)
+        except ValueError as exc:
+            raise JSONDecodeError(str(exc), "", 0) from exc
+
+    return dumps, loads
+
+
+def _select() -> tuple[str, Callable[..., bytes], Callable[[Any], Any]]:
+    preferred = os.getenv("RELAYSERVE_JSON_CODEC", "auto").strip().lower()
+    loaders = {"orjson": _load_orjson, "ujson": _load_ujson}
+    candidates = list(loaders) if preferred == "auto" else [preferred]
+    for name in candidates:
+        loader = loaders.get(name)
+        if loader is None:
+            continue
+        try:
+            dumps, loads = loader()
+        except ImportError:
+            continue
+        return name, dumps, loads
+    return "json", _stdlib_dumps, _stdlib_loads
+
+
+CODEC_NAME, _dumps, _loads = _select()
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """Encode obj as UTF-8 JSON bytes with the fastest available codec."""
+    return _dumps(obj, pretty)
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON from bytes or str, raising JSONDecodeError on bad input."""
+    return _loads(data)
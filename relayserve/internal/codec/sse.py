@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from typing import Callable, Iterator, List, Union
+
+Chunk = Union[bytes, bytearray, memoryview]
+
+# Bytes asked of the upstream per read; read1 returns whatever has arrived.
+READ_SIZE = 65536
+
+# Consumed bytes are dropped from the front of the buffer once they make up at
+# least this much of it, so the copy is paid at most once per byte.
+_COMPACT_MIN = 4096
+
+
+class SSEDecoder:
+    """Incremental text/event-stream parser.
+
+    Bytes are appended to one bytearray and scanned for line ends from where
+    the previous scan stopped, so a line split over many reads is searched
+    once and copied once. Lines are split on LF (with an optional CR before
+    it); as LF never occurs inside a multi-byte UTF-8 sequence, a character
+    split across reads is always reassembled before anything is decoded.
+
+    feed() returns the data of each completed event, as raw UTF-8 bytes ready
+    for a JSON parser. Per the spec, the data lines of one event are joined
+    with LF, a single space after "data:" is dropped, comment lines and other
+    fields are ignored, and events with no data are not dispatched.
+    """
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._pos = 0  # start of the first unconsumed line
+        self._scan = 0  # where the search for the next LF resumes
+        self._data: List[bytes] = []
+        self._has_data = False
+
+    def feed(self, chunk: Chunk) -> List[bytes]:
+        buf = self._buf
+        buf += chunk
+        events: List[bytes] = []
+        pos = self._pos
+        while True:
+            end = buf.find(b"\n", self._scan)
+            if end < 0:
+                self._scan = len(buf)
+                break
+            line_end = end - 1 if end > pos and buf[end - 1] == 0x0D else end
+            event = self._line(buf, pos, line_end)
+            if event is not None:
+                events.append(event)
+            pos = self._scan = end + 1
+        if pos >= _COMPACT_MIN and pos * 2 >= len(buf):
+            del buf[:pos]
+            self._scan -= pos
+            pos = 0
+        self._pos = pos
+        return events
+
+    def finish(self) -> List[bytes]:
+        """End of stream: dispatch a final event the server left unterminated.
+
+        Stricter than the spec, which discards it, since upstreams that close
+        right after their last data line should not lose it.
+        """
+        events: List[bytes] = []
+        if self._pos < len(self._buf):
+            end = len(self._buf)
+            if self._buf[end - 1] == 0x0D:
+                end -= 1
+            self._line(self._buf, self._pos, end)
+        if self._has_data:
+            events.append(self._dispatch())
+        self._buf.clear()
+        self._pos = self._scan = 0
+        return events
+
+    def _line(self, buf: bytearray, start: int, end: int) -> bytes | None:
+        if start == end:
+            return self._dispatch() if self._has_data else None
+        view = memoryview(buf)
+        try:
+            line = view[start:end]
+            if line[0] == 0x3A:  # ":" starts a comment
+                return None
+            if line[:5] != b"data:":
+                # "data" with no colon is a data line with an empty value.
+                if line == b"data":
+                    self._append(b"")
+                return None
+            value_start = 6 if end - start > 5 and line[5] == 0x20 else 5
+            self._append(line[value_start:].tobytes())
+            return None
+        finally:
+            view.release()
+
+    def _append(self, value: bytes) -> None:
+        self._data.append(value)
+        self._has_data = True
+
+    def _dispatch(self) -> bytes:
+        data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+        self._data = []
+        self._has_data = False
+        return data
+
+
+def iter_events(read: Callable[[int], bytes], size: int = READ_SIZE) -> Iterator[bytes]:
+    """Yield event data from a byte source as soon as each event completes.
+
+    `read` should return what has arrived so far (e.g. a response's read1),
+    and b"" at the end of the stream.
+    """
+    decoder = SSEDecoder()
+    while True:
+        chunk = read(size)
+        if not chunk:
+            break
+        yield from decoder.feed(chunk)
+    yield from decoder.finish()
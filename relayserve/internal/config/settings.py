@@ -15,6 +15,43 @@ class Settings:
     total_layers: int
     pretty_json: bool
     pretty_default: bool
+    server_mode: str = "threaded"
+    keepalive_timeout_s: float = 5.0
+    max_keepalive_requests: int = 1000
+    sse_flush_ms: float = 10.0
+    sse_max_frame_bytes: int = 16384
+    workers: int = 1
+    max_body_bytes: int = 1048576
+    max_queue_depth: int = 512
+    max_queued_tokens: int = 0
+    drain_timeout_s: float = 30.0
+    admin_token: str = ""
+    lane_concurrency: int = 4
+    stream_concurrency: int = 512
+    stream_buffer_events: int = 64
+    batch_policy: str = "adaptive"
+    batch_slo_ms: float = 50.0
+    batch_max_size: int = 32
+    tenant_header: str = "X-Tenant-ID"
+    tenants: str = ""
+    tenant_tokens_per_minute: int = 0
+    request_timeout_ms: float = 120000.0
+    device_probe_interval_s: float = 30.0
+    coalesce: bool = True
+    cache_max_bytes: int = 67108864
+    cache_ttl_s: float = 3600.0
+    cache_path: str = ""
+    cache_disk_max_bytes: int = 1073741824
+    affinity_load_factor: float = 1.25
+    affinity_prefix_tokens: int = 64
+    lb_policy: str = "affinity"
+    health_check_interval_s: float = 5.0
+    eject_failures: int = 3
+    eject_s: float = 10.0
+    readmit_ramp_s: float = 30.0
+    hedge: bool = False
+    hedge_percentile: float = 95.0
+    hedge_budget: float = 0.05
 
     @staticmethod
     def from_env() -> "Settings":
@@ -28,6 +65,43 @@ class Settings:
         total_layers = int(os.getenv("RELAYSERVE_TOTAL_LAYERS", "32"))
         pretty_json = os.getenv("RELAYSERVE_PRETTY_JSON", "0") == "1"
         pretty_default = os.getenv("RELAYSERVE_PRETTY_DEFAULT", "1") == "1"
+        server_mode = os.getenv("RELAYSERVE_SERVER_MODE", "threaded").strip().lower()
+        keepalive_timeout_s = float(os.getenv("RELAYSERVE_KEEPALIVE_TIMEOUT_S", "5"))
+        max_keepalive_requests = int(os.getenv("RELAYSERVE_MAX_KEEPALIVE_REQUESTS", "1000"))
+        sse_flush_ms = float(os.getenv("RELAYSERVE_SSE_FLUSH_MS", "10"))
+        sse_max_frame_bytes = int(os.getenv("RELAYSERVE_SSE_MAX_FRAME_BYTES", "16384"))
+        workers = int(os.getenv("RELAYSERVE_WORKERS", "1"))
+        max_body_bytes = int(os.getenv("RELAYSERVE_MAX_BODY_BYTES", "1048576"))
+        max_queue_depth = int(os.getenv("RELAYSERVE_MAX_QUEUE_DEPTH", "512"))
+        max_queued_tokens = int(os.getenv("RELAYSERVE_MAX_QUEUED_TOKENS", "0"))
+        drain_timeout_s = float(os.getenv("RELAYSERVE_DRAIN_TIMEOUT_S", "30"))
+        admin_token = os.getenv("RELAYSERVE_ADMIN_TOKEN", "").strip()
+        lane_concurrency = int(os.getenv("RELAYSERVE_LANE_CONCURRENCY", "4"))
+        stream_concurrency = int(os.getenv("RELAYSERVE_STREAM_CONCURRENCY", "512"))
+        stream_buffer_events = int(os.getenv("RELAYSERVE_STREAM_BUFFER_EVENTS", "64"))
+        batch_policy = os.getenv("RELAYSERVE_BATCH_POLICY", "adaptive").strip().lower()
+        batch_slo_ms = float(os.getenv("RELAYSERVE_BATCH_SLO_MS", "50"))
+        batch_max_size = int(os.getenv("RELAYSERVE_BATCH_MAX_SIZE", "32"))
+        tenant_header = os.getenv("RELAYSERVE_TENANT_HEADER", "X-Tenant-ID").strip()
+        tenants = os.getenv("RELAYSERVE_TENANTS", "").strip()
+        tenant_tokens_per_minute = int(os.getenv("RELAYSERVE_TENANT_TOKENS_PER_MINUTE", "0"))
+        request_timeout_ms = float(os.getenv("RELAYSERVE_REQUEST_TIMEOUT_MS", "120000"))
+        device_probe_interval_s = float(os.getenv("RELAYSERVE_DEVICE_PROBE_INTERVAL_S", "30"))
+        coalesce = os.getenv("RELAYSERVE_COALESCE", "1") == "1"
+        cache_max_bytes = int(os.getenv("RELAYSERVE_CACHE_MAX_BYTES", "67108864"))
+        cache_ttl_s = float(os.getenv("RELAYSERVE_CACHE_TTL_S", "3600"))
+        cache_path = os.getenv("RELAYSERVE_CACHE_PATH", "").strip()
+        cache_disk_max_bytes = int(os.getenv("RELAYSERVE_CACHE_DISK_MAX_BYTES", "1073741824"))
+        affinity_load_factor = float(os.getenv("RELAYSERVE_AFFINITY_LOAD_FACTOR", "1.25"))
+        affinity_prefix_tokens = int(os.getenv("RELAYSERVE_AFFINITY_PREFIX_TOKENS", "64"))
+        lb_policy = os.getenv("RELAYSERVE_LB_POLICY", "affinity").strip().lower()
+        health_check_interval_s = float(os.getenv("RELAYSERVE_HEALTH_CHECK_INTERVAL_S", "5"))
+        eject_failures = int(os.getenv("RELAYSERVE_EJECT_FAILURES", "3"))
+        eject_s = float(os.getenv("RELAYSERVE_EJECT_S", "10"))
+        readmit_ramp_s = float(os.getenv("RELAYSERVE_READMIT_RAMP_S", "30"))
+        hedge = os.getenv("RELAYSERVE_HEDGE", "0") == "1"
+        hedge_percentile = float(os.getenv("RELAYSERVE_HEDGE_PERCENTILE", "95"))
+        hedge_budget = float(os.getenv("RELAYSERVE_HEDGE_BUDGET", "0.05"))
         return Settings(
             port=port,
             model_id=model_id,
@@ -38,4 +112,41 @@ class Settings:
             total_layers=total_layers,
             pretty_json=pretty_json,
             pretty_default=pretty_default,
+            server_mode=server_mode,
+            keepalive_timeout_s=keepalive_timeout_s,
+            max_keepalive_requests=max_keepalive_requests,
+            sse_flush_ms=sse_flush_ms,
+            sse_max_frame_bytes=sse_max_frame_bytes,
+            workers=workers,
+            max_body_bytes=max_body_bytes,
+            max_queue_depth=max_queue_depth,
+            max_queued_tokens=max_queued_tokens,
+            drain_timeout_s=drain_timeout_s,
+            admin_token=admin_token,
+            lane_concurrency=lane_concurrency,
+            stream_concurrency=stream_concurrency,
+            stream_buffer_events=stream_buffer_events,
+            batch_policy=batch_policy,
+            batch_slo_ms=batch_slo_ms,
+            batch_max_size=batch_max_size,
+            tenant_header=tenant_header,
+            tenants=tenants,
+            tenant_tokens_per_minute=tenant_tokens_per_minute,
+            request_timeout_ms=request_timeout_ms,
+            device_probe_interval_s=device_probe_interval_s,
+            coalesce=coalesce,
+            cache_max_bytes=cache_max_bytes,
+            cache_ttl_s=cache_ttl_s,
+            cache_path=cache_path,
+            cache_disk_max_bytes=cache_disk_max_bytes,
+            affinity_load_factor=affinity_load_factor,
+            affinity_prefix_tokens=affinity_prefix_tokens,
+            lb_policy=lb_policy,
+            health_check_interval_s=health_check_interval_s,
+            eject_failures=eject_failures,
+            eject_s=eject_s,
+            readmit_ramp_s=readmit_ramp_s,
+            hedge=hedge,
+            hedge_percentile=hedge_percentile,
+            hedge_budget=hedge_budget,
         )
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Iterable, List, Optional
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -18,17 +19,98 @@ class Device:
 
 
 class DeviceRegistry:
+    """The devices requests can be placed on, with a version that changes with them.
+
+    The version goes up whenever the device set changes, so callers can cache
+    anything derived from it (shard plans, the best device) and recompute only
+    when the topology moves.
+    """
+
     def __init__(self) -> None:
-        self._devices: List[Device] = []
+        self._lock = threading.Lock()
+        self._devices: Tuple[Device, ...] = ()
+        self._best: Optional[Device] = None
+        self.version = 0
 
     def add_all(self, devices: Iterable[Device]) -> None:
-        for device in devices:
-            self._devices.append(device)
+        with self._lock:
+            self._set(self._devices + tuple(devices))
+
+    def replace(self, devices: Iterable[Device]) -> bool:
+        """Swap in a freshly probed device set; False (no new version) if unchanged."""
+        devices = tuple(devices)
+        with self._lock:
+            if devices == self._devices:
+                return False
+            self._set(devices)
+            return True
 
     def list(self) -> List[Device]:
         return list(self._devices)
 
+    def snapshot(self) -> Tuple[int, Tuple[Device, ...]]:
+        """The current version and the devices it refers to, read together."""
+        with self._lock:
+            return self.version, self._devices
+
     def best_device(self) -> Optional[Device]:
-        if not self._devices:
-            return None
-        return max(self._devices, key=lambda d: d.strength_score)
+        return self._best
+
+    def _set(self, devices: Tuple[Device, ...]) -> None:
+        self._devices = devices
+        self._best = max(devices, key=lambda d: d.strength_score) if devices else None
+        self.version += 1
+
+
+class RegistryRefresher:
+    """Re-probes devices every interval_s on a daemon thread.
+
+    GPUs that appear or disappear change the registry (and its version); a
+    failed probe keeps the devices already known.
+    """
+
+    def __init__(
+        self,
+        registry: DeviceRegistry,
+        probe: Callable[[], Iterable[Device]],
+        interval_s: float,
+    ) -> None:
+        self._registry = registry
+        self._probe = probe
+        self._interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.probes = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        if self._interval_s <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="device-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def refresh(self) -> bool:
+        """Probe once now; True if the device set changed."""
+        self.probes += 1
+        try:
+            devices = list(self._probe())
+        except Exception:
+            self.failures += 1
+            return False
+        return self._registry.replace(devices)
+
+    def report(self) -> dict:
+        return {
+            "version": self._registry.version,
+            "count": len(self._registry.list()),
+            "probe_interval_s": self._interval_s,
+            "probes": self.probes,
+            "probe_failures": self.failures,
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval_s):
+            self.refresh()
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List
+import threading
+from typing import Dict, List, Tuple
 
 
 @dataclass(frozen=True)
@@ -18,23 +19,38 @@ class MetricsCollector:
     def __init__(self, max_items: int = 1000) -> None:
         self._items: List[RequestMetrics] = []
         self._max_items = max_items
+        self._totals: Dict[str, float] = {"count": 0, "ttft_ms": 0.0, "queue_ms": 0.0, "tokens": 0}
+        # Lane workers record concurrently.
+        self._lock = threading.Lock()
 
     def record(self, metrics: RequestMetrics) -> None:
-        self._items.append(metrics)
-        if len(self._items) > self._max_items:
-            self._items = self._items[-self._max_items :]
+        with self._lock:
+            self._items.append(metrics)
+            if len(self._items) > self._max_items:
+                self._items = self._items[-self._max_items :]
+            self._totals["count"] += 1
+            self._totals["ttft_ms"] += metrics.ttft_ms
+            self._totals["queue_ms"] += metrics.queue_ms
+            self._totals["tokens"] += metrics.tokens
+
+    def totals(self) -> Dict[str, float]:
+        """Lifetime sums, unaffected by the max_items window."""
+        with self._lock:
+            return dict(self._totals)
 
     def snapshot(self) -> List[RequestMetrics]:
-        return list(self._items)
+        with self._lock:
+            return list(self._items)
 
     def report(self) -> Dict[str, object]:
-        if not self._items:
+        items = self.snapshot()
+        if not items:
             return {"count": 0, "avg_ttft_ms": 0.0, "avg_queue_ms": 0.0, "by_device": {}}
 
-        total_ttft = sum(item.ttft_ms for item in self._items)
-        total_queue = sum(item.queue_ms for item in self._items)
+        total_ttft = sum(item.ttft_ms for item in items)
+        total_queue = sum(item.queue_ms for item in items)
         by_device: Dict[str, Dict[str, float]] = {}
-        for item in self._items:
+        for item in items:
             bucket = by_device.setdefault(
                 item.device,
                 {"count": 0, "avg_ttft_ms": 0.0, "avg_queue_ms": 0.0},
@@ -48,10 +64,51 @@ class MetricsCollector:
             bucket["avg_ttft_ms"] /= count
             bucket["avg_queue_ms"] /= count
 
-        count = len(self._items)
+        count = len(items)
         return {
             "count": count,
             "avg_ttft_ms": total_ttft / count,
             "avg_queue_ms": total_queue / count,
             "by_device": by_device,
         }
+
+
+class StreamLatencyCollector:
+    """Time to first token of relayed streams, split into upstream and relay parts.
+
+    upstream_ttfb_ms runs from sending the upstream request to its first event;
+    relay_ttft_ms from accepting the client request to handing that event on.
+    The difference, relay_added_ms, is what queueing and relaying cost.
+    """
+
+    def __init__(self, max_items: int = 1000) -> None:
+        self._items: List[Tuple[float, float]] = []
+        self._max_items = max_items
+        self._lock = threading.Lock()
+
+    def record(self, upstream_ttfb_ms: float, relay_ttft_ms: float) -> None:
+        with self._lock:
+            self._items.append((upstream_ttfb_ms, relay_ttft_ms))
+            if len(self._items) > self._max_items:
+                self._items = self._items[-self._max_items :]
+
+    def report(self) -> Dict[str, float]:
+        with self._lock:
+            items = list(self._items)
+        if not items:
+            return {
+                "count": 0,
+                "avg_upstream_ttfb_ms": 0.0,
+                "avg_relay_ttft_ms": 0.0,
+                "avg_relay_added_ms": 0.0,
+                "max_relay_added_ms": 0.0,
+            }
+        count = len(items)
+        added = [relay - upstream for upstream, relay in items]
+        return {
+            "count": count,
+            "avg_upstream_ttfb_ms": sum(upstream for upstream, _ in items) / count,
+            "avg_relay_ttft_ms": sum(relay for _, relay in items) / count,
+            "avg_relay_added_ms": sum(added) / count,
+            "max_relay_added_ms": max(added),
+        }
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, List, Mapping
+
+_FIELDS = (
+    "pid",
+    "count",
+    "ttft_ms",
+    "queue_ms",
+    "tokens",
+    "queue_depth",
+    "kv_cached_tokens",
+    "kv_resident_bytes",
+    "kv_handoffs",
+    "kv_offloads",
+)
+# Each slot is a sequence counter followed by one double per field. The counter
+# is odd while its worker is writing, so readers retry instead of mixing values.
+_SEQ = struct.Struct("Q")
+_VALUES = struct.Struct("%dd" % len(_FIELDS))
+_SLOT_SIZE = _SEQ.size + _VALUES.size
+
+
+class SharedMetrics:
+    """Per-worker metric slots in an anonymous shared mapping.
+
+    Create it in the parent before forking; each worker calls ``bind`` with its
+    index and then only writes its own slot, while any worker can read all of
+    them to report the fleet-wide view.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self._workers = max(1, workers)
+        self._map = mmap.mmap(-1, self._workers * _SLOT_SIZE)
+        self._index = 0
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def bind(self, index: int) -> None:
+        if not 0 <= index < self._workers:
+            raise ValueError(f"worker index {index} out of range")
+        self._index = index
+        self.publish({"pid": os.getpid()})
+
+    def publish(self, values: Mapping[str, float]) -> None:
+        """Overwrite the given fields in this worker's slot."""
+        offset = self._index * _SLOT_SIZE
+        with self._lock:
+            (seq,) = _SEQ.unpack_from(self._map, offset)
+            current = dict(zip(_FIELDS, _VALUES.unpack_from(self._map, offset + _SEQ.size)))
+            current.update({key: float(value) for key, value in values.items() if key in current})
+            current["pid"] = float(os.getpid())
+            _SEQ.pack_into(self._map, offset, seq + 1)
+            _VALUES.pack_into(self._map, offset + _SEQ.size, *(current[key] for key in _FIELDS))
+            _SEQ.pack_into(self._map, offset, seq + 2)
+
+    def slots(self) -> List[Dict[str, float]]:
+        return [self._read_slot(index) for index in range(self._workers)]
+
+    def report(self) -> Dict[str, object]:
+        slots = self.slots()
+        count = sum(slot["count"] for slot in slots)
+        return {
+            "workers": self._workers,
+            "count": int(count),
+            "avg_ttft_ms": sum(slot["ttft_ms"] for slot in slots) / count if count else 0.0,
+            "avg_queue_ms": sum(slot["queue_ms"] for slot in slots) / count if count else 0.0,
+            "tokens": int(sum(slot["tokens"] for slot in slots)),
+            "queue_depth": int(sum(slot["queue_depth"] for slot in slots)),
+            "kv": {
+                "cached_tokens": int(sum(slot["kv_cached_tokens"] for slot in slots)),
+                "resident_bytes": int(sum(slot["kv_resident_bytes"] for slot in slots)),
+                "handoffs": int(sum(slot["kv_handoffs"] for slot in slots)),
+                "offloads": int(sum(slot["kv_offloads"] for slot in slots)),
+            },
+            "by_worker": [
+                {"worker": index, "pid": int(slot["pid"]), "count": int(slot["count"])}
+                for index, slot in enumerate(slots)
+            ],
+        }
+
+    def _read_slot(self, index: int) -> Dict[str, float]:
+        offset = index * _SLOT_SIZE
+        while True:
+            (before,) = _SEQ.unpack_from(self._map, offset)
+            values = _VALUES.unpack_from(self._map, offset + _SEQ.size)
+            (after,) = _SEQ.unpack_from(self._map, offset)
+            if before == after and not before & 1:
+                return dict(zip(_FIELDS, values))
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from collections import deque
+import math
+import threading
+import time
+from typing import Callable, Deque, Dict, Tuple
+
+# Departures older than this no longer count toward the drain rate.
+_DRAIN_WINDOW_S = 10.0
+_MIN_RETRY_AFTER_S = 1
+_MAX_RETRY_AFTER_S = 60
+
+
+class OverloadedError(Exception):
+    """Raised when a request is shed instead of queued."""
+
+    def __init__(self, reason: str, retry_after_s: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionController:
+    """Caps queued work by request count and estimated tokens.
+
+    Requests are admitted while both caps have room and shed otherwise, with a
+    Retry-After computed from how fast the queue has drained recently. A limit
+    of 0 disables that cap.
+    """
+
+    def __init__(
+        self,
+        max_depth: int = 0,
+        max_tokens: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_depth = max(0, max_depth)
+        self._max_tokens = max(0, max_tokens)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._tokens = 0
+        self._departures: Deque[Tuple[float, int]] = deque()
+        self._departed_tokens = 0
+        self._admitted = 0
+        self._shed: Dict[str, int] = {"queue_depth": 0, "queued_tokens": 0}
+
+    def admit(self, tokens: int) -> None:
+        """Reserve queue room for a request or raise OverloadedError."""
+        with self._lock:
+            if self._max_depth and self._depth + 1 > self._max_depth:
+                self._shed["queue_depth"] += 1
+                raise OverloadedError("queue_depth", self._retry_after(self._depth, tokens=False))
+            # A single request larger than the cap is still admitted into an
+            # empty queue, otherwise it could never run.
+            if self._max_tokens and self._depth and self._tokens + tokens > self._max_tokens:
+                self._shed["queued_tokens"] += 1
+                raise OverloadedError("queued_tokens", self._retry_after(self._tokens, tokens=True))
+            self._depth += 1
+            self._tokens += tokens
+            self._admitted += 1
+
+    def release(self, tokens: int) -> None:
+        """Return the room held by a request once it leaves the queue."""
+        now = self._clock()
+        with self._lock:
+            self._depth = max(0, self._depth - 1)
+            self._tokens = max(0, self._tokens - tokens)
+            self._departures.append((now, tokens))
+            self._departed_tokens += tokens
+            self._trim(now)
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            self._trim(self._clock())
+            requests_per_s, tokens_per_s = self._drain_rates()
+            return {
+                "queued": self._depth,
+                "queued_tokens": self._tokens,
+                "max_depth": self._max_depth,
+                "max_tokens": self._max_tokens,
+                "admitted": self._admitted,
+                "shed": sum(self._shed.values()),
+                "shed_by_reason": dict(self._shed),
+                "drain_rps": requests_per_s,
+                "drain_tps": tokens_per_s,
+            }
+
+    def _retry_after(self, backlog: int, tokens: bool) -> int:
+        """Seconds for the current backlog to drain at the recent departure rate."""
+        self._trim(self._clock())
+        requests_per_s, tokens_per_s = self._drain_rates()
+        rate = tokens_per_s if tokens else requests_per_s
+        if rate <= 0:
+            return _MIN_RETRY_AFTER_S
+        seconds = math.ceil(backlog / rate)
+        return max(_MIN_RETRY_AFTER_S, min(_MAX_RETRY_AFTER_S, seconds))
+
+    def _drain_rates(self) -> Tuple[float, float]:
+        if not self._departures:
+            return 0.0, 0.0
+        span = max(self._clock() - self._departures[0][0], 1.0)
+        return len(self._departures) / span, self._departed_tokens / span
+
+    def _trim(self, now: float) -> None:
+        while self._departures and now - self._departures[0][0] > _DRAIN_WINDOW_S:
+            _, tokens = self._departures.popleft()
+            self._departed_tokens -= tokens
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Weight of the newest sample in the arrival-gap and service-time averages.
+_EWMA_ALPHA = 0.2
+
+
+class FixedBatching:
+    """Always gather up to batch_size requests within batch_wait_s."""
+
+    name = "fixed"
+
+    def __init__(self, batch_size: int = 1, batch_wait_s: float = 0.0) -> None:
+        self._batch_size = max(1, batch_size)
+        self._batch_wait_s = max(0.0, batch_wait_s)
+        self._service_s: Optional[float] = None
+
+    @property
+    def service_s(self) -> float:
+        """Average time to serve one request, 0 until a batch has been observed."""
+        return self._service_s or 0.0
+
+    def observe_arrival(self) -> None:
+        pass
+
+    def observe_batch(self, size: int, duration_s: float) -> None:
+        if size > 0:
+            self._service_s = _ewma(self._service_s, duration_s / size)
+
+    def plan(self, queued: int, inflight: int = 0) -> Tuple[int, float]:
+        return self._batch_size, self._batch_wait_s
+
+    def report(self) -> Dict[str, object]:
+        return {
+            "policy": self.name,
+            "batch_size": self._batch_size,
+            "window_ms": self._batch_wait_s * 1000.0,
+        }
+
+
+class AdaptiveBatching:
+    """Sizes the batch and wait window from the arrival rate and service time.
+
+    Both are tracked as EWMAs. Requests in a batch run back to back, so the
+    batch is capped at what fits in the queue-delay SLO given the per-request
+    service time, and never above max_batch_size. The window waits only as
+    long as it takes the expected arrivals to fill the batch, never past what
+    is left of the SLO or the time the lane's in-flight requests still need
+    (waiting on an idle upstream only adds latency), and not at all when no
+    arrival is expected in time — at low traffic requests go out immediately
+    and a deep queue is taken in one large batch.
+
+    With `batches_upstream` False (a backend that gets one prompt per call)
+    a batch buys nothing: every plan is one request, sent at once, so the
+    lane's other workers serve the rest in parallel.
+    """
+
+    name = "adaptive"
+
+    def __init__(
+        self,
+        slo_s: float,
+        max_batch_size: int,
+        clock: Callable[[], float] = time.perf_counter,
+        batches_upstream: bool = True,
+    ) -> None:
+        self._slo_s = max(0.0, slo_s)
+        self._max_batch_size = max(1, max_batch_size) if batches_upstream else 1
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_arrival: Optional[float] = None
+        self._gap_s: Optional[float] = None
+        self._service_s: Optional[float] = None
+        self._batch_size = 1
+        self._window_s = 0.0
+
+    @property
+    def service_s(self) -> float:
+        """Average time to serve one request, 0 until a batch has been observed."""
+        return self._service_s or 0.0
+
+    def observe_arrival(self) -> None:
+        now = self._clock()
+        with self._lock:
+            if self._last_arrival is not None:
+                self._gap_s = _ewma(self._gap_s, now - self._last_arrival)
+            self._last_arrival = now
+
+    def observe_batch(self, size: int, duration_s: float) -> None:
+        if size <= 0:
+            return
+        with self._lock:
+            self._service_s = _ewma(self._service_s, duration_s / size)
+
+    def plan(self, queued: int, inflight: int = 0) -> Tuple[int, float]:
+        """Return (batch size, wait window in seconds) given `queued` waiting
+        requests and `inflight` ones the lane is still serving."""
+        with self._lock:
+            rate = self._arrival_rate()
+            service_s = self._service_s or 0.0
+            size = self._max_batch_size
+            if service_s > 0:
+                size = max(1, min(size, int(self._slo_s / service_s)))
+            window = 0.0
+            if queued < size and rate > 0:
+                # Time for the missing requests to arrive, bounded by the SLO
+                # left over once the batch itself has been served and by how
+                # long the upstream stays busy with the work in flight.
+                budget = min(self._slo_s - (size - 1) * service_s, inflight * service_s)
+                window = max(0.0, min((size - queued) / rate, budget))
+                if rate * window < 1.0:
+                    window = 0.0
+            self._batch_size, self._window_s = size, window
+            return size, window
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            rate = self._arrival_rate()
+            return {
+                "policy": self.name,
+                "batch_size": self._batch_size,
+                "window_ms": self._window_s * 1000.0,
+                "slo_ms": self._slo_s * 1000.0,
+                "max_batch_size": self._max_batch_size,
+                "arrival_rps": rate,
+                "service_ms": (self._service_s or 0.0) * 1000.0,
+            }
+
+    def _arrival_rate(self) -> float:
+        if self._gap_s is None or self._last_arrival is None:
+            return 0.0
+        # A long silence counts as a gap already, so the rate decays while idle.
+        gap = max(self._gap_s, self._clock() - self._last_arrival)
+        return 1.0 / gap if gap > 0 else math.inf
+
+
+def _ewma(current: Optional[float], sample: float) -> float:
+    if current is None:
+        return sample
+    return current + _EWMA_ALPHA * (sample - current)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from collections import deque
+from queue import Empty
+import threading
+from typing import Any, Callable, Deque, Iterator, List, Optional
+
+# Returned by StreamChannel.get once the producer has finished and the buffer is empty.
+END = object()
+
+
+class StreamChannel:
+    """Bounded hand-off of stream events from a dispatch lane to one client.
+
+    The producer (a lane worker relaying an upstream stream) blocks in put()
+    while `maxsize` events are waiting, so a slow client slows its upstream
+    read instead of buffering without limit. The consumer calls cancel() when
+    it stops reading (always safe, e.g. in a finally), which unblocks the
+    producer and makes later put() calls return False; if the stream had not
+    finished, the on_cancel callbacks run so the request can be dropped or its
+    upstream aborted. A maxsize of 0 or less means no bound.
+    """
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self._maxsize = maxsize
+        self._items: Deque[Any] = deque()
+        self._cond = threading.Condition()
+        self._finished = False
+        self._cancelled = False
+        self._waiter: Optional[Callable[[], None]] = None
+        self._on_cancel: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def set_waiter(self, waiter: Optional[Callable[[], None]]) -> None:
+        """Call `waiter` from the producer thread whenever an event or the end arrives."""
+        self._waiter = waiter
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        self._on_cancel.append(callback)
+
+    def put(self, event: Any) -> bool:
+        """Queue an event, waiting for room; False once the consumer has cancelled."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._cancelled or self._maxsize <= 0 or len(self._items) < self._maxsize
+            )
+            if self._cancelled:
+                return False
+            self._items.append(event)
+            self._cond.notify_all()
+        self._wake()
+        return True
+
+    def finish(self) -> None:
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+        self._wake()
+
+    def cancel(self) -> None:
+        with self._cond:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            abandoned = not self._finished
+            self._items.clear()
+            self._cond.notify_all()
+        if abandoned:
+            for callback in self._on_cancel:
+                callback()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Return the next event, or END after finish(); raise Empty on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._finished, timeout):
+                raise Empty
+            if not self._items:
+                return END
+            event = self._items.popleft()
+            self._cond.notify_all()
+            return event
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            event = self.get()
+            if event is END:
+                return
+            yield event
+
+    def _wake(self) -> None:
+        waiter = self._waiter
+        if waiter is not None:
+            waiter()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from relayserve.internal.queue.batching import AdaptiveBatching, FixedBatching
+from relayserve.internal.queue.queue import DEFAULT_TENANT, RequestQueue
+
+BatchPolicy = Union[AdaptiveBatching, FixedBatching]
+
+
+class DispatchLane:
+    """A queue with its own pool of workers for one backend or model.
+
+    The queue is a weighted fair RequestQueue over tenants (`weight` gives
+    each tenant's share). Each of the `concurrency` workers takes the next
+    request, gathers more
+    into a batch as sized by the batching `policy` and hands the batch to
+    `process`. A slow upstream therefore only backs up its own lane. Items for
+    which `batchable` returns False (streams, which hold a worker for their
+    whole life) are dispatched on their own. Items must carry a `future`; if
+    `process` raises, every unfinished future in the batch gets the exception
+    instead of the worker dying.
+
+    Workers are started as queued items need them, up to `concurrency`, so a
+    lane with a high limit (such as a stream lane) costs no idle threads.
+
+    Items whose future was cancelled while queued are skipped, and items that
+    can no longer finish before their deadline (given the lane's average
+    service time) are failed before they reach the backend; both are handed to
+    `discard` with the reason instead of `process`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[List[Any]], None],
+        concurrency: int = 1,
+        policy: Optional[BatchPolicy] = None,
+        batchable: Optional[Callable[[Any], bool]] = None,
+        weight: Optional[Callable[[str], float]] = None,
+        deadline: Optional[Callable[[Any], Optional[float]]] = None,
+        discard: Optional[Callable[[Any, str], None]] = None,
+    ) -> None:
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self._process = process
+        self.policy = policy or FixedBatching()
+        self._batchable = batchable or (lambda item: True)
+        self._queue = RequestQueue(weight)
+        self._deadline = deadline or (lambda item: None)
+        self._discard = discard or (lambda item, reason: None)
+        self._ready = threading.Condition()
+        self._lock = threading.Lock()
+        self._active = 0
+        # Requests in the batches being processed.
+        self._inflight = 0
+        self._batches = 0
+        self._requests = 0
+        # Guarded by _ready: workers started, and those waiting for an item.
+        self._workers = 0
+        self._waiting = 0
+
+    def put(
+        self,
+        item: Any,
+        tenant: str = DEFAULT_TENANT,
+        cost: float = 1.0,
+        over_budget: bool = False,
+    ) -> None:
+        if self._batchable(item):
+            self.policy.observe_arrival()
+        with self._ready:
+            self._queue.enqueue(item, tenant, cost, over_budget, self._deadline(item))
+            self._ready.notify()
+            if len(self._queue) > self._waiting and self._workers < self.concurrency:
+                self._workers += 1
+                threading.Thread(
+                    target=self._run_loop,
+                    name=f"relay-lane-{self.name}-{self._workers - 1}",
+                    daemon=True,
+                ).start()
+
+    def remove(self, item: Any, tenant: str = DEFAULT_TENANT) -> bool:
+        """Take a still-queued item out of the lane; False if a worker already has it."""
+        with self._ready:
+            return self._queue.remove(item, tenant)
+
+    def qsize(self) -> int:
+        return len(self._queue)
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "queued": len(self._queue),
+                "active": self._active,
+                "concurrency": self.concurrency,
+                "batches": self._batches,
+                "requests": self._requests,
+                "batching": self.policy.report(),
+            }
+
+    def _run_loop(self) -> None:
+        while True:
+            batch = self._live(self._next_batch())
+            if not batch:
+                continue
+            with self._lock:
+                self._active += 1
+                self._inflight += len(batch)
+                self._batches += 1
+                self._requests += len(batch)
+            started = time.perf_counter()
+            try:
+                self._process(batch)
+                if self._batchable(batch[0]):
+                    self.policy.observe_batch(len(batch), time.perf_counter() - started)
+            except Exception as exc:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(exc)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._inflight -= len(batch)
+
+    def _live(self, batch: List[Any]) -> List[Any]:
+        live = []
+        now = time.perf_counter()
+        for item in batch:
+            # Marks the future running, so it can no longer be cancelled.
+            if not item.future.set_running_or_notify_cancel():
+                self._discard(item, "cancelled")
+                continue
+            deadline = self._deadline(item)
+            if deadline is not None and now + self.policy.service_s > deadline:
+                self._discard(item, "deadline")
+                continue
+            live.append(item)
+        return live
+
+    def _next_batch(self) -> List[Any]:
+        with self._ready:
+            self._waiting += 1
+            try:
+                self._ready.wait_for(lambda: len(self._queue))
+            finally:
+                self._waiting -= 1
+            batch = [self._queue.dequeue()]
+            if not self._batchable(batch[0]):
+                return batch
+            with self._lock:
+                inflight = self._inflight
+            size, wait_s = self.policy.plan(len(self._queue) + 1, inflight)
+            deadline = time.perf_counter() + wait_s
+            while len(batch) < size:
+                # Requests that queued up while the workers were busy join the
+                # batch without waiting; only an empty queue waits out the window.
+                head = self._queue.peek()
+                if head is not None:
+                    if not self._batchable(head):
+                        # Leave it for an idle worker rather than this batch.
+                        self._ready.notify()
+                        break
+                    batch.append(self._queue.dequeue())
+                    continue
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0 or not self._ready.wait(timeout):
+                    break
+            return batch
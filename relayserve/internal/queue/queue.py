@@ -1,20 +1,117 @@
 from __future__ import annotations
 
 from collections import deque
-from typing import Deque, Optional
+import heapq
+import itertools
+import math
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+DEFAULT_TENANT = "default"
 
 
 class RequestQueue:
-    def __init__(self) -> None:
-        self._items: Deque[dict] = deque()
+    """Weighted fair queue over tenants.
+
+    Each tenant has its own queue. An item's finish tag is the later of the
+    queue's virtual time and the tenant's previous tag, plus cost / weight;
+    dequeue serves the head with the smallest tag and advances virtual time to
+    it (self-clocked fair queuing). A tenant sending twice the tokens therefore
+    waits twice as long, whatever its arrival order. Items enqueued over their
+    tenant's budget are only served when no in-budget item is waiting.
+
+    Within a tenant, items go out earliest deadline first (items without one
+    last, in arrival order); the tenant's tags stay in arrival order, so
+    deadlines reorder a tenant's own work without taking from other tenants.
+    Not thread-safe; callers hold their own lock.
+    """
 
-    def enqueue(self, item: dict) -> None:
-        self._items.append(item)
+    def __init__(self, weight: Optional[Callable[[str], float]] = None) -> None:
+        self._weight = weight or (lambda tenant: 1.0)
+        self._tags: Dict[str, Deque[Tuple[bool, float]]] = {}
+        self._items: Dict[str, List[Tuple[float, int, Any, Tuple[bool, float]]]] = {}
+        self._last_tag: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._size = 0
 
-    def dequeue(self) -> Optional[dict]:
-        if not self._items:
+    def enqueue(
+        self,
+        item: Any,
+        tenant: str = DEFAULT_TENANT,
+        cost: float = 1.0,
+        over_budget: bool = False,
+        deadline: Optional[float] = None,
+    ) -> None:
+        weight = max(self._weight(tenant), 1e-6)
+        start = max(self._virtual_time, self._last_tag.get(tenant, 0.0))
+        tag = start + max(cost, 0.0) / weight
+        self._last_tag[tenant] = tag
+        mark = (over_budget, tag)
+        self._tags.setdefault(tenant, deque()).append(mark)
+        key = math.inf if deadline is None else deadline
+        heapq.heappush(self._items.setdefault(tenant, []), (key, next(self._sequence), item, mark))
+        self._size += 1
+
+    def peek(self) -> Optional[Any]:
+        tenant = self._next_tenant()
+        if tenant is None:
             return None
-        return self._items.popleft()
+        return self._items[tenant][0][2]
+
+    def dequeue(self) -> Optional[Any]:
+        tenant = self._next_tenant()
+        if tenant is None:
+            return None
+        tags = self._tags[tenant]
+        _, tag = tags.popleft()
+        _, _, item, _ = heapq.heappop(self._items[tenant])
+        self._size -= 1
+        self._virtual_time = max(self._virtual_time, tag)
+        if not tags:
+            del self._tags[tenant]
+            del self._items[tenant]
+            if self._last_tag.get(tenant, 0.0) <= self._virtual_time:
+                del self._last_tag[tenant]
+        return item
+
+    def remove(self, item: Any, tenant: str = DEFAULT_TENANT) -> bool:
+        """Drop a queued item (e.g. its client went away); False if it is not queued."""
+        items = self._items.get(tenant)
+        if not items:
+            return False
+        for index, entry in enumerate(items):
+            if entry[2] is item:
+                break
+        else:
+            return False
+        mark = entry[3]
+        items[index] = items[-1]
+        items.pop()
+        heapq.heapify(items)
+        # The item gives up its own tag, with its budget flag; the rest of the
+        # tenant's queue keeps its place.
+        tags = self._tags[tenant]
+        tags.remove(mark)
+        self._size -= 1
+        if not items:
+            del self._tags[tenant]
+            del self._items[tenant]
+            self._last_tag.pop(tenant, None)
+        elif mark[1] == self._last_tag.get(tenant):
+            self._last_tag[tenant] = tags[-1][1]
+        return True
+
+    def depths(self) -> Dict[str, int]:
+        return {tenant: len(tags) for tenant, tags in self._tags.items()}
 
     def __len__(self) -> int:
-        return len(self._items)
+        return self._size
+
+    def _next_tenant(self) -> Optional[str]:
+        best: Optional[Tuple[bool, float]] = None
+        chosen = None
+        for tenant, tags in self._tags.items():
+            over_budget, tag = tags[0]
+            if best is None or (over_budget, tag) < best:
+                best, chosen = (over_budget, tag), tenant
+        return chosen
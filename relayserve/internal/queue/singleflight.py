@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, InvalidStateError
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from relayserve.internal.queue.channel import StreamChannel
+
+
+class Broadcast:
+    """Fans one stream out to every subscribed channel.
+
+    To the producer it looks like a StreamChannel: put() and finish() reach
+    every subscriber, put() returns False once all of them have cancelled, and
+    the on_cancel callbacks then run. A late subscriber is first replayed the
+    events sent so far. Subscriber channels are unbounded, so a slow client
+    never holds up the others; each keeps at most one reply's worth of events.
+    Dict events are re-addressed to each subscriber's request id.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._history: List[Any] = []
+        self._subscribers: List[Tuple[StreamChannel, str]] = []
+        self._finished = False
+        self._cancelled = False
+        self._on_cancel: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def subscribe(self, request_id: str) -> Optional[StreamChannel]:
+        """A channel carrying the stream from its start; None once it has ended."""
+        channel = StreamChannel(0)
+        with self._lock:
+            if self._finished or self._cancelled:
+                return None
+            for event in self._history:
+                channel.put(_addressed(event, request_id))
+            self._subscribers.append((channel, request_id))
+        channel.on_cancel(lambda: self._leave(channel))
+        return channel
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        self._on_cancel.append(callback)
+
+    def put(self, event: Any) -> bool:
+        with self._lock:
+            if self._cancelled:
+                return False
+            self._history.append(event)
+            for channel, request_id in self._subscribers:
+                channel.put(_addressed(event, request_id))
+        return True
+
+    def finish(self) -> None:
+        with self._lock:
+            self._finished = True
+            subscribers = list(self._subscribers)
+        for channel, _ in subscribers:
+            channel.finish()
+
+    def _leave(self, channel: StreamChannel) -> None:
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[0] is not channel]
+            if self._subscribers or self._finished or self._cancelled:
+                return
+            self._cancelled = True
+            self._history.clear()
+        for callback in self._on_cancel:
+            callback()
+
+
+class _Flight:
+    def __init__(self, key: str, source: Future) -> None:
+        self.key = key
+        self.source = source
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Shares one upstream call among identical requests that overlap in time.
+
+    The first request with a key (the leader) starts the call; requests with
+    the same key arriving before it completes (followers) attach to it instead
+    of making their own. Every caller, the leader included, gets its own future
+    (or stream channel), so one caller giving up does not fail the rest: see
+    release(). Keys must only be given for deterministic requests.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._flights: Dict[str, _Flight] = {}
+        self._views: Dict[Future, _Flight] = {}
+        self._streams: Dict[str, Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def join(self, key: str, start: Callable[[], Future]) -> Future:
+        """A future for the shared call under `key`, starting it with start() if needed."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = _Flight(key, start())
+                self._flights[key] = flight
+                flight.source.add_done_callback(lambda _: self._retire(flight))
+                self.leaders += 1
+            else:
+                self.followers += 1
+            view: Future = Future()
+            flight.waiters += 1
+            self._views[view] = flight
+        flight.source.add_done_callback(lambda source: self._settle(view, source, leader))
+        return view
+
+    def join_stream(
+        self, key: str, request_id: str, start: Callable[[Broadcast], Future]
+    ) -> StreamChannel:
+        """A channel for the shared stream under `key`, starting it into a Broadcast if needed."""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            channel = broadcast.subscribe(request_id) if broadcast is not None else None
+            if channel is not None:
+                self.followers += 1
+                return channel
+            broadcast = Broadcast()
+            channel = broadcast.subscribe(request_id)
+            source = start(broadcast)
+            self._streams[key] = broadcast
+            self.leaders += 1
+        source.add_done_callback(lambda _: self._retire_stream(key, broadcast))
+        return channel
+
+    def release(self, future: Future) -> Optional[Future]:
+        """Detach a caller that gave up, returning the future whose work should be
+        abandoned: `future` itself if it is not shared, the shared call once no
+        one else waits on it, otherwise None."""
+        with self._lock:
+            flight = self._views.pop(future, None)
+            if flight is None:
+                return future
+            flight.waiters -= 1
+            orphaned = flight.waiters == 0
+            if orphaned:
+                self._retire(flight)
+        future.cancel()
+        return flight.source if orphaned else None
+
+    def report(self) -> Dict[str, object]:
+        with self._lock:
+            total = self.leaders + self.followers
+            return {
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "rate": self.followers / total if total else 0.0,
+                "in_flight": len(self._flights) + len(self._streams),
+            }
+
+    def _settle(self, view: Future, source: Future, leader: bool) -> None:
+        with self._lock:
+            self._views.pop(view, None)
+        try:
+            if source.cancelled():
+                view.cancel()
+            elif source.exception() is not None:
+                view.set_exception(source.exception())
+            else:
+                view.set_result(source.result() if leader else _follower_result(source.result()))
+        except InvalidStateError:
+            # The caller cancelled its view in the meantime.
+            pass
+
+    def _retire(self, flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def _retire_stream(self, key: str, broadcast: Broadcast) -> None:
+        with self._lock:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+
+def _addressed(event: Any, request_id: str) -> Any:
+    if isinstance(event, dict) and event.get("id") not in (None, request_id):
+        return {**event, "id": request_id}
+    return event
+
+
+def _follower_result(result: Any) -> Any:
+    if not isinstance(result, dict):
+        return result
+    return {**result, "meta": {**result.get("meta", {}), "coalesced": True}}
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional
+
+from relayserve.internal.queue.queue import DEFAULT_TENANT
+
+# Stats are kept for at most this many tenants; the rest share one bucket so a
+# client inventing tenant ids cannot grow the table without bound.
+_MAX_TRACKED_TENANTS = 1024
+_OVERFLOW_TENANT = "other"
+
+
+@dataclass
+class TenantConfig:
+    weight: float = 1.0
+    tokens_per_minute: int = 0
+
+
+@dataclass
+class _TenantState:
+    config: TenantConfig
+    tokens: float
+    refilled_at: float
+    queued: int = 0
+    completed: int = 0
+    over_budget: int = 0
+    queue_ms: float = 0.0
+    ttft_ms: float = 0.0
+
+
+class TenantPolicy:
+    """Weights, token budgets and stats for the tenants sharing the queues.
+
+    Tenants come from RELAYSERVE_TENANTS as comma-separated
+    name:weight[:tokens_per_minute] entries; anyone else gets weight 1 and
+    the default budget. A budget is a token bucket refilled at
+    tokens_per_minute / 60 per second (0 means unlimited); requests that find
+    it empty are still queued but marked over budget, so they only use
+    capacity no in-budget tenant is waiting for.
+    """
+
+    def __init__(
+        self,
+        tenants: Optional[Dict[str, TenantConfig]] = None,
+        default_tokens_per_minute: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._configs = dict(tenants or {})
+        self._default = TenantConfig(tokens_per_minute=max(0, default_tokens_per_minute))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._states: Dict[str, _TenantState] = {}
+
+    @classmethod
+    def from_spec(
+        cls, spec: str, default_tokens_per_minute: int = 0
+    ) -> "TenantPolicy":
+        tenants: Dict[str, TenantConfig] = {}
+        for entry in spec.split(","):
+            parts = [part.strip() for part in entry.split(":")]
+            if not parts[0]:
+                continue
+            try:
+                weight = float(parts[1]) if len(parts) > 1 and parts[1] else 1.0
+                tpm = int(parts[2]) if len(parts) > 2 and parts[2] else default_tokens_per_minute
+            except ValueError:
+                raise ValueError(f"invalid tenant entry {entry.strip()!r}") from None
+            tenants[parts[0]] = TenantConfig(weight=max(weight, 0.01), tokens_per_minute=max(0, tpm))
+        return cls(tenants, default_tokens_per_minute)
+
+    def label(self, tenant: Optional[str]) -> str:
+        """The name stats and queues use for a tenant id."""
+        tenant = (tenant or "").strip() or DEFAULT_TENANT
+        if tenant in self._configs or tenant in self._states:
+            return tenant
+        if len(self._states) >= _MAX_TRACKED_TENANTS:
+            return _OVERFLOW_TENANT
+        return tenant
+
+    def weight(self, tenant: str) -> float:
+        return self._configs.get(tenant, self._default).weight
+
+    def charge(self, tenant: str, tokens: int) -> bool:
+        """Queue a request's tokens against the tenant; return True if over budget."""
+        with self._lock:
+            state = self._state(tenant)
+            state.queued += 1
+            limit = state.config.tokens_per_minute
+            if not limit:
+                return False
+            now = self._clock()
+            state.tokens = min(limit, state.tokens + (now - state.refilled_at) * limit / 60.0)
+            state.refilled_at = now
+            if state.tokens <= 0:
+                state.over_budget += 1
+                return True
+            state.tokens -= tokens
+            return False
+
+    def dequeued(self, tenant: str) -> None:
+        with self._lock:
+            state = self._state(tenant)
+            state.queued = max(0, state.queued - 1)
+
+    def record(self, tenant: str, queue_ms: float, ttft_ms: float) -> None:
+        with self._lock:
+            state = self._state(tenant)
+            state.completed += 1
+            state.queue_ms += queue_ms
+            state.ttft_ms += ttft_ms
+
+    def report(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {
+                tenant: {
+                    "weight": state.config.weight,
+                    "tokens_per_minute": state.config.tokens_per_minute,
+                    "queued": state.queued,
+                    "completed": state.completed,
+                    "over_budget": state.over_budget,
+                    "avg_queue_ms": state.queue_ms / state.completed if state.completed else 0.0,
+                    "avg_ttft_ms": state.ttft_ms / state.completed if state.completed else 0.0,
+                }
+                for tenant, state in self._states.items()
+            }
+
+    def _state(self, tenant: str) -> _TenantState:
+        state = self._states.get(tenant)
+        if state is None:
+            config = self._configs.get(tenant, self._default)
+            state = _TenantState(
+                config=config, tokens=float(config.tokens_per_minute), refilled_at=self._clock()
+            )
+            self._states[tenant] = state
+        return state
+
+
+def tenant_from_headers(headers: Mapping[str, str], header: str) -> str:
+    """The tenant id from the tenant header, else from the API key, else the default.
+
+    API keys are hashed so they never show up in metrics; configure such a
+    tenant by its "key-<hash>" label.
+    """
+    value = (headers.get(header) or "").strip()
+    if value:
+        return value
+    auth = (headers.get("Authorization") or "").strip()
+    if auth.lower().startswith("bearer "):
+        key = auth[7:].strip()
+        if key:
+            return "key-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+    return DEFAULT_TENANT
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import bisect
+from contextlib import contextmanager
+import hashlib
+import math
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Virtual nodes per endpoint; more spreads keys more evenly over few endpoints.
+_VNODES = 64
+
+
+def prefix_key(prompt: str, prefix_tokens: int) -> str:
+    """The leading `prefix_tokens` whitespace tokens of a prompt, the part a
+    server's prompt cache can reuse across requests that share it."""
+    if prefix_tokens <= 0:
+        return prompt
+    return " ".join(prompt.split(None, prefix_tokens)[:prefix_tokens])
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class AffinityRing:
+    """Consistent hashing with bounded loads over a set of endpoints.
+
+    A key maps to the first endpoint clockwise from its hash on the ring (its
+    home), so requests sharing a prompt prefix keep landing on the server that
+    already holds it in cache, and adding or removing an endpoint only moves
+    the keys next to it. No endpoint may take more than load_factor times the
+    average in-flight load: a key whose home is full spills to the next
+    endpoint on the ring with room. lease() holds a slot for one request.
+
+    An optional weight (0 to 1 per endpoint) scales each endpoint's share;
+    endpoints of weight 0 are skipped unless every endpoint has weight 0.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[str],
+        load_factor: float = 1.25,
+        weight: Optional[Callable[[str], float]] = None,
+    ) -> None:
+        self._endpoints = list(dict.fromkeys(endpoints))
+        self._load_factor = max(1.0, load_factor)
+        self._weight = weight
+        self._lock = threading.Lock()
+        self._ring: List[Tuple[int, str]] = sorted(
+            (_hash(f"{endpoint}#{index}"), endpoint)
+            for endpoint in self._endpoints
+            for index in range(_VNODES)
+        )
+        self._points = [point for point, _ in self._ring]
+        self._load: Dict[str, int] = {endpoint: 0 for endpoint in self._endpoints}
+        self._requests: Dict[str, int] = {endpoint: 0 for endpoint in self._endpoints}
+        self._hits: Dict[str, int] = {endpoint: 0 for endpoint in self._endpoints}
+        self._spills: Dict[str, int] = {endpoint: 0 for endpoint in self._endpoints}
+
+    @property
+    def endpoints(self) -> List[str]:
+        return list(self._endpoints)
+
+    def acquire(self, key: str, exclude: Sequence[str] = ()) -> Optional[str]:
+        """Pick the endpoint for `key` (not one in `exclude`) and count a request
+        against it; None if there is none."""
+        allowed = [endpoint for endpoint in self._endpoints if endpoint not in exclude]
+        if not allowed:
+            return None
+        weights = {endpoint: 1.0 for endpoint in allowed}
+        if self._weight is not None:
+            weights = {endpoint: self._weight(endpoint) for endpoint in allowed}
+            if not any(weights.values()):
+                weights = {endpoint: 1.0 for endpoint in allowed}
+        with self._lock:
+            total_weight = sum(weights.values())
+            capacity = self._load_factor * (sum(self._load.values()) + 1) / total_weight
+            home = None
+            chosen = None
+            fallback = None
+            for endpoint in self._walk(_hash(key)):
+                if home is None:
+                    home = endpoint
+                weight = weights.get(endpoint, 0.0)
+                if weight <= 0.0:
+                    continue
+                if fallback is None:
+                    fallback = endpoint
+                if self._load[endpoint] < math.ceil(capacity * weight):
+                    chosen = endpoint
+                    break
+            if chosen is None:
+                chosen = fallback
+            self._load[chosen] += 1
+            self._requests[home] += 1
+            if chosen == home:
+                self._hits[home] += 1
+            else:
+                self._spills[home] += 1
+            return chosen
+
+    def release(self, endpoint: str) -> None:
+        with self._lock:
+            if self._load.get(endpoint, 0) > 0:
+                self._load[endpoint] -= 1
+
+    @contextmanager
+    def lease(self, key: str, exclude: Sequence[str] = ()) -> Iterator[Optional[str]]:
+        endpoint = self.acquire(key, exclude)
+        try:
+            yield endpoint
+        finally:
+            if endpoint is not None:
+                self.release(endpoint)
+
+    def report(self) -> Dict[str, Dict[str, object]]:
+        """Per endpoint: requests whose home it is, how many it kept (the affinity
+        hit rate) and spilled, and its current in-flight load."""
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": self._requests[endpoint],
+                    "affinity_hits": self._hits[endpoint],
+                    "spills": self._spills[endpoint],
+                    "hit_rate": (
+                        self._hits[endpoint] / self._requests[endpoint]
+                        if self._requests[endpoint]
+                        else 0.0
+                    ),
+                    "inflight": self._load[endpoint],
+                }
+                for endpoint in self._endpoints
+            }
+
+    def _walk(self, point: int) -> Iterator[str]:
+        """Distinct endpoints in ring order starting at `point`."""
+        seen = set()
+        start = bisect.bisect_left(self._points, point)
+        for offset in range(len(self._ring)):
+            endpoint = self._ring[(start + offset) % len(self._ring)][1]
+            if endpoint not in seen:
+                seen.add(endpoint)
+                yield endpoint
+                if len(seen) == len(self._endpoints):
+                    return
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from relayserve.internal.runner.affinity import AffinityRing
+from relayserve.internal.runner.pool import pool_for
+
+# Longest ejection, as a multiple of eject_s, for an endpoint that keeps failing.
+_MAX_EJECT_MULTIPLIER = 10
+# Share of its full weight a re-admitted endpoint starts from.
+_MIN_RAMP_WEIGHT = 0.1
+
+POLICIES = ("affinity", "p2c")
+
+
+@dataclass
+class _Endpoint:
+    inflight: int = 0
+    ewma_ms: float = 0.0
+    failures: int = 0  # consecutive
+    ejections: int = 0  # consecutive, reset once fully re-admitted
+    ejected_until: float = 0.0
+    readmitted_at: Optional[float] = None
+    requests: int = 0
+    errors: int = 0
+    total_ejections: int = 0
+    probes: int = 0
+    probe_failures: int = 0
+
+
+class _Pick:
+    """The endpoint chosen for one request and the verdict to record for it.
+
+    `ok` stays True unless the caller marks a failure; None records no
+    verdict (e.g. the client went away). `latency_s` overrides the measured
+    duration, e.g. with a stream's time to first byte.
+    """
+
+    def __init__(self, endpoint: Optional[str]) -> None:
+        self.endpoint = endpoint
+        self.ok: Optional[bool] = True
+        self.latency_s: Optional[float] = None
+
+
+class EndpointBalancer:
+    """Health-aware choice among llama.cpp servers.
+
+    Endpoints are ejected after eject_failures consecutive failures (passive)
+    or a failed health probe (active), for eject_s times the number of
+    back-to-back ejections. Once the ejection ends an endpoint is re-admitted
+    gradually: its weight ramps from 10% to 100% over ramp_s, and one failure
+    during the ramp ejects it again. If every endpoint is ejected, all of them
+    are used rather than none.
+
+    With the "affinity" policy a request goes to its prefix's home on the
+    AffinityRing, whose bounded loads are scaled by each endpoint's weight;
+    with "p2c" it goes to the better of two random healthy endpoints, scored
+    by in-flight requests times EWMA latency over weight.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[str],
+        policy: str = "affinity",
+        load_factor: float = 1.25,
+        eject_failures: int = 3,
+        eject_s: float = 10.0,
+        ramp_s: float = 30.0,
+        ewma_alpha: float = 0.3,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self._endpoints = list(dict.fromkeys(endpoints))
+        self._policy = policy if policy in POLICIES else "affinity"
+        self._eject_failures = max(1, eject_failures)
+        self._eject_s = eject_s
+        self._ramp_s = ramp_s
+        self._alpha = ewma_alpha
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._state: Dict[str, _Endpoint] = {endpoint: _Endpoint() for endpoint in self._endpoints}
+        self._ring = (
+            AffinityRing(self._endpoints, load_factor, weight=self.weight)
+            if self._policy == "affinity"
+            else None
+        )
+
+    @property
+    def endpoints(self) -> List[str]:
+        return list(self._endpoints)
+
+    def weight(self, endpoint: str) -> float:
+        """0 while ejected, ramping up to 1 after re-admission."""
+        with self._lock:
+            return self._weight(self._state[endpoint], self._clock())
+
+    def acquire(self, key: str, exclude: Sequence[str] = ()) -> Optional[str]:
+        """Pick an endpoint not in `exclude` and count a request in flight on it."""
+        if self._ring is not None:
+            endpoint = self._ring.acquire(key, exclude)
+        else:
+            endpoint = self._pick_p2c(exclude)
+        if endpoint is not None:
+            with self._lock:
+                state = self._state[endpoint]
+                state.inflight += 1
+                state.requests += 1
+        return endpoint
+
+    def release(self, endpoint: str, latency_s: Optional[float], ok: Optional[bool]) -> None:
+        """End a request; ok=None records no verdict on the endpoint."""
+        if self._ring is not None:
+            self._ring.release(endpoint)
+        with self._lock:
+            state = self._state[endpoint]
+            state.inflight = max(0, state.inflight - 1)
+            if ok is None:
+                return
+            if ok:
+                state.failures = 0
+                if latency_s is not None:
+                    sample = latency_s * 1000.0
+                    state.ewma_ms = (
+                        sample
+                        if state.ewma_ms == 0.0
+                        else self._alpha * sample + (1 - self._alpha) * state.ewma_ms
+                    )
+                return
+            state.errors += 1
+            state.failures += 1
+            now = self._clock()
+            weight = self._weight(state, now)
+            # Already ejected: a late failure from before the ejection changes nothing.
+            if weight > 0.0 and (state.failures >= self._eject_failures or weight < 1.0):
+                self._eject(state, now)
+
+    @contextmanager
+    def lease(self, key: str, exclude: Sequence[str] = ()) -> Iterator[_Pick]:
+        """acquire() and release(), recording the pick's verdict; an exception
+        counts as a failure, except GeneratorExit (the consumer stopped)."""
+        pick = _Pick(self.acquire(key, exclude))
+        started = time.perf_counter()
+        try:
+            yield pick
+        except GeneratorExit:
+            pick.ok = None
+            raise
+        except BaseException:
+            if pick.ok is not None:
+                pick.ok = False
+            raise
+        finally:
+            if pick.endpoint is not None:
+                latency_s = pick.latency_s
+                if latency_s is None:
+                    latency_s = time.perf_counter() - started
+                self.release(pick.endpoint, latency_s, pick.ok)
+
+    def probed(self, endpoint: str, healthy: bool) -> None:
+        """Record an active health check; a failed one ejects the endpoint."""
+        with self._lock:
+            state = self._state[endpoint]
+            state.probes += 1
+            if healthy:
+                return
+            state.probe_failures += 1
+            now = self._clock()
+            if self._weight(state, now) > 0.0:
+                self._eject(state, now)
+
+    def affinity_report(self) -> dict:
+        return self._ring.report() if self._ring is not None else {}
+
+    def report(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            now = self._clock()
+            report = {}
+            for endpoint, state in self._state.items():
+                weight = self._weight(state, now)
+                report[endpoint] = {
+                    "state": (
+                        "ejected" if weight == 0.0 else "recovering" if weight < 1.0 else "healthy"
+                    ),
+                    "weight": weight,
+                    "inflight": state.inflight,
+                    "ewma_ms": state.ewma_ms,
+                    "requests": state.requests,
+                    "errors": state.errors,
+                    "ejections": state.total_ejections,
+                    "probes": state.probes,
+                    "probe_failures": state.probe_failures,
+                }
+            return report
+
+    def _pick_p2c(self, exclude: Sequence[str]) -> Optional[str]:
+        with self._lock:
+            now = self._clock()
+            allowed = [endpoint for endpoint in self._endpoints if endpoint not in exclude]
+            weights = {endpoint: self._weight(self._state[endpoint], now) for endpoint in allowed}
+            candidates = [endpoint for endpoint in allowed if weights[endpoint] > 0.0]
+            if not candidates:
+                # Everything is ejected: spread over all rather than refuse.
+                candidates = allowed
+                weights = {endpoint: 1.0 for endpoint in allowed}
+            if len(candidates) <= 1:
+                return candidates[0] if candidates else None
+            known = [self._state[e].ewma_ms for e in candidates if self._state[e].ewma_ms > 0.0]
+            # Endpoints without a latency sample yet are scored at the average.
+            default_ms = sum(known) / len(known) if known else 1.0
+
+            def score(endpoint: str) -> float:
+                state = self._state[endpoint]
+                return (state.inflight + 1) * (state.ewma_ms or default_ms) / weights[endpoint]
+
+            first, second = self._rng.sample(candidates, 2)
+            return first if score(first) <= score(second) else second
+
+    def _weight(self, state: _Endpoint, now: float) -> float:
+        if now < state.ejected_until:
+            return 0.0
+        if state.readmitted_at is None:
+            if state.ejections == 0:
+                return 1.0
+            state.readmitted_at = state.ejected_until
+        progress = (now - state.readmitted_at) / self._ramp_s if self._ramp_s > 0 else 1.0
+        if progress >= 1.0:
+            state.readmitted_at = None
+            state.ejections = 0
+            return 1.0
+        return max(_MIN_RAMP_WEIGHT, progress)
+
+    def _eject(self, state: _Endpoint, now: float) -> None:
+        state.ejections += 1
+        state.total_ejections += 1
+        state.failures = 0
+        state.readmitted_at = None
+        state.ejected_until = now + self._eject_s * min(state.ejections, _MAX_EJECT_MULTIPLIER)
+
+
+class HealthChecker:
+    """Probes every endpoint each interval_s on a daemon thread.
+
+    The default probe is llama.cpp's GET /health, which answers 503 while the
+    model is still loading.
+    """
+
+    def __init__(
+        self,
+        balancer: EndpointBalancer,
+        interval_s: float,
+        probe: Optional[Callable[[str], bool]] = None,
+        timeout_s: float = 2.0,
+    ) -> None:
+        self._balancer = balancer
+        self._interval_s = interval_s
+        self._probe = probe or (lambda endpoint: _probe_health(endpoint, timeout_s))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._interval_s <= 0 or self._thread is not None or not self._balancer.endpoints:
+            return
+        self._thread = threading.Thread(target=self._run, name="endpoint-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def check(self) -> None:
+        """Probe every endpoint once now."""
+        for endpoint in self._balancer.endpoints:
+            try:
+                healthy = bool(self._probe(endpoint))
+            except Exception:
+                healthy = False
+            self._balancer.probed(endpoint, healthy)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval_s):
+            self.check()
+
+
+def _probe_health(endpoint: str, timeout_s: float) -> bool:
+    path = urlsplit(endpoint).path.rstrip("/") + "/health"
+    with pool_for(endpoint).request(
+        "GET", path, read_timeout=timeout_s, connect_timeout=timeout_s
+    ) as resp:
+        resp.read()
+    return True
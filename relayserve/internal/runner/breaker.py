@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from collections import deque
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling a backend that keeps failing or has become too slow.
+
+    Closed, it lets every call through and keeps the outcomes of the last
+    `window` calls; a call is bad if it failed or took longer than
+    `slow_call_s`. Once at least `min_calls` are recorded and the share of bad
+    ones reaches `failure_rate`, it opens and rejects calls for `open_s`
+    seconds. Then it is half-open: up to `half_open_calls` trial calls go
+    through, the first good one closes it and a bad one opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        slow_call_s: Optional[float] = None,
+        min_calls: int = 5,
+        window: int = 20,
+        open_s: float = 5.0,
+        half_open_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._failure_rate = min(1.0, max(0.0, failure_rate))
+        self._slow_call_s = slow_call_s
+        self._min_calls = max(1, min_calls)
+        self._open_s = max(0.0, open_s)
+        self._half_open_calls = max(1, half_open_calls)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._state = CLOSED
+        self._open_until = 0.0
+        self._trials = 0
+        self._calls = 0
+        self._failures = 0
+        self._slow_calls = 0
+        self._rejected = 0
+        self._opens = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """Whether a call may go through now. A call allowed must be followed
+        by record(), with ok=None if it ended without a verdict."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._trials < self._half_open_calls:
+                self._trials += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, ok: Optional[bool], latency_s: float = 0.0) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._trials = max(0, self._trials - 1)
+            if ok is None:
+                return
+            slow = self._slow_call_s is not None and latency_s > self._slow_call_s
+            self._calls += 1
+            self._failures += not ok
+            self._slow_calls += ok and slow
+            bad = not ok or slow
+            if state == HALF_OPEN:
+                if bad:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+            elif state == CLOSED:
+                self._outcomes.append(bad)
+                if (
+                    len(self._outcomes) >= self._min_calls
+                    and sum(self._outcomes) >= self._failure_rate * len(self._outcomes)
+                ):
+                    self._open()
+            # Calls that started before the breaker opened do not change it.
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "bad_rate": sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0,
+                "calls": self._calls,
+                "failures": self._failures,
+                "slow_calls": self._slow_calls,
+                "rejected": self._rejected,
+                "opens": self._opens,
+            }
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() >= self._open_until:
+            self._state = HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._open_until = self._clock() + self._open_s
+        self._opens += 1
+        self._outcomes.clear()
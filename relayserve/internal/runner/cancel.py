@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, List, Sequence
+
+
+class CancelToken:
+    """Lets another thread abort an upstream call that is blocked on the network.
+
+    Upstream code registers a callback that tears down its connection;
+    cancel() runs the registered callbacks once, and a callback registered
+    after cancellation runs immediately.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.cancelled = False
+
+    def register(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+def all_cancelled(tokens: Sequence[CancelToken]) -> CancelToken:
+    """A token cancelled once every one of `tokens` is, for one upstream call
+    shared by several requests."""
+    combined = CancelToken()
+    lock = threading.Lock()
+    left = [len(tokens)]
+
+    def one_cancelled() -> None:
+        with lock:
+            left[0] -= 1
+            done = left[0] == 0
+        if done:
+            combined.cancel()
+
+    for token in tokens:
+        token.register(one_cancelled)
+    return combined
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+from collections import deque
+import heapq
+import itertools
+import math
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from relayserve.internal.runner.cancel import CancelToken
+
+T = TypeVar("T")
+
+# An attempt gets its own cancel token and the replicas tried so far, which it
+# must extend with the one it picks so a hedge can avoid it.
+Attempt = Callable[[CancelToken, List[str]], T]
+
+# No hedge fires sooner than this, however fast recent requests were.
+_MIN_DELAY_S = 0.005
+
+
+class Hedger:
+    """Sends a second copy of a slow request to another replica.
+
+    The primary attempt runs on the caller's thread. If it has not succeeded
+    after the `percentile` of recent attempt latencies, and hedges so far are
+    within `budget` (a fraction of requests), a backup attempt starts on its
+    own thread. The first success wins and the other attempt is cancelled
+    through its token; its late result, if any, goes to `discard`. No hedge is
+    sent until `min_samples` latencies have been seen.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 256,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self._percentile = min(100.0, max(0.0, percentile))
+        self._budget = max(0.0, budget)
+        self._min_samples = max(1, min_samples)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=max(1, window))
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._denied = 0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < self._min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(self._percentile / 100.0 * len(ordered)) - 1))
+        return max(_MIN_DELAY_S, ordered[index])
+
+    def run(
+        self,
+        attempt: Attempt[T],
+        cancel: Optional[CancelToken] = None,
+        discard: Optional[Callable[[T], None]] = None,
+    ) -> T:
+        with self._lock:
+            self._requests += 1
+        race = _Race(self, attempt, cancel, discard)
+        delay = self.delay()
+        timer = None if delay is None else _timer().schedule(delay, race.hedge)
+        try:
+            return race.run_primary()
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def report(self) -> Dict[str, Any]:
+        delay = self.delay()
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "hedged": self._hedged,
+                "hedge_rate": self._hedged / self._requests if self._requests else 0.0,
+                "hedge_wins": self._hedge_wins,
+                "win_rate": self._hedge_wins / self._hedged if self._hedged else 0.0,
+                "budget_denied": self._denied,
+                "delay_ms": None if delay is None else delay * 1000.0,
+            }
+
+    def _observe(self, latency_s: float) -> None:
+        with self._lock:
+            self._latencies.append(latency_s)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._hedged + 1 > self._budget * self._requests:
+                self._denied += 1
+                return False
+            self._hedged += 1
+            return True
+
+    def _won(self) -> None:
+        with self._lock:
+            self._hedge_wins += 1
+
+
+class _Race:
+    """One request's primary and (maybe) backup attempt."""
+
+    def __init__(
+        self,
+        hedger: Hedger,
+        attempt: Attempt[Any],
+        cancel: Optional[CancelToken],
+        discard: Optional[Callable[[Any], None]],
+    ) -> None:
+        self._hedger = hedger
+        self._attempt = attempt
+        self._discard = discard
+        self._cond = threading.Condition()
+        self._tried: List[str] = []
+        self._tokens = [CancelToken(), CancelToken()]
+        if cancel is not None:
+            for token in self._tokens:
+                cancel.register(token.cancel)
+        self._winner: Optional[int] = None
+        self._result: Any = None
+        self._running = 1
+        self._error: Optional[BaseException] = None
+        self._started = False
+
+    def run_primary(self) -> Any:
+        self._run(0)
+        with self._cond:
+            # The primary failed; a running backup may still succeed.
+            self._cond.wait_for(lambda: self._winner is not None or self._running == 0)
+            if self._winner is None:
+                assert self._error is not None
+                raise self._error
+            return self._result
+
+    def hedge(self) -> None:
+        with self._cond:
+            if self._winner is not None or self._running == 0 or self._started:
+                return
+            if not self._hedger._spend():
+                return
+            self._started = True
+            self._running += 1
+        threading.Thread(target=self._run, args=(1,), name="hedge", daemon=True).start()
+
+    def _run(self, index: int) -> None:
+        with self._cond:
+            tried = list(self._tried) if index else self._tried
+        started = self._hedger._clock()
+        try:
+            result = self._attempt(self._tokens[index], tried)
+        except BaseException as exc:
+            with self._cond:
+                self._running -= 1
+                if self._error is None or index == 0:
+                    self._error = exc
+                self._cond.notify_all()
+            if index == 0 and not isinstance(exc, Exception):
+                raise
+            return
+        self._hedger._observe(self._hedger._clock() - started)
+        with self._cond:
+            self._running -= 1
+            lost = self._winner is not None
+            if not lost:
+                self._winner = index
+                self._result = result
+            self._cond.notify_all()
+        if lost:
+            if self._discard is not None:
+                self._discard(result)
+            return
+        if index:
+            self._hedger._won()
+        # The other attempt, if any, is now the loser.
+        self._tokens[1 - index].cancel()
+
+
+class _Timer:
+    """One daemon thread running delayed callbacks, so waiting to hedge costs
+    no thread per request."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, "_Scheduled"]] = []
+        self._counter = itertools.count()
+        threading.Thread(target=self._loop, name="hedge-timer", daemon=True).start()
+
+    def schedule(self, delay_s: float, callback: Callable[[], None]) -> "_Scheduled":
+        entry = _Scheduled(callback)
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay_s, next(self._counter), entry))
+            self._cond.notify()
+        return entry
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, entry = self._heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+            if not entry.cancelled:
+                try:
+                    entry.callback()
+                except Exception:
+                    pass
+
+
+class _Scheduled:
+    def __init__(self, callback: Callable[[], None]) -> None:
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+_shared_timer: Optional[_Timer] = None
+_timer_lock = threading.Lock()
+
+
+def _timer() -> _Timer:
+    global _shared_timer
+    with _timer_lock:
+        if _shared_timer is None:
+            _shared_timer = _Timer()
+        return _shared_timer
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+from collections import deque
+import http.client
+import os
+import select
+import socket
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+from relayserve.internal.codec import json_codec
+from relayserve.internal.runner.cancel import CancelToken
+
+# Read from the environment like the device probes, since backends are built
+# by the router without access to Settings.
+POOL_SIZE = int(os.getenv("RELAYSERVE_UPSTREAM_POOL_SIZE", "8"))
+IDLE_TIMEOUT_S = float(os.getenv("RELAYSERVE_UPSTREAM_IDLE_TIMEOUT_S", "30"))
+CONNECT_TIMEOUT_S = float(os.getenv("RELAYSERVE_UPSTREAM_CONNECT_TIMEOUT_S", "2"))
+
+# A complete response closed before the end of its body (e.g. an SSE stream
+# whose terminating chunk follows [DONE]) is drained for at most this long in
+# all, and this far, so its connection can be reused.
+_DRAIN_TIMEOUT_S = 0.05
+_DRAIN_MAX_BYTES = 65536
+
+# Errors meaning a reused keep-alive connection had been closed by the server.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class UpstreamHTTPError(Exception):
+    """An upstream answered with an error status."""
+
+    def __init__(self, status: int, reason: str) -> None:
+        super().__init__(f"upstream returned {status} {reason}")
+        self.status = status
+        self.reason = reason
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one upstream origin.
+
+    Checkout takes the most recently used idle connection, dropping those idle
+    for longer than idle_timeout_s and those that fail a health check (the
+    server closed them, or sent bytes nobody asked for). At most max_size idle
+    connections are kept; extra ones are closed on return. A request that
+    fails on a reused connection before any response arrives is retried once
+    on a new one. Connect and read timeouts are separate: the first bounds the
+    TCP/TLS handshake, the second every read of the response.
+    """
+
+    def __init__(
+        self,
+        scheme: str,
+        host: str,
+        port: Optional[int],
+        max_size: int = POOL_SIZE,
+        idle_timeout_s: float = IDLE_TIMEOUT_S,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._scheme = scheme
+        self._host = host
+        self._port = port
+        self._max_size = max(0, max_size)
+        self._idle_timeout_s = idle_timeout_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._idle: Deque[Tuple[float, http.client.HTTPConnection]] = deque()
+        self._stats: Dict[str, int] = {
+            "created": 0,
+            "reused": 0,
+            "retried": 0,
+            "evicted_idle": 0,
+            "evicted_unhealthy": 0,
+            "discarded": 0,
+        }
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        read_timeout: float = 60.0,
+        connect_timeout: float = CONNECT_TIMEOUT_S,
+        cancel: Optional[CancelToken] = None,
+    ) -> "PooledResponse":
+        """Send a request and return its response; raises UpstreamHTTPError on 4xx/5xx.
+
+        The response must be closed (it is a context manager); a fully read
+        response hands its connection back to the pool.
+        """
+        for attempt in range(2):
+            conn, reused = self._checkout(min(connect_timeout, read_timeout))
+            lease = _Lease(conn)
+            if cancel is not None:
+                cancel.register(lease.abort)
+            try:
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, path, body=body, headers=dict(headers or {}))
+                resp = conn.getresponse()
+            except _STALE_ERRORS:
+                lease.end()
+                conn.close()
+                if reused and attempt == 0 and not (cancel is not None and cancel.cancelled):
+                    self._count("retried")
+                    continue
+                raise
+            except BaseException:
+                lease.end()
+                conn.close()
+                raise
+            break
+        pooled = PooledResponse(self, lease, resp)
+        if resp.status >= 400:
+            pooled.mark_complete()
+            pooled.close()
+            raise UpstreamHTTPError(resp.status, resp.reason)
+        return pooled
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "idle": len(self._idle)}
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for _, conn in idle:
+            conn.close()
+
+    def _checkout(self, connect_timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        now = self._clock()
+        stale = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                idle_since, candidate = self._idle.pop()
+                if now - idle_since > self._idle_timeout_s:
+                    self._stats["evicted_idle"] += 1
+                    stale.append(candidate)
+                elif not _healthy(candidate):
+                    self._stats["evicted_unhealthy"] += 1
+                    stale.append(candidate)
+                else:
+                    self._stats["reused"] += 1
+                    conn = candidate
+                    break
+        for candidate in stale:
+            candidate.close()
+        if conn is not None:
+            return conn, True
+        return self._connect(connect_timeout), False
+
+    def _connect(self, connect_timeout: float) -> http.client.HTTPConnection:
+        if self._scheme == "https":
+            conn: http.client.HTTPConnection = http.client.HTTPSConnection(
+                self._host, self._port, timeout=connect_timeout
+            )
+        else:
+            conn = http.client.HTTPConnection(self._host, self._port, timeout=connect_timeout)
+        conn.connect()
+        self._count("created")
+        return conn
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        now = self._clock()
+        with self._lock:
+            # The oldest idle connections sit at the left; drop the expired ones.
+            expired = []
+            while self._idle and now - self._idle[0][0] > self._idle_timeout_s:
+                expired.append(self._idle.popleft()[1])
+                self._stats["evicted_idle"] += 1
+            keep = len(self._idle) < self._max_size
+            if keep:
+                self._idle.append((now, conn))
+            else:
+                self._stats["discarded"] += 1
+        for stale in expired:
+            stale.close()
+        if not keep:
+            conn.close()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+
+class _Lease:
+    """One request's use of a connection, which a CancelToken may abort until it ends.
+
+    Once ended the connection may be back in the pool serving someone else, so
+    a late abort must not touch it.
+    """
+
+    def __init__(self, conn: http.client.HTTPConnection) -> None:
+        self.conn = conn
+        # Kept apart from conn.sock, which http.client clears as soon as it
+        # sees a response that will close the connection.
+        self._sock = conn.sock
+        self._lock = threading.Lock()
+        self._ended = False
+        self._aborted = False
+
+    def abort(self) -> None:
+        """Shut down the socket from any thread, so a blocked read returns and the
+        upstream server sees the client go away and stops generating."""
+        with self._lock:
+            if self._ended:
+                return
+            self._aborted = True
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @property
+    def aborted(self) -> bool:
+        return self._aborted
+
+    def end(self) -> bool:
+        """Stop accepting aborts; True if the connection was not aborted."""
+        with self._lock:
+            self._ended = True
+            return not self._aborted
+
+
+class PooledResponse:
+    """An upstream response whose connection goes back to its pool when closed."""
+
+    def __init__(
+        self, pool: ConnectionPool, lease: _Lease, resp: http.client.HTTPResponse
+    ) -> None:
+        self._pool = pool
+        self._lease = lease
+        self._conn = lease.conn
+        self._resp = resp
+        self._closed = False
+        self._complete = False
+        self.status = resp.status
+        self.headers = resp.headers
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return self._checked(self._resp.read(amt))
+
+    def read1(self, amt: int = -1) -> bytes:
+        """Up to amt bytes of what has already arrived, blocking only if nothing has."""
+        return self._checked(self._resp.read1(amt))
+
+    def readline(self) -> bytes:
+        return self._resp.readline()
+
+    def abort(self) -> None:
+        self._lease.abort()
+
+    def mark_complete(self) -> None:
+        """Note that the caller has read the response's logical end (an SSE
+        [DONE]), so close() may drain what follows and reuse the connection."""
+        self._complete = True
+
+    def close(self) -> None:
+        """Hand the connection back if the body was read to its end, or drained
+        after mark_complete(); otherwise shut it down, so an upstream still
+        generating sees the client go away."""
+        if self._closed:
+            return
+        self._closed = True
+        reusable = not self._resp.will_close and (
+            self._resp.isclosed() or (self._complete and self._drain())
+        )
+        if not reusable:
+            self._lease.abort()
+        if self._lease.end() and reusable:
+            self._pool._checkin(self._conn)
+            return
+        self._resp.close()
+        self._conn.close()
+
+    def __enter__(self) -> "PooledResponse":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _checked(self, data: bytes) -> bytes:
+        # An aborted close-delimited body ends in a clean EOF; it must not pass
+        # for a complete response.
+        if not data and self._lease.aborted:
+            raise ConnectionError("upstream response aborted")
+        return data
+
+    def _drain(self) -> bool:
+        deadline = time.monotonic() + _DRAIN_TIMEOUT_S
+        try:
+            remaining = _DRAIN_MAX_BYTES
+            while remaining > 0 and not self._resp.isclosed():
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._conn.sock.settimeout(left)
+                data = self._resp.read1(min(8192, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+            if self._resp.length == 0:
+                # read1() leaves a fully read sized body open; read() ends it.
+                self._resp.read()
+        except (OSError, http.client.HTTPException, AttributeError):
+            return False
+        return self._resp.isclosed()
+
+
+def _healthy(conn: http.client.HTTPConnection) -> bool:
+    """An idle connection is healthy while its socket has nothing to read: data
+    or EOF on an idle keep-alive connection means the server is done with it."""
+    sock = conn.sock
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+_pools: Dict[Tuple[str, str, Optional[int]], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(url: str) -> ConnectionPool:
+    """The shared pool for a URL's origin (scheme, host, port)."""
+    parts = urlsplit(url)
+    scheme = (parts.scheme or "http").lower()
+    origin = (scheme, parts.hostname or "", parts.port)
+    with _pools_lock:
+        pool = _pools.get(origin)
+        if pool is None:
+            pool = ConnectionPool(scheme, origin[1], origin[2])
+            _pools[origin] = pool
+        return pool
+
+
+def post_json(
+    url: str,
+    payload: Any,
+    timeout: float,
+    cancel: Optional[CancelToken] = None,
+    connect_timeout: float = CONNECT_TIMEOUT_S,
+) -> PooledResponse:
+    """POST `payload` as JSON through the origin's pool; `timeout` is the read timeout."""
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return pool_for(url).request(
+        "POST",
+        path,
+        body=json_codec.dumps(payload),
+        headers={"Content-Type": "application/json"},
+        read_timeout=timeout,
+        connect_timeout=connect_timeout,
+        cancel=cancel,
+    )
+
+
+def pools_report() -> Dict[str, Dict[str, int]]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {
+        f"{scheme}://{host}" + (f":{port}" if port else ""): pool.report()
+        for (scheme, host, port), pool in pools.items()
+    }
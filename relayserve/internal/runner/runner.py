@@ -1,10 +1,17 @@
 from __future__ import annotations
 
-import json
-from typing import Iterator, Optional
-from urllib import request
+from dataclasses import dataclass
+import time
+from typing import Any, Iterator, Mapping, Optional
 
+from relayserve.internal.codec import json_codec
+from relayserve.internal.codec.sse import iter_events
 from relayserve.internal.device.registry import Device
+from relayserve.internal.runner.affinity import prefix_key
+from relayserve.internal.runner.balancer import EndpointBalancer
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.hedge import Hedger
+from relayserve.internal.runner.pool import post_json
 
 
 class Runner:
@@ -12,103 +19,270 @@ class Runner:
         return f"Echo: {prompt}"
 
 
+_TIMEOUT_S = 60.0
+# Servers tried for one request before giving up.
+_ATTEMPTS = 2
+
+
+def _cap_timeout(timeout: Optional[float]) -> float:
+    return _TIMEOUT_S if timeout is None else min(_TIMEOUT_S, timeout)
+
+
+@dataclass
+class StreamTiming:
+    """perf_counter times for one upstream stream, filled in by chat_stream."""
+
+    sent_at: Optional[float] = None
+    first_event_at: Optional[float] = None
+
+    def ttfb_ms(self) -> Optional[float]:
+        """Upstream time to first byte: request sent to first event received."""
+        if self.sent_at is None or self.first_event_at is None:
+            return None
+        return (self.first_event_at - self.sent_at) * 1000.0
+
+
 class LlamaServerClient:
-    def __init__(self, endpoints: list[str]) -> None:
+    """Client for a set of llama.cpp servers.
+
+    Servers are chosen by an EndpointBalancer: by default by prefix affinity
+    (prompts that start with the same `prefix_tokens` tokens go to the same
+    server, whose slot cache already holds that prefix, unless it is over its
+    share of load), skipping servers ejected as unhealthy. A request that
+    fails before any reply is retried once on another server, and with a
+    Hedger a slow one is also sent to a second server.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[str],
+        load_factor: float = 1.25,
+        prefix_tokens: int = 64,
+        balancer: Optional[EndpointBalancer] = None,
+        hedger: Optional[Hedger] = None,
+        stream_hedger: Optional[Hedger] = None,
+    ) -> None:
         self._endpoints = endpoints
-        self._index = 0
+        self._balancer = balancer or EndpointBalancer(endpoints, load_factor=load_factor)
+        self._prefix_tokens = prefix_tokens
+        # Optional hedging (see Hedger): of whole replies, and of streams up to their first chunk.
+        self._hedger = hedger
+        self._stream_hedger = stream_hedger
+
+    @property
+    def balancer(self) -> EndpointBalancer:
+        return self._balancer
 
     def has_backends(self) -> bool:
         return bool(self._endpoints)
 
-    def next_endpoint(self) -> Optional[str]:
-        if not self._endpoints:
-            return None
-        endpoint = self._endpoints[self._index % len(self._endpoints)]
-        self._index = (self._index + 1) % len(self._endpoints)
-        return endpoint
+    def affinity_report(self) -> dict:
+        return self._balancer.affinity_report()
 
-    def chat(self, prompt: str) -> Optional[str]:
-        endpoint = self.next_endpoint()
-        if endpoint is None:
-            return None
-        url = endpoint.rstrip("/") + "/v1/chat/completions"
-        payload = {
-            "model": "relay-gguf",
-            "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
+    def endpoint_report(self) -> dict:
+        return self._balancer.report()
+
+    def hedge_report(self) -> dict:
+        return {
+            name: hedger.report()
+            for name, hedger in (("chat", self._hedger), ("stream", self._stream_hedger))
+            if hedger is not None
         }
-        data = json.dumps(payload).encode("utf-8")
-        req = request.Request(url, data=data, headers={"Content-Type": "application/json"})
-        try:
-            with request.urlopen(req, timeout=60) as resp:
-                body = resp.read().decode("utf-8")
-            parsed = json.loads(body)
-        except Exception:
-            return None
 
-        choices = parsed.get("choices", [])
-        if not choices:
-            return None
-        message = choices[0].get("message", {})
-        return str(message.get("content", "")).strip()
+    def chat(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> str:
+        """One reply; raises the last server's error if every server tried fails.
+
+        `params` are sampling fields added to the upstream request.
+        """
+        if self._hedger is None:
+            return self._chat_attempt(prompt, timeout, cancel, [], params)
+        return self._hedger.run(
+            lambda token, tried: self._chat_attempt(prompt, timeout, token, tried, params), cancel
+        )
 
     def chat_stream(
-        self, prompt: str, request_id: str, model_id: str
+        self,
+        prompt: str,
+        request_id: str,
+        model_id: str,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        timing: Optional[StreamTiming] = None,
+        params: Optional[Mapping[str, Any]] = None,
     ) -> Iterator[dict]:
-        """Stream chat completion chunks from backend in OpenAI SSE format."""
-        endpoint = self.next_endpoint()
-        if endpoint is None:
+        """Stream chat completion chunks from backend in OpenAI SSE format.
+
+        Chunks are yielded as each SSE event arrives, not after the body ends.
+        """
+        timing = timing if timing is not None else StreamTiming()
+        if self._stream_hedger is None:
+            yield from self._stream_attempt(
+                prompt, request_id, model_id, timeout, cancel, timing, [], params
+            )
             return
+
+        def open_stream(token: CancelToken, tried: list[str]):
+            attempt_timing = StreamTiming()
+            chunks = self._stream_attempt(
+                prompt, request_id, model_id, timeout, token, attempt_timing, tried, params
+            )
+            return next(chunks, None), chunks, attempt_timing
+
+        first, chunks, winner_timing = self._stream_hedger.run(
+            open_stream, cancel, discard=lambda opened: opened[1].close()
+        )
+        timing.sent_at, timing.first_event_at = winner_timing.sent_at, winner_timing.first_event_at
+        try:
+            if first is None:
+                return
+            yield first
+            yield from chunks
+        finally:
+            chunks.close()
+
+    def _chat_attempt(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        cancel: Optional[CancelToken],
+        tried: list[str],
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> str:
+        """One reply, from a server not in `tried` (each one used is added to it);
+        raises if every server tried fails."""
+        key = prefix_key(prompt, self._prefix_tokens)
+        error: Optional[Exception] = None
+        for _ in range(_ATTEMPTS):
+            with self._balancer.lease(key, exclude=tried) as pick:
+                if pick.endpoint is None:
+                    break
+                tried.append(pick.endpoint)
+                url = pick.endpoint.rstrip("/") + "/v1/chat/completions"
+                payload = {
+                    **(params or {}),
+                    "model": "relay-gguf",
+                    "messages": [{"role": "user", "content": prompt}],
+                    "stream": False,
+                }
+                try:
+                    with post_json(url, payload, _cap_timeout(timeout), cancel) as resp:
+                        parsed = json_codec.loads(resp.read())
+                except Exception as exc:
+                    if cancel is not None and cancel.cancelled:
+                        pick.ok = None
+                        raise
+                    pick.ok = False
+                    error = exc
+                    continue
+
+            choices = parsed.get("choices", [])
+            if not choices:
+                return ""
+            message = choices[0].get("message", {})
+            return str(message.get("content", "")).strip()
+        raise error or ConnectionError("no llama.cpp server available")
+
+    def _stream_attempt(
+        self,
+        prompt: str,
+        request_id: str,
+        model_id: str,
+        timeout: Optional[float],
+        cancel: Optional[CancelToken],
+        timing: StreamTiming,
+        tried: list[str],
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> Iterator[dict]:
+        key = prefix_key(prompt, self._prefix_tokens)
+        error: Optional[Exception] = None
+        for _ in range(_ATTEMPTS):
+            with self._balancer.lease(key, exclude=tried) as pick:
+                if pick.endpoint is None:
+                    break
+                tried.append(pick.endpoint)
+                started = False
+                try:
+                    for chunk in self._stream_from(
+                        pick.endpoint, prompt, request_id, model_id, timeout, cancel, timing, params
+                    ):
+                        if not started:
+                            started = True
+                            # Judge the server by its time to first byte, not by the reply length.
+                            ttfb_ms = timing.ttfb_ms()
+                            pick.latency_s = None if ttfb_ms is None else ttfb_ms / 1000.0
+                        yield chunk
+                    return
+                except Exception as exc:
+                    if cancel is not None and cancel.cancelled:
+                        pick.ok = None
+                        raise
+                    if started:
+                        raise
+                    pick.ok = False
+                    error = exc
+        if error is not None:
+            raise error
+
+    def _stream_from(
+        self,
+        endpoint: str,
+        prompt: str,
+        request_id: str,
+        model_id: str,
+        timeout: Optional[float],
+        cancel: Optional[CancelToken],
+        timing: StreamTiming,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> Iterator[dict]:
         url = endpoint.rstrip("/") + "/v1/chat/completions"
         payload = {
+            **(params or {}),
             "model": model_id,
             "messages": [{"role": "user", "content": prompt}],
             "stream": True,
         }
-        data = json.dumps(payload).encode("utf-8")
-        req = request.Request(
-            url, data=data, headers={"Content-Type": "application/json"}, method="POST"
-        )
-        try:
-            with request.urlopen(req, timeout=60) as resp:
-                content_type = (resp.headers.get("Content-Type") or "").lower()
-                body = resp.read().decode("utf-8")
-
-                if "text/event-stream" not in content_type and "application/json" in content_type:
-                    # Backend returned non-streaming JSON; emit one chunk then done
-                    parsed = json.loads(body)
-                    choices = parsed.get("choices", [])
-                    if choices:
-                        message = choices[0].get("message", {})
-                        content = str(message.get("content", "")).strip()
-                        yield {
-                            "id": request_id,
-                            "object": "chat.completion.chunk",
-                            "model": model_id,
-                            "choices": [
-                                {
-                                    "index": 0,
-                                    "delta": {"role": "assistant", "content": content},
-                                    "finish_reason": "stop",
-                                }
-                            ],
-                        }
+        timing.sent_at = time.perf_counter()
+        with post_json(url, payload, _cap_timeout(timeout), cancel) as resp:
+            content_type = (resp.headers.get("Content-Type") or "").lower()
+            if "text/event-stream" not in content_type and "application/json" in content_type:
+                # Backend returned non-streaming JSON; emit one chunk then done
+                parsed = json_codec.loads(resp.read())
+                timing.first_event_at = time.perf_counter()
+                choices = parsed.get("choices", [])
+                if choices:
+                    message = choices[0].get("message", {})
+                    content = str(message.get("content", "")).strip()
+                    yield {
+                        "id": request_id,
+                        "object": "chat.completion.chunk",
+                        "model": model_id,
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }
+                        ],
+                    }
+                return
+            # SSE: yield each event as it arrives
+            for data in iter_events(resp.read1):
+                if data == b"[DONE]":
+                    resp.mark_complete()
                     return
-                # SSE: parse line by line
-                for line in body.splitlines():
-                    line = line.strip()
-                    if not line.startswith("data: "):
-                        continue
-                    data_part = line[6:].strip()
-                    if data_part == "[DONE]":
-                        return
-                    try:
-                        chunk = json.loads(data_part)
-                        chunk["id"] = request_id
-                        if "model" not in chunk or not chunk["model"]:
-                            chunk["model"] = model_id
-                        yield chunk
-                    except json.JSONDecodeError:
-                        continue
-        except Exception:
-            raise
+                try:
+                    chunk = json_codec.loads(data)
+                except json_codec.JSONDecodeError:
+                    continue
+                if timing.first_event_at is None:
+                    timing.first_event_at = time.perf_counter()
+                chunk["id"] = request_id
+                if "model" not in chunk or not chunk["model"]:
+                    chunk["model"] = model_id
+                yield chunk
@@ -1,18 +1,37 @@
 from __future__ import annotations
 
-from concurrent.futures import Future
-from dataclasses import dataclass
-from queue import Empty, Queue
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
 import uuid
 import threading
 import time
+from typing import Any, Callable, Iterable, Iterator
 
+from relayserve.internal.cache.response_cache import ResponseCache
 from relayserve.internal.config.settings import Settings
-from relayserve.internal.device.registry import DeviceRegistry
+from relayserve.internal.device.registry import DeviceRegistry, RegistryRefresher
 from relayserve.internal.kv.manager import KVCacheManager
-from relayserve.internal.metrics.collector import MetricsCollector, RequestMetrics
+from relayserve.internal.metrics.collector import (
+    MetricsCollector,
+    RequestMetrics,
+    StreamLatencyCollector,
+)
+from relayserve.internal.metrics.shared import SharedMetrics
 from relayserve.internal.profile.probe import probe_devices
-from relayserve.internal.runner.runner import LlamaServerClient, Runner
+from relayserve.internal.queue.admission import AdmissionController
+from relayserve.internal.queue.batching import AdaptiveBatching, FixedBatching
+from relayserve.internal.queue.channel import StreamChannel
+from relayserve.internal.queue.lanes import BatchPolicy, DispatchLane
+from relayserve.internal.queue.queue import DEFAULT_TENANT
+from relayserve.internal.queue.singleflight import Broadcast, SingleFlight
+from relayserve.internal.queue.tenants import TenantPolicy
+from relayserve.internal.runner.balancer import EndpointBalancer, HealthChecker
+from relayserve.internal.runner.cancel import CancelToken, all_cancelled
+from relayserve.internal.runner.hedge import Hedger
+from relayserve.internal.runner.pool import pools_report
+from relayserve.internal.runner.runner import LlamaServerClient, Runner, StreamTiming
 from relayserve.internal.scheduler.scheduler import Scheduler
 from relayserve.internal.shard.plan import ShardPlanner
 
@@ -23,6 +42,51 @@ class RequestItem:
     future: Future[dict]
     enqueue_time: float
     model: str | None = None
+    tokens: int = 0
+    channel: StreamChannel | Broadcast | None = None
+    request_id: str = ""
+    tenant: str = DEFAULT_TENANT
+    deadline: float | None = None
+    lane: str = ""
+    cancel: CancelToken = field(default_factory=CancelToken)
+    key: str | None = None
+    cacheable: bool = False
+    # Sampling fields forwarded upstream (see keys.sampling_params).
+    params: dict[str, Any] = field(default_factory=dict)
+
+    def remaining(self) -> float | None:
+        """Seconds left before the deadline (never below a millisecond), or None."""
+        if self.deadline is None:
+            return None
+        return max(0.001, self.deadline - time.perf_counter())
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+
+class DrainingError(Exception):
+    """Raised for new work once the app has started draining."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request cannot be answered before its deadline."""
+
+
+class ClientGoneError(Exception):
+    """Raised for a request whose client disconnected before the reply."""
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised when every configured upstream for a request failed it."""
+
+
+# How often handle_chat checks whether its client is still connected.
+_CLIENT_POLL_S = 0.25
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Rough token count used for queue accounting, matching the usage figures."""
+    return max(1, len(prompt.split()))
 
 
 def _get_router():
@@ -34,95 +98,487 @@ def _get_router():
 
 
 class RelayApp:
-    def __init__(self, settings: Settings, router=None) -> None:
+    def __init__(
+        self, settings: Settings, router=None, shared_metrics: SharedMetrics | None = None
+    ) -> None:
         self.settings = settings
         self.router = router
+        self.shared_metrics = shared_metrics
         self.registry = DeviceRegistry()
         self.registry.add_all(probe_devices())
+        self.device_refresher = RegistryRefresher(
+            self.registry, probe_devices, settings.device_probe_interval_s
+        )
+        self.device_refresher.start()
         self.scheduler = Scheduler(self.registry)
         self.runner = Runner()
-        self.llama_client = LlamaServerClient(settings.backends)
+        balancer = EndpointBalancer(
+            settings.backends,
+            policy=settings.lb_policy,
+            load_factor=settings.affinity_load_factor,
+            eject_failures=settings.eject_failures,
+            eject_s=settings.eject_s,
+            ramp_s=settings.readmit_ramp_s,
+        )
+        self.llama_client = LlamaServerClient(
+            settings.backends,
+            prefix_tokens=settings.affinity_prefix_tokens,
+            balancer=balancer,
+            hedger=self._hedger(settings),
+            stream_hedger=self._hedger(settings),
+        )
+        self.health_checker = HealthChecker(balancer, settings.health_check_interval_s)
+        self.health_checker.start()
         self.metrics = MetricsCollector(settings.metrics_max_items)
+        self.stream_latency = StreamLatencyCollector(settings.metrics_max_items)
         self.shard_planner = ShardPlanner()
         self.kv_cache = KVCacheManager()
-        self._queue: Queue[RequestItem] = Queue()
+        self._lanes: dict[str, DispatchLane] = {}
+        self._lanes_lock = threading.Lock()
+        self.admission = AdmissionController(settings.max_queue_depth, settings.max_queued_tokens)
+        self.tenants = TenantPolicy.from_spec(settings.tenants, settings.tenant_tokens_per_minute)
+        self.draining = False
+        self._drain_listeners: list[Callable[[], None]] = []
+        self._inflight = 0
+        self._idle = threading.Condition()
         self._batch_size = max(1, settings.batch_size)
         self._batch_wait_s = max(0.0, settings.batch_wait_ms / 1000.0)
-        self._worker = threading.Thread(target=self._run_loop, daemon=True)
-        self._worker.start()
+        self._dropped = {
+            "cancelled": 0,
+            "deadline": 0,
+            "disconnect_queued": 0,
+            "disconnect_running": 0,
+        }
+        self._dropped_lock = threading.Lock()
+        # Upstream calls that carried several requests, and how many requests they carried.
+        self._upstream_batches = {"calls": 0, "requests": 0}
+        self._upstream_batches_lock = threading.Lock()
+        self._pending: dict[Future, RequestItem] = {}
+        self._pending_lock = threading.Lock()
+        self.flights = SingleFlight()
+        self.cache: ResponseCache | None = None
+        if settings.cache_max_bytes > 0 or settings.cache_path:
+            self.cache = ResponseCache(
+                settings.cache_max_bytes,
+                settings.cache_ttl_s,
+                path=settings.cache_path,
+                disk_max_bytes=settings.cache_disk_max_bytes,
+            )
 
-    def handle_chat(self, prompt: str, model: str | None = None) -> dict:
-        future: Future[dict] = Future()
-        self._queue.put(
-            RequestItem(
-                prompt=prompt,
-                future=future,
-                enqueue_time=time.perf_counter(),
-                model=model,
+    def handle_chat(
+        self,
+        prompt: str,
+        model: str | None = None,
+        tenant: str | None = None,
+        timeout_s: float | None = None,
+        client_gone: Callable[[], bool] | None = None,
+        key: str | None = None,
+        params: dict[str, Any] | None = None,
+    ) -> dict:
+        """Run a chat request and wait for the reply, up to its deadline.
+
+        Raises DeadlineExceededError once the deadline passes, and
+        ClientGoneError as soon as `client_gone` (polled while waiting) returns
+        True; either way the request is abandoned (see abandon()).
+        """
+        timeout_s = self.resolve_timeout(timeout_s)
+        future = self.submit_chat(
+            prompt, model=model, tenant=tenant, timeout_s=timeout_s, key=key, params=params
+        )
+        deadline = None if timeout_s is None else time.perf_counter() + timeout_s
+        while True:
+            wait = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if client_gone is not None:
+                wait = _CLIENT_POLL_S if wait is None else min(wait, _CLIENT_POLL_S)
+            try:
+                return future.result(timeout=wait)
+            except FutureTimeoutError:
+                pass
+            if deadline is not None and time.perf_counter() >= deadline:
+                self.abandon(future, reason="deadline")
+                raise DeadlineExceededError()
+            if client_gone is not None and client_gone():
+                self.abandon(future)
+                raise ClientGoneError()
+
+    @property
+    def cache_on_disk(self) -> bool:
+        """Whether a cache lookup may read the disk tier, and so block."""
+        return self.cache is not None and self.cache.on_disk
+
+    def submit_chat(
+        self,
+        prompt: str,
+        model: str | None = None,
+        tenant: str | None = None,
+        timeout_s: float | None = None,
+        key: str | None = None,
+        params: dict[str, Any] | None = None,
+    ) -> Future[dict]:
+        """Enqueue a chat request and return its future without blocking.
+
+        Requests are queued fairly across tenants (see TenantPolicy) and
+        earliest deadline first within a tenant; timeout_s defaults to
+        settings.request_timeout_ms. Raises DrainingError once a drain has
+        started, and OverloadedError when admission control sheds the request.
+        The future fails with DeadlineExceededError if the deadline cannot be
+        met; cancelling it while queued drops the request.
+
+        A `key` (see keys.request_key; deterministic requests only) makes the
+        reply cacheable: a cached reply completes the future at once, and
+        requests with the same key while one is in flight share its upstream
+        call. `params` are the sampling fields sent upstream with the prompt.
+        """
+        if key is not None:
+            cached = self._cached_reply(key)
+            if cached is not None:
+                future: Future[dict] = Future()
+                future.set_result(cached)
+                return future
+        enqueue = partial(
+            self._enqueue, prompt, model, tenant=tenant, timeout_s=timeout_s, key=key, params=params
+        )
+        if key is None or not self.settings.coalesce:
+            return enqueue()
+        if self.draining:
+            raise DrainingError()
+        return self.flights.join(key, enqueue)
+
+    def submit_stream(
+        self,
+        prompt: str,
+        request_id: str,
+        model: str | None = None,
+        tenant: str | None = None,
+        timeout_s: float | None = None,
+        key: str | None = None,
+        params: dict[str, Any] | None = None,
+    ) -> StreamChannel:
+        """Enqueue a streaming chat request and return the channel its events arrive on.
+
+        The stream is admitted, queued and dispatched like any other request,
+        on its backend's stream lane, and holds a worker of that lane while it
+        runs. Events are delta strings or complete
+        chunk dicts; the consumer must cancel() the channel if it stops early.
+        A stream that reaches its deadline ends with a deadline_exceeded chunk.
+        Raises like submit_chat; a cached reply is replayed as a stream, and
+        streams with the same `key` share one upstream stream, fanned out to
+        each client.
+        """
+        if key is not None:
+            cached = self._cached_reply(key)
+            if cached is not None:
+                channel = StreamChannel(0)
+                if cached["reply"]:
+                    channel.put(cached["reply"])
+                channel.finish()
+                return channel
+        if key is not None and self.settings.coalesce:
+            if self.draining:
+                raise DrainingError()
+            return self.flights.join_stream(
+                key,
+                request_id,
+                lambda broadcast: self._enqueue(
+                    prompt,
+                    model,
+                    channel=broadcast,
+                    request_id=request_id,
+                    tenant=tenant,
+                    timeout_s=timeout_s,
+                    key=key,
+                    params=params,
+                ),
             )
+        channel = StreamChannel(self.settings.stream_buffer_events)
+        self._enqueue(
+            prompt,
+            model,
+            channel=channel,
+            request_id=request_id,
+            tenant=tenant,
+            timeout_s=timeout_s,
+            key=key,
+            params=params,
         )
-        return future.result()
+        return channel
+
+    def abandon(self, future: Future, reason: str = "disconnect") -> None:
+        """Give up on a request whose caller no longer wants the reply.
+
+        A request still queued is removed and its future cancelled; one already
+        running has its upstream call aborted, so the backend stops generating.
+        Disconnects are counted in metrics as disconnect_queued/_running.
+        Streams are abandoned by cancelling their channel before it finishes.
+        A shared (coalesced) request is only abandoned by its last caller.
+        """
+        future = self.flights.release(future)
+        if future is None:
+            return
+        with self._pending_lock:
+            item = self._pending.get(future)
+        if item is not None:
+            self._abandon_item(item, reason)
+
+    @contextmanager
+    def inflight(self) -> Iterator[None]:
+        """Count work outside the queue (a stream) as in flight for draining."""
+        self._begin_request()
+        try:
+            yield
+        finally:
+            self._end_request()
+
+    def on_drain(self, listener: Callable[[], None]) -> None:
+        self._drain_listeners.append(listener)
+
+    def request_drain(self) -> None:
+        """Refuse new work from now on and tell listeners (the server) to wind down."""
+        with self._idle:
+            if self.draining:
+                return
+            self.draining = True
+        for listener in self._drain_listeners:
+            listener()
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Block until no request is queued or in flight; False if timeout expired."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._inflight == 0, timeout)
 
     def metrics_report(self) -> dict:
-        return {
+        report = {
             "stats": self.metrics.report(),
-            "queue_depth": self._queue.qsize(),
+            "streaming": self.stream_latency.report(),
+            "queue_depth": self._queue_depth(),
+            "lanes": {name: lane.report() for name, lane in list(self._lanes.items())},
+            "admission": self.admission.report(),
+            "dropped": self._dropped_report(),
+            "coalescing": self.flights.report(),
+            "cache": self.cache.report() if self.cache is not None else {"enabled": False},
+            "affinity": self._affinity_report(),
+            "llama_endpoints": self.llama_client.endpoint_report(),
+            "hedging": self._hedge_report(),
+            "circuit_breakers": self._breaker_report(),
+            "upstream_batches": self._upstream_batch_report(),
+            "upstream_pools": pools_report(),
+            "tenants": self.tenants.report(),
+            "draining": self.draining,
+            "inflight": self._inflight,
             "kv": self._kv_report(),
             "shard_plan": self._current_shard_plan(),
+            "devices": self.device_refresher.report(),
         }
+        if self.shared_metrics is not None:
+            self._publish_shared()
+            report["fleet"] = self.shared_metrics.report()
+        return report
 
-    def _run_loop(self) -> None:
-        while True:
-            item = self._queue.get()
-            batch = [item]
-            deadline = time.perf_counter() + self._batch_wait_s
-            while len(batch) < self._batch_size:
-                timeout = max(0.0, deadline - time.perf_counter())
-                if timeout == 0.0:
-                    break
-                try:
-                    batch.append(self._queue.get(timeout=timeout))
-                except Empty:
-                    break
-            self._process_batch(batch)
+    def _enqueue(
+        self,
+        prompt: str,
+        model: str | None,
+        channel: StreamChannel | Broadcast | None = None,
+        request_id: str = "",
+        tenant: str | None = None,
+        timeout_s: float | None = None,
+        key: str | None = None,
+        params: dict[str, Any] | None = None,
+    ) -> Future[dict]:
+        if self.draining:
+            raise DrainingError()
+        tokens = estimate_tokens(prompt)
+        self.admission.admit(tokens)
+        tenant = self.tenants.label(tenant)
+        over_budget = self.tenants.charge(tenant, tokens)
+        future: Future[dict] = Future()
+        self._begin_request()
+        future.add_done_callback(self._request_done)
+        timeout_s = self.resolve_timeout(timeout_s)
+        enqueue_time = time.perf_counter()
+        item = RequestItem(
+            prompt=prompt,
+            future=future,
+            enqueue_time=enqueue_time,
+            model=model,
+            tokens=tokens,
+            channel=channel,
+            request_id=request_id,
+            tenant=tenant,
+            deadline=None if timeout_s is None else enqueue_time + timeout_s,
+            key=key,
+            params=dict(params or {}),
+        )
+        lane = self._lane_for(model, stream=channel is not None)
+        item.lane = lane.name
+        with self._pending_lock:
+            self._pending[future] = item
+        if channel is not None:
+            channel.on_cancel(lambda: self._abandon_item(item, "disconnect"))
+        lane.put(item, tenant, tokens, over_budget)
+        return future
+
+    def resolve_timeout(self, timeout_s: float | None) -> float | None:
+        """A request's timeout in seconds: its own if given, else the server default."""
+        if timeout_s is not None and timeout_s > 0:
+            return timeout_s
+        default_ms = self.settings.request_timeout_ms
+        return default_ms / 1000.0 if default_ms > 0 else None
+
+    def _discard(self, item: RequestItem, reason: str) -> None:
+        """Account for a request the lane dropped instead of serving."""
+        self.admission.release(item.tokens)
+        self.tenants.dequeued(item.tenant)
+        self._count_dropped(reason)
+        if item.channel is not None:
+            if reason == "deadline":
+                item.channel.put(_error_chunk(item.request_id, self.settings.model_id, "deadline_exceeded"))
+            item.channel.finish()
+        if not item.future.done():
+            item.future.set_exception(DeadlineExceededError())
+
+    def _abandon_item(self, item: RequestItem, reason: str) -> None:
+        lane = self._lanes.get(item.lane)
+        if lane is not None and lane.remove(item, item.tenant):
+            item.future.cancel()
+            self._discard(item, "cancelled" if reason == "deadline" else "disconnect_queued")
+            return
+        if item.future.done() or item.cancel.cancelled:
+            return
+        item.cancel.cancel()
+        if reason != "deadline":
+            self._count_dropped("disconnect_running")
+
+    def _affinity_report(self) -> dict:
+        report = {"llama": self.llama_client.affinity_report()}
+        affinity_report = getattr(self.router, "affinity_report", None)
+        if affinity_report is not None:
+            report["backends"] = affinity_report()
+        return report
+
+    @staticmethod
+    def _hedger(settings: Settings) -> Hedger | None:
+        if not settings.hedge:
+            return None
+        return Hedger(percentile=settings.hedge_percentile, budget=settings.hedge_budget)
+
+    def _hedge_report(self) -> dict:
+        report = {"llama": self.llama_client.hedge_report()}
+        hedge_report = getattr(self.router, "hedge_report", None)
+        if hedge_report is not None:
+            report["backends"] = hedge_report()
+        return report
+
+    def _upstream_batch_report(self) -> dict:
+        with self._upstream_batches_lock:
+            calls, requests = self._upstream_batches["calls"], self._upstream_batches["requests"]
+        return {"calls": calls, "requests": requests, "avg_size": requests / calls if calls else 0.0}
+
+    def _breaker_report(self) -> dict:
+        breaker_report = getattr(self.router, "breaker_report", None)
+        return breaker_report() if breaker_report is not None else {}
+
+    def _count_dropped(self, reason: str) -> None:
+        with self._dropped_lock:
+            self._dropped[reason] = self._dropped.get(reason, 0) + 1
+
+    def _dropped_report(self) -> dict:
+        with self._dropped_lock:
+            return dict(self._dropped)
+
+    def _begin_request(self) -> None:
+        with self._idle:
+            self._inflight += 1
+
+    def _request_done(self, future: Future) -> None:
+        with self._pending_lock:
+            self._pending.pop(future, None)
+        self._end_request()
+
+    def _end_request(self) -> None:
+        with self._idle:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.notify_all()
+
+    def _lane_for(self, model: str | None, stream: bool = False) -> DispatchLane:
+        """The dispatch lane for the backend a model resolves to, created on first use.
+
+        Config backends get a lane each (sized by their `concurrency` key);
+        everything else shares the llama.cpp/scheduler lane. Streams, which
+        hold a worker until they end, go to a separate `:stream` lane per
+        backend, sized by settings.stream_concurrency, so they neither wait
+        behind each other nor take workers from batched requests.
+        """
+        name, concurrency, batches_upstream = "llama", None, False
+        if self.router and self.router.has_backends:
+            key, backend = self.router.resolve(model)
+            if backend is not None:
+                name, concurrency = f"backend:{key}", self.router.concurrency(key)
+                batches_upstream = getattr(backend, "supports_batch", False)
+        if stream:
+            name, concurrency = f"{name}:stream", self.settings.stream_concurrency
+        lane = self._lanes.get(name)
+        if lane is not None:
+            return lane
+        with self._lanes_lock:
+            lane = self._lanes.get(name)
+            if lane is None:
+                lane = DispatchLane(
+                    name,
+                    self._process_batch,
+                    concurrency=concurrency or self.settings.lane_concurrency,
+                    policy=self._batch_policy(batches_upstream),
+                    batchable=lambda item: item.channel is None,
+                    weight=self.tenants.weight,
+                    deadline=lambda item: item.deadline,
+                    discard=self._discard,
+                )
+                self._lanes[name] = lane
+            return lane
+
+    def _batch_policy(self, batches_upstream: bool) -> BatchPolicy:
+        if self.settings.batch_policy == "fixed":
+            return FixedBatching(self._batch_size, self._batch_wait_s)
+        return AdaptiveBatching(
+            self.settings.batch_slo_ms / 1000.0,
+            max(1, self.settings.batch_max_size),
+            batches_upstream=bool(batches_upstream),
+        )
+
+    def _queue_depth(self) -> int:
+        return sum(lane.qsize() for lane in list(self._lanes.values()))
 
     def _process_batch(self, batch: list[RequestItem]) -> None:
         batch_size = len(batch)
+        for item in batch:
+            self.admission.release(item.tokens)
+            self.tenants.dequeued(item.tenant)
+        served = self._serve_together(batch)
         for item in batch:
             start = time.perf_counter()
-            reply = None
-            backend_name = "none"
-            device_label = "none"
-
-            if self.router and self.router.has_backends:
-                backend = self.router.get_backend(item.model)
-                if backend is not None:
-                    try:
-                        reply = backend.generate(item.prompt, stream=False)
-                        backend_name = item.model or "default"
-                        device_label = f"config:{backend_name}"
-                    except Exception:
-                        reply = None
-
-            if reply is None:
-                decision = self.scheduler.pick_device(item.prompt)
-                if decision is None:
-                    reply = "No devices available."
+            try:
+                if item.cancel.cancelled:
+                    raise ClientGoneError()
+                if id(item) in served:
+                    start, reply, backend_name, device_label, first_at = served[id(item)]
+                elif item.channel is not None:
+                    reply, backend_name, device_label, first_at = self._serve_stream(item)
                 else:
-                    request_id = uuid.uuid4().hex
-                    shard_plan = self.shard_planner.plan(self.registry.list(), self.settings.total_layers)
-                    self._seed_kv_prefix(request_id, item.prompt, shard_plan)
-                    self._handoff_kv(request_id, shard_plan)
-                    reply = self.llama_client.chat(item.prompt)
-                    if not reply:
-                        reply = self.runner.run(decision.device, item.prompt)
-                        backend_name = decision.device.backend
-                    else:
-                        backend_name = "llama.cpp"
-                    device_label = f"{decision.device.backend}:{decision.device.name}"
-                    self.kv_cache.drop(request_id)
+                    reply, backend_name, device_label = self._serve(item)
+                    first_at = time.perf_counter()
+            except DeadlineExceededError as exc:
+                self._count_dropped("deadline")
+                item.future.set_exception(exc)
+                continue
+            except ClientGoneError as exc:
+                item.future.set_exception(exc)
+                continue
+            except UpstreamUnavailableError as exc:
+                item.future.set_exception(exc)
+                continue
 
-            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            elapsed_ms = (first_at - start) * 1000.0
             queue_ms = (start - item.enqueue_time) * 1000.0
             self.metrics.record(
                 RequestMetrics(
@@ -134,6 +590,7 @@ class RelayApp:
                     backend=backend_name,
                 )
             )
+            self.tenants.record(item.tenant, queue_ms, elapsed_ms)
             item.future.set_result(
                 {
                     "reply": reply,
@@ -146,6 +603,224 @@ class RelayApp:
                     },
                 }
             )
+            if item.cacheable:
+                self._store_reply(item, reply, backend_name, device_label)
+        if self.shared_metrics is not None:
+            self._publish_shared()
+
+    def _serve_together(self, batch: list[RequestItem]) -> dict[int, tuple]:
+        """Send the batch's non-streaming requests for a backend that
+        supports_batch as one upstream call.
+
+        Returns (start, reply, backend name, device label, first_at) by
+        id(item) for the requests served. If the call fails, its requests are
+        left to be served one by one, with the usual fallbacks; so is any
+        request the call returned no reply for.
+        """
+        groups: dict[tuple, tuple[Any, list[RequestItem]]] = {}
+        for item in batch:
+            if item.channel is not None or item.cancel.cancelled:
+                continue
+            backend = self._config_backend(item.model)
+            if backend is None or not getattr(backend, "supports_batch", False):
+                continue
+            # One call carries one set of sampling fields.
+            group = (id(backend), repr(sorted(item.params.items())))
+            groups.setdefault(group, (backend, []))[1].append(item)
+        served: dict[int, tuple] = {}
+        for backend, items in groups.values():
+            if len(items) < 2:
+                continue
+            deadlines = [item.remaining() for item in items]
+            start = time.perf_counter()
+            try:
+                replies = backend.generate_batch(
+                    [item.prompt for item in items],
+                    # The earliest deadline bounds the shared call.
+                    timeout=min((d for d in deadlines if d is not None), default=None),
+                    cancel=all_cancelled([item.cancel for item in items]),
+                    params=items[0].params,
+                )
+            except Exception:
+                continue
+            first_at = time.perf_counter()
+            answered = [(item, reply) for item, reply in zip(items, replies) if reply is not None]
+            with self._upstream_batches_lock:
+                self._upstream_batches["calls"] += 1
+                self._upstream_batches["requests"] += len(answered)
+            for item, reply in answered:
+                item.cacheable = True
+                backend_name = item.model or "default"
+                served[id(item)] = (start, reply, backend_name, f"config:{backend_name}", first_at)
+        return served
+
+    def _cached_reply(self, key: str) -> dict | None:
+        """The reply data for a cache hit, shaped like a served reply; None on a miss."""
+        if self.cache is None:
+            return None
+        if self.draining:
+            raise DrainingError()
+        found = self.cache.get(key)
+        if found is None:
+            return None
+        value, tier = found
+        return {
+            "reply": value.get("reply", ""),
+            "meta": {
+                "device": value.get("device", "none"),
+                "backend": value.get("backend", "none"),
+                "queue_ms": 0.0,
+                "ttft_ms": 0.0,
+                "batch_size": 0,
+                "cache": tier,
+            },
+        }
+
+    def _store_reply(
+        self, item: RequestItem, reply: str, backend_name: str, device_label: str
+    ) -> None:
+        if self.cache is None or item.key is None:
+            return
+        self.cache.put(item.key, {"reply": reply, "backend": backend_name, "device": device_label})
+
+    def _config_backend(self, model: str | None):
+        if self.router and self.router.has_backends:
+            return self.router.get_backend(model)
+        return None
+
+    def _serve(self, item: RequestItem) -> tuple[str, str, str]:
+        """Complete one request; returns (reply, backend name, device label)."""
+        backend = self._config_backend(item.model)
+        if backend is not None:
+            try:
+                reply = backend.generate(
+                    item.prompt,
+                    stream=False,
+                    timeout=item.remaining(),
+                    cancel=item.cancel,
+                    params=item.params,
+                )
+                item.cacheable = True
+                backend_name = item.model or "default"
+                return reply, backend_name, f"config:{backend_name}"
+            except Exception as exc:
+                if item.cancel.cancelled:
+                    raise ClientGoneError() from exc
+                if item.expired():
+                    # The backend timed out on the deadline; do not start a fallback.
+                    raise DeadlineExceededError() from exc
+                if not self.llama_client.has_backends():
+                    # Nothing real is left to try; the echo runner is no answer.
+                    raise UpstreamUnavailableError() from exc
+
+        decision = self.scheduler.pick_device(item.prompt)
+        if decision is None:
+            return "No devices available.", "none", "none"
+        request_id = uuid.uuid4().hex
+        shard_plan = self.shard_planner.plan_for(self.registry, self.settings.total_layers)
+        self._seed_kv_prefix(request_id, item.prompt, shard_plan)
+        self._handoff_kv(request_id, shard_plan)
+        try:
+            if self.llama_client.has_backends():
+                try:
+                    reply = self.llama_client.chat(
+                        item.prompt,
+                        timeout=item.remaining(),
+                        cancel=item.cancel,
+                        params=item.params,
+                    )
+                except Exception as exc:
+                    if item.cancel.cancelled:
+                        raise ClientGoneError() from exc
+                    if item.expired():
+                        raise DeadlineExceededError() from exc
+                    # A configured upstream failed: an error, not a local stand-in reply.
+                    raise UpstreamUnavailableError() from exc
+                item.cacheable = True
+                backend_name = "llama.cpp"
+            else:
+                reply = self.runner.run(decision.device, item.prompt)
+                backend_name = decision.device.backend
+        finally:
+            self.kv_cache.drop(request_id)
+        return reply, backend_name, f"{decision.device.backend}:{decision.device.name}"
+
+    def _serve_stream(self, item: RequestItem) -> tuple[str, str, str, float]:
+        """Relay one upstream stream into item.channel.
+
+        Returns (reply text, backend name, device label, time of first event).
+        The channel is always finished, with a deadline_exceeded chunk if the
+        deadline passed mid-stream (upstream is closed) or a stream_failed
+        chunk if upstream raised.
+        """
+        relay = _Relay(item.channel, item.deadline)
+        backend_name, device_label = "none", "none"
+        try:
+            backend = self._config_backend(item.model)
+            if backend is not None:
+                backend_name = item.model or "default"
+                device_label = f"config:{backend_name}"
+                chunks = backend.generate(
+                    item.prompt,
+                    stream=True,
+                    timeout=item.remaining(),
+                    cancel=item.cancel,
+                    params=item.params,
+                )
+                relay.forward(_contents(chunks))
+                item.cacheable = relay.complete
+            elif self.llama_client.has_backends():
+                backend_name = "llama.cpp"
+                decision = self.scheduler.pick_device(item.prompt)
+                kv_id = uuid.uuid4().hex
+                if decision is not None:
+                    device_label = f"{decision.device.backend}:{decision.device.name}"
+                    shard_plan = self.shard_planner.plan_for(self.registry, self.settings.total_layers)
+                    self._seed_kv_prefix(kv_id, item.prompt, shard_plan)
+                    self._handoff_kv(kv_id, shard_plan)
+                timing = StreamTiming()
+                try:
+                    relay.forward(
+                        self.llama_client.chat_stream(
+                            item.prompt,
+                            item.request_id,
+                            self.settings.model_id,
+                            timeout=item.remaining(),
+                            cancel=item.cancel,
+                            timing=timing,
+                            params=item.params,
+                        )
+                    )
+                    item.cacheable = relay.complete
+                finally:
+                    self.kv_cache.drop(kv_id)
+                    self._record_stream_latency(item, timing, relay.first_at)
+            else:
+                reply, backend_name, device_label = self._serve(item)
+                relay.forward([_final_chunk(item.request_id, self.settings.model_id, reply)])
+                item.cacheable = item.cacheable and relay.complete
+        except Exception:
+            item.cacheable = False
+            error = "stream_failed"
+            if item.cancel.cancelled:
+                # Aborted because the client left; there is no one to tell.
+                error = ""
+            elif item.expired():
+                error = "deadline_exceeded"
+                self._count_dropped("deadline")
+            if error:
+                item.channel.put(_error_chunk(item.request_id, self.settings.model_id, error))
+        finally:
+            item.channel.finish()
+        return relay.text(), backend_name, device_label, relay.first_at or time.perf_counter()
+
+    def _record_stream_latency(
+        self, item: RequestItem, timing: StreamTiming, first_at: float | None
+    ) -> None:
+        upstream_ttfb_ms = timing.ttfb_ms()
+        if upstream_ttfb_ms is None or first_at is None:
+            return
+        self.stream_latency.record(upstream_ttfb_ms, (first_at - item.enqueue_time) * 1000.0)
 
     def _seed_kv_prefix(self, request_id: str, prompt: str, shard_plan) -> None:
         prefix_tokens = max(1, len(prompt.split()))
@@ -166,14 +841,109 @@ class RelayApp:
             "offloads": stats.offloads,
         }
 
+    def _publish_shared(self) -> None:
+        totals = self.metrics.totals()
+        kv = self.kv_cache.stats()
+        self.shared_metrics.publish(
+            {
+                "count": totals["count"],
+                "ttft_ms": totals["ttft_ms"],
+                "queue_ms": totals["queue_ms"],
+                "tokens": totals["tokens"],
+                "queue_depth": self._queue_depth(),
+                "kv_cached_tokens": kv.cached_tokens,
+                "kv_resident_bytes": kv.resident_bytes,
+                "kv_handoffs": kv.handoffs,
+                "kv_offloads": kv.offloads,
+            }
+        )
+
     def _current_shard_plan(self) -> dict:
-        plan = self.shard_planner.plan(self.registry.list(), self.settings.total_layers)
+        plan = self.shard_planner.plan_for(self.registry, self.settings.total_layers)
         return {
             "placements": plan.placements,
             "layer_ranges": plan.layer_ranges,
         }
 
 
-def build_app(settings: Settings) -> RelayApp:
+class _Relay:
+    """Forwards upstream stream events into a channel, keeping the text for metrics."""
+
+    def __init__(
+        self, channel: StreamChannel | Broadcast, deadline: float | None = None
+    ) -> None:
+        self._channel = channel
+        self._deadline = deadline
+        self._parts: list[str] = []
+        self.first_at: float | None = None
+        # True once upstream ran to its end with every event delivered.
+        self.complete = False
+
+    def forward(self, events: Iterable[Any]) -> None:
+        try:
+            for event in events:
+                if not event:
+                    continue
+                if self.first_at is None:
+                    self.first_at = time.perf_counter()
+                self._parts.append(event if isinstance(event, str) else _chunk_content(event))
+                if not self._channel.put(event):
+                    # The client went away; stop reading from upstream.
+                    return
+                if self._deadline is not None and time.perf_counter() >= self._deadline:
+                    raise DeadlineExceededError()
+            self.complete = True
+        finally:
+            _close(events)
+
+    def text(self) -> str:
+        return "".join(self._parts)
+
+
+def _contents(chunks: Iterable[dict]) -> Iterator[str]:
+    """Content deltas from a config backend's {"content": ...} stream."""
+    try:
+        for chunk in chunks:
+            yield chunk.get("content", "")
+    finally:
+        _close(chunks)
+
+
+def _close(events: Iterable[Any]) -> None:
+    close = getattr(events, "close", None)
+    if close is not None:
+        close()
+
+
+def _chunk_content(chunk: dict) -> str:
+    for choice in chunk.get("choices") or []:
+        delta = choice.get("delta") or choice.get("message") or {}
+        return str(delta.get("content") or "")
+    return ""
+
+
+def _final_chunk(request_id: str, model_id: str, content: str) -> dict:
+    return {
+        "id": request_id,
+        "object": "chat.completion.chunk",
+        "model": model_id,
+        "choices": [
+            {
+                "index": 0,
+                "delta": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+    }
+
+
+def _error_chunk(request_id: str, model_id: str, error: str) -> dict:
+    chunk = _final_chunk(request_id, model_id, "")
+    chunk["choices"][0]["delta"] = {"content": ""}
+    chunk["error"] = error
+    return chunk
+
+
+def build_app(settings: Settings, shared_metrics: SharedMetrics | None = None) -> RelayApp:
     router = _get_router()
-    return RelayApp(settings, router=router)
+    return RelayApp(settings, router=router, shared_metrics=shared_metrics)
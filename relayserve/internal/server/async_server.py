@@ -0,0 +1,451 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Future
+from contextlib import suppress
+from dataclasses import dataclass
+from functools import partial
+from http import HTTPStatus
+from queue import Empty
+import socket
+from typing import Optional
+from urllib.parse import urlparse
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.queue.admission import OverloadedError
+from relayserve.internal.queue.channel import END, StreamChannel
+from relayserve.internal.queue.tenants import tenant_from_headers
+from relayserve.internal.server.app import (
+    ClientGoneError,
+    DeadlineExceededError,
+    DrainingError,
+    RelayApp,
+    UpstreamUnavailableError,
+)
+from relayserve.internal.server.http_server import (
+    ADMIN_DRAIN_PATH,
+    CHAT_PATHS,
+    _HTTPError,
+    _admin_drain,
+    _chunk_size,
+    _content_length,
+    _decode_payload,
+    _encode_json,
+    _extract_prompt,
+    _get_request_id,
+    _is_chunked,
+    _overloaded,
+    _poll_timeout,
+    _render_chat,
+    _request_timeout,
+    _route_get,
+    _sampling,
+    _sse_writer,
+)
+from relayserve.internal.server.keys import request_key
+from relayserve.internal.server.lifecycle import Lifecycle, listen_socket, notify_handoff_ready
+
+_MAX_HEADER_BYTES = 64 * 1024
+
+
+class _Headers(dict):
+    """Request headers keyed by lower-cased name, with case-insensitive get."""
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return super().get(key.lower(), default)
+
+
+@dataclass
+class _Request:
+    method: str
+    target: str
+    version: str
+    headers: _Headers
+    body: bytes
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = (self.headers.get("Connection") or "").lower()
+        if self.version == "HTTP/1.0":
+            return "keep-alive" in connection
+        return "close" not in connection
+
+
+class AsyncRelayServer:
+    """Serves the RelayHandler routes on a single asyncio event loop.
+
+    Each connection is a coroutine rather than an OS thread. Upstream streams
+    run on the app's dispatch lanes; their events arrive on a StreamChannel that
+    wakes the loop, and held SSE deltas are flushed on a timer while the next
+    event is outstanding.
+    """
+
+    def __init__(self, app: RelayApp, settings: Settings) -> None:
+        self._app = app
+        self._settings = settings
+
+    async def start(
+        self, host: str = "", port: Optional[int] = None, sock: Optional[socket.socket] = None
+    ) -> asyncio.AbstractServer:
+        if sock is not None:
+            return await asyncio.start_server(
+                self._handle_connection, sock=sock, limit=_MAX_HEADER_BYTES
+            )
+        return await asyncio.start_server(
+            self._handle_connection,
+            host or None,
+            self._settings.port if port is None else port,
+            limit=_MAX_HEADER_BYTES,
+        )
+
+    async def serve_forever(self, reuse_port: bool = False, handoff: bool = True) -> None:
+        loop = asyncio.get_running_loop()
+        sock = listen_socket(self._settings.port, reuse_port=reuse_port)
+        server = await self.start(sock=sock)
+        stopped = asyncio.Event()
+        lifecycle = Lifecycle(
+            self._app,
+            self._settings,
+            sock,
+            stop_accepting=lambda: loop.call_soon_threadsafe(server.close),
+            stop=lambda: loop.call_soon_threadsafe(stopped.set),
+        )
+        lifecycle.install_signals(handoff=handoff, loop=loop)
+        notify_handoff_ready()
+        async with server:
+            await stopped.wait()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        idle_timeout = self._settings.keepalive_timeout_s
+        max_requests = self._settings.max_keepalive_requests
+        served = 0
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        _read_request(reader, writer, self._settings.max_body_bytes),
+                        idle_timeout if idle_timeout > 0 else None,
+                    )
+                except asyncio.TimeoutError:
+                    break
+                except _HTTPError as exc:
+                    await self._send_json(writer, exc.status, {"error": exc.error}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                served += 1
+                keep_alive = (
+                    request.keep_alive
+                    and not (0 < max_requests <= served)
+                    and not self._app.draining
+                )
+                if not await self._dispatch(request, reader, writer, keep_alive):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+
+    async def _dispatch(
+        self,
+        request: _Request,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        keep_alive: bool,
+    ) -> bool:
+        """Serve one request and return whether the connection stays open."""
+        path = urlparse(request.target).path
+        if request.method == "GET":
+            status, payload = _route_get(self._app, path)
+            await self._send_json(writer, status, payload, keep_alive)
+            return keep_alive
+        if request.method != "POST":
+            await self._send_json(writer, 501, {"error": "unsupported_method"}, keep_alive)
+            return keep_alive
+        if path == ADMIN_DRAIN_PATH:
+            peer = writer.get_extra_info("peername") or ("",)
+            status, payload = _admin_drain(self._app, request.headers, peer[0])
+            await self._send_json(writer, status, payload, False)
+            return False
+        if path not in CHAT_PATHS:
+            await self._send_json(writer, 404, {"error": "not_found"}, keep_alive)
+            return keep_alive
+
+        payload = _decode_payload(request.body)
+        if payload is None:
+            await self._send_json(writer, 400, {"error": "invalid_json"}, keep_alive)
+            return keep_alive
+
+        prompt = _extract_prompt(payload)
+        if not prompt:
+            await self._send_json(writer, 400, {"error": "missing_prompt"}, keep_alive)
+            return keep_alive
+
+        request_id = _get_request_id(request.headers)
+        model = payload.get("model")
+        stream = payload.get("stream", False) is True and path == "/v1/chat/completions"
+
+        tenant = tenant_from_headers(request.headers, self._settings.tenant_header)
+        key = request_key(payload, model)
+        try:
+            timeout_s = self._app.resolve_timeout(_request_timeout(request.headers, payload))
+            params = _sampling(payload)
+            if stream:
+                submit = partial(
+                    self._app.submit_stream,
+                    prompt,
+                    request_id,
+                    model=model,
+                    tenant=tenant,
+                    timeout_s=timeout_s,
+                    key=key,
+                    params=params,
+                )
+            else:
+                submit = partial(
+                    self._app.submit_chat,
+                    prompt,
+                    model=model,
+                    tenant=tenant,
+                    timeout_s=timeout_s,
+                    key=key,
+                    params=params,
+                )
+            if key is not None and self._app.cache_on_disk:
+                # The cache lookup may read sqlite; keep it off the event loop.
+                submitted = await asyncio.get_running_loop().run_in_executor(None, submit)
+            else:
+                submitted = submit()
+            if stream:
+                channel = submitted
+            else:
+                future = submitted
+        except _HTTPError as exc:
+            await self._send_json(writer, exc.status, {"error": exc.error}, keep_alive)
+            return keep_alive
+        except OverloadedError as exc:
+            payload, headers = _overloaded(exc)
+            await self._send_json(writer, 429, payload, keep_alive, headers)
+            return keep_alive
+        except DrainingError:
+            await self._send_json(writer, 503, {"error": "draining"}, False)
+            return False
+        if stream:
+            # Without chunked framing (HTTP/1.0) the close marks the end of the stream.
+            chunked = request.version != "HTTP/1.0"
+            keep_alive = keep_alive and chunked
+            with self._app.inflight():
+                await self._handle_streaming(
+                    reader, writer, channel, request_id, model, chunked, keep_alive
+                )
+            return keep_alive
+        try:
+            reply_data = await self._await_reply(future, timeout_s, reader, writer)
+        except DeadlineExceededError:
+            await self._send_json(writer, 504, {"error": "deadline_exceeded"}, keep_alive)
+            return keep_alive
+        except ClientGoneError:
+            return False
+        except UpstreamUnavailableError:
+            await self._send_json(writer, 502, {"error": "upstream_unavailable"}, keep_alive)
+            return keep_alive
+        content_type, data = _render_chat(
+            self._settings, path, request.headers, payload, prompt, reply_data, request_id
+        )
+        headers = {"X-Request-ID": request_id} if content_type == "application/json" else {}
+        await self._send(writer, 200, content_type, data, keep_alive, headers)
+        return keep_alive
+
+    async def _await_reply(
+        self,
+        future: Future,
+        timeout_s: Optional[float],
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> dict:
+        """Wait for a chat reply, abandoning it at the deadline or if the client leaves."""
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.wrap_future(future)
+        deadline = None if timeout_s is None else loop.time() + timeout_s
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({waiter}, timeout=_poll_timeout(remaining))
+            if done:
+                return waiter.result()
+            if deadline is not None and loop.time() >= deadline:
+                self._app.abandon(future, reason="deadline")
+                waiter.cancel()
+                raise DeadlineExceededError()
+            if _client_gone(reader, writer):
+                self._app.abandon(future)
+                waiter.cancel()
+                raise ClientGoneError()
+
+    async def _handle_streaming(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        channel: StreamChannel,
+        request_id: str,
+        model: Optional[str],
+        chunked: bool,
+        keep_alive: bool,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wake() -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(ready.set)
+
+        channel.set_waiter(wake)
+        try:
+            head = {
+                "Content-Type": "text/event-stream",
+                "X-Request-ID": request_id,
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive" if keep_alive else "close",
+            }
+            if chunked:
+                head["Transfer-Encoding"] = "chunked"
+            writer.write(_response_head(200, head))
+            # The transport may keep a reference to written data, so copy the writer's
+            # reused buffer view on the way out.
+            sse = _sse_writer(
+                self._settings, lambda view: writer.write(bytes(view)), request_id, model, chunked
+            )
+            while True:
+                # Clear before polling so an event that lands in between still wakes us.
+                ready.clear()
+                try:
+                    event = channel.get(timeout=0)
+                except Empty:
+                    try:
+                        await asyncio.wait_for(ready.wait(), _poll_timeout(sse.due_in()))
+                    except asyncio.TimeoutError:
+                        if _client_gone(reader, writer):
+                            return
+                        if sse.due_in() == 0.0:
+                            # Upstream is quiet; write the held deltas rather than wait on it.
+                            sse.flush()
+                            await writer.drain()
+                    continue
+                if event is END:
+                    break
+                sse.send(event)
+                await writer.drain()
+            sse.done()
+            await writer.drain()
+        finally:
+            channel.set_waiter(None)
+            # Releases the lane worker if we stopped early (e.g. the client went away).
+            channel.cancel()
+
+    async def _send_json(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: dict,
+        keep_alive: bool,
+        headers: Optional[dict] = None,
+    ) -> None:
+        data = _encode_json(self._settings, payload)
+        await self._send(writer, status, "application/json", data, keep_alive, headers)
+
+    async def _send(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        content_type: str,
+        data: bytes,
+        keep_alive: bool,
+        headers: Optional[dict] = None,
+    ) -> None:
+        head = {"Content-Type": content_type, **(headers or {})}
+        head["Content-Length"] = str(len(data))
+        head["Connection"] = "keep-alive" if keep_alive else "close"
+        writer.write(_response_head(status, head) + data)
+        await writer.drain()
+
+
+def _client_gone(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+    """True once the client has closed its end of the connection."""
+    return reader.at_eof() or writer.transport.is_closing()
+
+
+async def _read_request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, body_limit: int
+) -> Optional[_Request]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise _HTTPError(431, "headers_too_large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    while lines and not lines[0]:
+        lines.pop(0)
+    parts = lines[0].split() if lines else []
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        raise _HTTPError(400, "bad_request_line")
+    method, target, version = parts
+
+    headers = _Headers()
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise _HTTPError(400, "bad_header")
+        headers[name.strip().lower()] = value.strip()
+
+    # A client sending "Expect: 100-continue" waits for the go-ahead before the body.
+    expects_continue = (
+        version == "HTTP/1.1" and (headers.get("Expect") or "").lower() == "100-continue"
+    )
+    if _is_chunked(headers):
+        if expects_continue:
+            await _send_continue(writer)
+        body = await _read_chunked_body(reader, body_limit)
+    else:
+        length = _content_length(headers, body_limit)
+        if length and expects_continue:
+            await _send_continue(writer)
+        body = await reader.readexactly(length) if length else b""
+    return _Request(method=method, target=target, version=version, headers=headers, body=body)
+
+
+async def _send_continue(writer: asyncio.StreamWriter) -> None:
+    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+    await writer.drain()
+
+
+async def _read_chunked_body(reader: asyncio.StreamReader, limit: int) -> bytes:
+    body = bytearray()
+    while True:
+        size = _chunk_size(await reader.readline())
+        if size == 0:
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return bytes(body)
+        if limit > 0 and len(body) + size > limit:
+            raise _HTTPError(413, "body_too_large")
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+
+
+def _response_head(status: int, headers: dict) -> bytes:
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def run_async_server(
+    settings: Settings, app: RelayApp, reuse_port: bool = False, handoff: bool = True
+) -> None:
+    asyncio.run(AsyncRelayServer(app, settings).serve_forever(reuse_port=reuse_port, handoff=handoff))
@@ -1,55 +1,97 @@
 from __future__ import annotations
 
+import hmac
+import math
+import select
+import socket
+import threading
 import uuid
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-import json
-from typing import Callable, Optional
+from queue import Empty
+from typing import Callable, Mapping, Optional
 from urllib.parse import urlparse
 
+from relayserve.internal.codec import json_codec
 from relayserve.internal.config.settings import Settings
-from relayserve.internal.server.app import RelayApp
-
-
-def _get_request_id(handler: BaseHTTPRequestHandler) -> str:
-    """Read X-Request-ID or Request-Id from request, or generate one."""
+from relayserve.internal.queue.admission import OverloadedError
+from relayserve.internal.queue.channel import END, StreamChannel
+from relayserve.internal.queue.tenants import tenant_from_headers
+from relayserve.internal.server.app import (
+    ClientGoneError,
+    DeadlineExceededError,
+    DrainingError,
+    RelayApp,
+    UpstreamUnavailableError,
+)
+from relayserve.internal.server.keys import request_key, sampling_params
+from relayserve.internal.server.lifecycle import Lifecycle, listen_socket, notify_handoff_ready
+from relayserve.internal.server.sse import SSEWriter
+
+CHAT_PATHS = ("/v1/chat/completions", "/v1/chat/pretty")
+ADMIN_DRAIN_PATH = "/admin/drain"
+TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+_MAX_CHUNK_LINE = 1024
+# How often a quiet stream checks whether its client is still connected.
+_DISCONNECT_POLL_S = 0.25
+
+
+def _get_request_id(headers: Mapping[str, str]) -> str:
+    """Read X-Request-ID or Request-Id from request headers, or generate one."""
     for key in ("X-Request-ID", "Request-Id", "x-request-id", "request-id"):
-        value = handler.headers.get(key)
+        value = headers.get(key)
         if value and value.strip():
             return value.strip()
     return uuid.uuid4().hex
 
 
 class RelayHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests; one handler instance
+    # serves every request on its socket, so pipelined requests are read in turn.
+    protocol_version = "HTTP/1.1"
+
     def __init__(self, *args, app: RelayApp, **kwargs) -> None:
         self._app = app
+        self._requests_served = 0
+        idle_timeout = app.settings.keepalive_timeout_s
+        self.timeout = idle_timeout if idle_timeout > 0 else None
         super().__init__(*args, **kwargs)
 
+    def send_response(self, code: int, message: Optional[str] = None) -> None:
+        super().send_response(code, message)
+        self._requests_served += 1
+        max_requests = self._app.settings.max_keepalive_requests
+        if max_requests > 0 and self._requests_served >= max_requests:
+            self.close_connection = True
+        if self._app.draining:
+            self.close_connection = True
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        elif self.request_version == "HTTP/1.0":
+            self.send_header("Connection", "keep-alive")
+
     def do_GET(self) -> None:
-        path = urlparse(self.path).path
-        if path == "/healthz":
-            self._send_json(200, {"status": "ok"})
-            return
-        if path == "/v1/models":
-            self._send_json(
-                200,
-                {"data": [{"id": self._app.settings.model_id, "object": "model"}]},
-            )
-            return
-        if path == "/metrics":
-            self._send_json(200, self._app.metrics_report())
-            return
-        if path == "/debug/shard":
-            self._send_json(200, self._app.metrics_report().get("shard_plan", {}))
-            return
-        self._send_json(404, {"error": "not_found"})
+        status, payload = _route_get(self._app, urlparse(self.path).path)
+        self._send_json(status, payload)
 
     def do_POST(self) -> None:
         path = urlparse(self.path).path
-        if path not in ("/v1/chat/completions", "/v1/chat/pretty"):
+        # Consume the body before any early reply so the next pipelined
+        # request on this connection starts at a clean boundary.
+        try:
+            body = self._read_body()
+        except _HTTPError as exc:
+            # The rest of the body is still on the socket; it cannot be reused.
+            self.close_connection = True
+            self._send_json(exc.status, {"error": exc.error})
+            return
+        if path == ADMIN_DRAIN_PATH:
+            self._send_json(*_admin_drain(self._app, self.headers, self.client_address[0]))
+            return
+        if path not in CHAT_PATHS:
             self._send_json(404, {"error": "not_found"})
             return
 
-        payload = self._read_json()
+        payload = _decode_payload(body)
         if payload is None:
             self._send_json(400, {"error": "invalid_json"})
             return
@@ -59,30 +101,65 @@ class RelayHandler(BaseHTTPRequestHandler):
             self._send_json(400, {"error": "missing_prompt"})
             return
 
-        request_id = _get_request_id(self)
+        request_id = _get_request_id(self.headers)
         model = payload.get("model")
         stream = payload.get("stream", False) is True and path == "/v1/chat/completions"
 
-        if stream:
-            self._handle_streaming(prompt, request_id, model=model)
+        tenant = tenant_from_headers(self.headers, self._app.settings.tenant_header)
+        key = request_key(payload, model)
+        try:
+            timeout_s = _request_timeout(self.headers, payload)
+            params = _sampling(payload)
+            if stream:
+                channel = self._app.submit_stream(
+                    prompt,
+                    request_id,
+                    model=model,
+                    tenant=tenant,
+                    timeout_s=timeout_s,
+                    key=key,
+                    params=params,
+                )
+            else:
+                reply_data = self._app.handle_chat(
+                    prompt,
+                    model=model,
+                    tenant=tenant,
+                    timeout_s=timeout_s,
+                    client_gone=self._client_gone,
+                    key=key,
+                    params=params,
+                )
+        except _HTTPError as exc:
+            self._send_json(exc.status, {"error": exc.error})
             return
-
-        reply_data = self._app.handle_chat(prompt, model=model)
-        if path == "/v1/chat/pretty" or _prefer_pretty(self, payload):
-            self._send_text(200, _format_pretty_text(reply_data))
+        except OverloadedError as exc:
+            self._send_json(429, *_overloaded(exc))
             return
-
-        response = _format_chat_response(
-            self._app.settings.model_id, prompt, reply_data, request_id
+        except DrainingError:
+            self._send_json(503, {"error": "draining"})
+            return
+        except DeadlineExceededError:
+            self._send_json(504, {"error": "deadline_exceeded"})
+            return
+        except ClientGoneError:
+            # Nobody is left to answer.
+            self.close_connection = True
+            return
+        except UpstreamUnavailableError:
+            self._send_json(502, {"error": "upstream_unavailable"})
+            return
+        if stream:
+            with self._app.inflight():
+                self._handle_streaming(channel, request_id, model=model)
+            return
+        content_type, data = _render_chat(
+            self._app.settings, path, self.headers, payload, prompt, reply_data, request_id
         )
         self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("X-Request-ID", request_id)
-        data = (
-            json.dumps(response, indent=2).encode("utf-8")
-            if self._app.settings.pretty_json
-            else json.dumps(response).encode("utf-8")
-        )
+        self.send_header("Content-Type", content_type)
+        if content_type == "application/json":
+            self.send_header("X-Request-ID", request_id)
         self.send_header("Content-Length", str(len(data)))
         self.end_headers()
         self.wfile.write(data)
@@ -90,124 +167,127 @@ class RelayHandler(BaseHTTPRequestHandler):
     def log_message(self, format: str, *args) -> None:
         return
 
-    def _read_json(self) -> Optional[dict]:
-        content_length = int(self.headers.get("Content-Length", "0"))
-        if content_length <= 0:
-            return None
-        body = self.rfile.read(content_length)
-        try:
-            return json.loads(body.decode("utf-8"))
-        except json.JSONDecodeError:
-            return None
-
-    def _send_json(self, status: int, payload: dict) -> None:
-        if self._app.settings.pretty_json:
-            data = json.dumps(payload, indent=2).encode("utf-8")
-        else:
-            data = json.dumps(payload).encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+    def _read_body(self) -> bytes:
+        limit = self._app.settings.max_body_bytes
+        if _is_chunked(self.headers):
+            return _read_chunked_body(self.rfile.readline, self.rfile.read, limit)
+        length = _content_length(self.headers, limit)
+        return self.rfile.read(length) if length else b""
 
-    def _send_text(self, status: int, payload: str) -> None:
-        data = payload.encode("utf-8")
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        data = _encode_json(self._app.settings, payload)
         self.send_response(status)
-        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.send_header("Content-Length", str(len(data)))
         self.end_headers()
         self.wfile.write(data)
 
-    def _handle_streaming(self, prompt: str, request_id: str, model: str | None = None) -> None:
-        model_id = self._app.settings.model_id
-        self.send_response(200)
-        self.send_header("Content-Type", "text/event-stream")
-        self.send_header("X-Request-ID", request_id)
-        self.send_header("Cache-Control", "no-cache")
-        self.send_header("Connection", "keep-alive")
-        self.end_headers()
+    def _handle_streaming(
+        self, channel: StreamChannel, request_id: str, model: str | None = None
+    ) -> None:
         try:
-            if self._app.router and self._app.router.has_backends:
-                backend = self._app.router.get_backend(model)
-                if backend is not None:
-                    for chunk in backend.generate(prompt, stream=True):
-                        content = chunk.get("content", "")
-                        if content:
-                            sse = {
-                                "id": request_id,
-                                "object": "chat.completion.chunk",
-                                "model": model or model_id,
-                                "choices": [
-                                    {"index": 0, "delta": {"content": content}, "finish_reason": None}
-                                ],
-                            }
-                            self.wfile.write(("data: " + json.dumps(sse) + "\n\n").encode("utf-8"))
-                            self.wfile.flush()
-                    self.wfile.write(b"data: [DONE]\n\n")
-                    self.wfile.flush()
-                    return
-            if self._app.llama_client.has_backends():
-                for chunk in self._app.llama_client.chat_stream(
-                    prompt, request_id, model_id
-                ):
-                    self.wfile.write(
-                        ("data: " + json.dumps(chunk) + "\n\n").encode("utf-8")
-                    )
-                    self.wfile.flush()
-            else:
-                reply_data = self._app.handle_chat(prompt)
-                reply = str(reply_data.get("reply", "")).strip()
-                chunk = {
-                    "id": request_id,
-                    "object": "chat.completion.chunk",
-                    "model": model_id,
-                    "choices": [
-                        {
-                            "index": 0,
-                            "delta": {"role": "assistant", "content": reply},
-                            "finish_reason": "stop",
-                        }
-                    ],
-                }
-                self.wfile.write(
-                    ("data: " + json.dumps(chunk) + "\n\n").encode("utf-8")
-                )
-                self.wfile.flush()
-        except Exception:
-            chunk = {
-                "id": request_id,
-                "object": "chat.completion.chunk",
-                "model": model_id,
-                "choices": [
-                    {
-                        "index": 0,
-                        "delta": {"content": ""},
-                        "finish_reason": "stop",
-                    }
-                ],
-                "error": "stream_failed",
-            }
-            self.wfile.write(
-                ("data: " + json.dumps(chunk) + "\n\n").encode("utf-8")
-            )
-            self.wfile.flush()
-        self.wfile.write(b"data: [DONE]\n\n")
-        self.wfile.flush()
-
-
-def run_server(settings: Settings, app: RelayApp) -> None:
-    handler_factory = _make_handler(app)
-    server = ThreadingHTTPServer(("", settings.port), handler_factory)
+            chunked = self.request_version != "HTTP/1.0"
+            if not chunked:
+                # HTTP/1.0 has no chunked framing, so the end of the stream is the close.
+                self.close_connection = True
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("X-Request-ID", request_id)
+            self.send_header("Cache-Control", "no-cache")
+            if chunked:
+                self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            writer = _sse_writer(self._app.settings, self.wfile.write, request_id, model, chunked)
+            while True:
+                due_in = writer.due_in()
+                try:
+                    event = channel.get(timeout=_poll_timeout(due_in))
+                except Empty:
+                    if self._client_gone():
+                        self.close_connection = True
+                        return
+                    if writer.due_in() == 0.0:
+                        # Upstream is quiet; write the held deltas rather than wait on it.
+                        writer.flush()
+                    continue
+                if event is END:
+                    break
+                writer.send(event)
+            writer.done()
+        finally:
+            # Releases the lane worker if we stopped early (e.g. the client went away).
+            channel.cancel()
+
+    def _client_gone(self) -> bool:
+        """True once the client has closed its end of the connection."""
+        return _peer_closed(self.connection)
+
+
+def _peer_closed(sock: socket.socket) -> bool:
+    """Peek at an idle connection: readable with no data means the peer closed it."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
+def _poll_timeout(due_in: Optional[float]) -> float:
+    return _DISCONNECT_POLL_S if due_in is None else min(due_in, _DISCONNECT_POLL_S)
+
+
+def run_server(
+    settings: Settings,
+    app: RelayApp,
+    reuse_port: bool = False,
+    banner: bool = True,
+    handoff: bool = True,
+) -> None:
+    if banner:
+        _print_banner(settings)
+    if settings.server_mode == "asyncio":
+        from relayserve.internal.server.async_server import run_async_server
+
+        run_async_server(settings, app, reuse_port=reuse_port, handoff=handoff)
+        return
+    sock = listen_socket(settings.port, reuse_port=reuse_port)
+    server = ThreadingHTTPServer(sock.getsockname()[:2], _make_handler(app), bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    stopped = threading.Event()
+
+    def stop() -> None:
+        server.shutdown()
+        stopped.set()
+
+    lifecycle = Lifecycle(app, settings, sock, stop_accepting=server.shutdown, stop=stop)
+    lifecycle.install_signals(handoff=handoff)
+    notify_handoff_ready()
+    try:
+        server.serve_forever()
+        # After a handoff the loop stops accepting before the drain finishes;
+        # keep the process alive for the requests still being served.
+        stopped.wait()
+    finally:
+        server.server_close()
+
+
+def _print_banner(settings: Settings) -> None:
     pretty_default = "pretty" if settings.pretty_default else "json"
     print(
         "Relay starting\n"
         f"- Listening: :{settings.port}\n"
+        f"- Server: {settings.server_mode}\n"
+        f"- Workers: {settings.workers}\n"
+        f"- JSON codec: {json_codec.CODEC_NAME}\n"
         f"- Model: {settings.model_id}\n"
         f"- Response default: {pretty_default}\n"
         f"- Backends: {', '.join(settings.backends) if settings.backends else 'none'}"
     )
-    server.serve_forever()
 
 
 def _make_handler(app: RelayApp) -> Callable[..., RelayHandler]:
@@ -217,6 +297,166 @@ def _make_handler(app: RelayApp) -> Callable[..., RelayHandler]:
     return handler
 
 
+def _route_get(app: RelayApp, path: str) -> tuple[int, dict]:
+    if path == "/healthz":
+        if app.draining:
+            return 503, {"status": "draining"}
+        return 200, {"status": "ok"}
+    if path == "/v1/models":
+        return 200, {"data": [{"id": app.settings.model_id, "object": "model"}]}
+    if path == "/metrics":
+        return 200, app.metrics_report()
+    if path == "/debug/shard":
+        return 200, app.metrics_report().get("shard_plan", {})
+    return 404, {"error": "not_found"}
+
+
+def _encode_json(settings: Settings, payload: dict) -> bytes:
+    return json_codec.dumps(payload, pretty=settings.pretty_json)
+
+
+def _admin_drain(app: RelayApp, headers: Mapping[str, str], client_host: str) -> tuple[int, dict]:
+    """Start a drain if the caller may: the admin token if one is set, else loopback only."""
+    token = app.settings.admin_token
+    if token:
+        allowed = hmac.compare_digest(headers.get("X-Admin-Token") or "", token)
+    else:
+        allowed = client_host in ("127.0.0.1", "::1", "::ffff:127.0.0.1")
+    if not allowed:
+        return 403, {"error": "forbidden"}
+    app.request_drain()
+    return 202, {"status": "draining"}
+
+
+def _overloaded(exc: OverloadedError) -> tuple[dict, dict]:
+    """429 body and headers for a request shed by admission control."""
+    return (
+        {"error": "overloaded", "reason": exc.reason},
+        {"Retry-After": str(exc.retry_after_s)},
+    )
+
+
+def _request_timeout(headers: Mapping[str, str], payload: dict) -> Optional[float]:
+    """The client's timeout in seconds from the header or `timeout_ms` body field."""
+    raw = headers.get(TIMEOUT_HEADER)
+    if raw is None:
+        raw = payload.get("timeout_ms")
+    if raw is None:
+        return None
+    try:
+        timeout_ms = float(raw)
+    except (TypeError, ValueError):
+        raise _HTTPError(400, "invalid_timeout") from None
+    # "inf" parses as a float but would switch the deadline off.
+    if not (timeout_ms > 0 and math.isfinite(timeout_ms)):
+        raise _HTTPError(400, "invalid_timeout")
+    return timeout_ms / 1000.0
+
+
+def _sampling(payload: dict) -> dict:
+    """The request's sampling fields to forward upstream (see keys.sampling_params)."""
+    try:
+        return sampling_params(payload)
+    except ValueError as exc:
+        raise _HTTPError(400, f"invalid_{exc}") from None
+
+
+def _decode_payload(body: bytes) -> Optional[dict]:
+    if not body:
+        return None
+    try:
+        payload = json_codec.loads(body)
+    except json_codec.JSONDecodeError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+class _HTTPError(Exception):
+    """A request that is rejected before it reaches the app."""
+
+    def __init__(self, status: int, error: str) -> None:
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+def _is_chunked(headers: Mapping[str, str]) -> bool:
+    return "chunked" in (headers.get("Transfer-Encoding") or "").lower()
+
+
+def _content_length(headers: Mapping[str, str], limit: int) -> int:
+    """Validate Content-Length against the body limit before reading anything."""
+    try:
+        length = int(headers.get("Content-Length") or "0")
+    except ValueError:
+        raise _HTTPError(400, "bad_content_length")
+    if length < 0:
+        raise _HTTPError(400, "bad_content_length")
+    if limit > 0 and length > limit:
+        raise _HTTPError(413, "body_too_large")
+    return length
+
+
+def _chunk_size(line: bytes) -> int:
+    try:
+        return int(line.split(b";", 1)[0].strip(), 16)
+    except ValueError:
+        raise _HTTPError(400, "bad_chunk")
+
+
+def _read_chunked_body(
+    readline: Callable[[int], bytes], read: Callable[[int], bytes], limit: int
+) -> bytes:
+    """Read a chunked request body, rejecting it as soon as it passes the limit."""
+    body = bytearray()
+    while True:
+        size = _chunk_size(readline(_MAX_CHUNK_LINE))
+        if size == 0:
+            while readline(_MAX_CHUNK_LINE) not in (b"\r\n", b"\n", b""):
+                pass
+            return bytes(body)
+        if limit > 0 and len(body) + size > limit:
+            raise _HTTPError(413, "body_too_large")
+        data = read(size)
+        if len(data) < size:
+            raise _HTTPError(400, "incomplete_body")
+        body += data
+        read(2)
+
+
+def _render_chat(
+    settings: Settings,
+    path: str,
+    headers: Mapping[str, str],
+    payload: dict,
+    prompt: str,
+    reply_data: dict,
+    request_id: str,
+) -> tuple[str, bytes]:
+    """Render a finished chat reply as (content type, body) for either endpoint."""
+    if path == "/v1/chat/pretty" or _prefer_pretty(settings, headers, payload):
+        return "text/plain; charset=utf-8", _format_pretty_text(reply_data).encode("utf-8")
+    response = _format_chat_response(settings.model_id, prompt, reply_data, request_id)
+    return "application/json", _encode_json(settings, response)
+
+
+def _sse_writer(
+    settings: Settings,
+    write: Callable[[memoryview], object],
+    request_id: str,
+    model: Optional[str],
+    chunked: bool,
+) -> SSEWriter:
+    return SSEWriter(
+        write,
+        request_id,
+        model or settings.model_id,
+        flush_interval_s=settings.sse_flush_ms / 1000.0,
+        max_frame_bytes=settings.sse_max_frame_bytes,
+        chunked=chunked,
+    )
+
+
 def _extract_prompt(payload: dict) -> str:
     messages = payload.get("messages", [])
     if not isinstance(messages, list):
@@ -274,10 +514,10 @@ def _format_pretty_text(reply_data: dict) -> str:
     )
 
 
-def _prefer_pretty(handler: RelayHandler, payload: dict) -> bool:
-    if not handler._app.settings.pretty_default:
+def _prefer_pretty(settings: Settings, headers: Mapping[str, str], payload: dict) -> bool:
+    if not settings.pretty_default:
         return False
-    accept = (handler.headers.get("Accept") or "").lower()
+    accept = (headers.get("Accept") or "").lower()
     if "application/json" in accept:
         return False
     if payload.get("format") == "json":
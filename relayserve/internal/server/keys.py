@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from typing import Any, Optional
+
+# Request fields that change what the model generates; all of them go into the key.
+_SAMPLING_FIELDS = (
+    "temperature",
+    "top_p",
+    "top_k",
+    "min_p",
+    "max_tokens",
+    "max_completion_tokens",
+    "seed",
+    "stop",
+    "n",
+    "presence_penalty",
+    "frequency_penalty",
+    "repeat_penalty",
+    "logit_bias",
+    "response_format",
+    "tools",
+    "tool_choice",
+)
+_MESSAGE_FIELDS = ("role", "content", "name", "tool_calls", "tool_call_id")
+# The sampling fields sent upstream with every request. Fields that change the
+# shape of the reply (n, tools, ...) are left out: the relay returns one text.
+_NUMBER_FIELDS = (
+    "temperature",
+    "top_p",
+    "min_p",
+    "presence_penalty",
+    "frequency_penalty",
+    "repeat_penalty",
+)
+_INTEGER_FIELDS = ("top_k", "max_tokens", "seed")
+
+
+def is_deterministic(payload: dict) -> bool:
+    """Whether a chat request asks for greedy decoding of a single choice."""
+    temperature = payload.get("temperature")
+    if isinstance(temperature, bool) or not isinstance(temperature, (int, float)):
+        return False
+    return temperature == 0 and payload.get("n", 1) == 1
+
+
+def sampling_params(payload: dict) -> dict[str, Any]:
+    """The sampling fields of a chat request, to forward upstream.
+
+    max_completion_tokens is sent as max_tokens, the name every upstream
+    here accepts; null fields are left out. Raises ValueError for a value of
+    the wrong type, so a bad field is the client's error, not the upstream's.
+    """
+    params: dict[str, Any] = {}
+    for name in _NUMBER_FIELDS:
+        value = payload.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(name)
+        if not math.isfinite(value):
+            raise ValueError(name)
+        params[name] = value
+    for name in _INTEGER_FIELDS:
+        value = payload.get(name)
+        if name == "max_tokens" and value is None:
+            value = payload.get("max_completion_tokens")
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(name)
+        params[name] = value
+    stop = payload.get("stop")
+    if stop is not None:
+        if isinstance(stop, str):
+            stop = [stop]
+        if not isinstance(stop, list) or not all(isinstance(s, str) for s in stop):
+            raise ValueError("stop")
+        params["stop"] = stop
+    return params
+
+
+def request_key(payload: dict, model: Optional[str]) -> Optional[str]:
+    """A stable key for a deterministic chat request, or None if it is not eligible.
+
+    Two requests share a key when they name the same model and carry the same
+    messages (role and surrounding whitespace normalized) and sampling fields.
+    """
+    if not is_deterministic(payload):
+        return None
+    messages = payload.get("messages")
+    if not isinstance(messages, list):
+        return None
+    canonical = {
+        "model": model or "",
+        "messages": [_normalize_message(message) for message in messages],
+        "sampling": {name: payload[name] for name in _SAMPLING_FIELDS if name in payload},
+    }
+    try:
+        encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _normalize_message(message: Any) -> Any:
+    if not isinstance(message, dict):
+        return message
+    normalized = {name: message[name] for name in _MESSAGE_FIELDS if name in message}
+    role = normalized.get("role")
+    if isinstance(role, str):
+        normalized["role"] = role.strip().lower()
+    content = normalized.get("content")
+    if isinstance(content, str):
+        normalized["content"] = content.strip()
+    return normalized
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from typing import Callable, Optional
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.server.app import RelayApp
+
+# A replacement process adopts the listening socket passed in this variable and
+# signals the process named in the second once it is ready to accept.
+LISTEN_FD_ENV = "RELAYSERVE_LISTEN_FD"
+HANDOFF_PID_ENV = "RELAYSERVE_HANDOFF_PID"
+
+
+class Lifecycle:
+    """Drives graceful drain and socket handoff for one server process.
+
+    SIGTERM (or POST /admin/drain) starts a drain: /healthz turns not-ready and
+    new work is refused while queued and streaming requests get up to
+    settings.drain_timeout_s to finish, then the server stops. SIGHUP starts a
+    replacement process that inherits the listening socket; once it is
+    accepting it sends SIGTERM back, and this process stops accepting at once
+    and drains.
+    """
+
+    def __init__(
+        self,
+        app: RelayApp,
+        settings: Settings,
+        listen_socket: socket.socket,
+        stop_accepting: Callable[[], None],
+        stop: Callable[[], None],
+    ) -> None:
+        self._app = app
+        self._settings = settings
+        self._listen_socket = listen_socket
+        self._stop_accepting = stop_accepting
+        self._stop = stop
+        self._handed_off = False
+        app.on_drain(self._start_drain)
+
+    def install_signals(
+        self, handoff: bool = True, loop: Optional[asyncio.AbstractEventLoop] = None
+    ) -> None:
+        handlers = {signal.SIGTERM: self._app.request_drain}
+        if handoff and hasattr(signal, "SIGHUP"):
+            handlers[signal.SIGHUP] = self.handoff
+        for signum, handler in handlers.items():
+            if loop is not None:
+                loop.add_signal_handler(signum, handler)
+            else:
+                signal.signal(signum, lambda _signum, _frame, handler=handler: handler())
+
+    def handoff(self) -> Optional[int]:
+        """Start a replacement process that inherits the listening socket."""
+        if self._handed_off or self._app.draining:
+            return None
+        fd = self._listen_socket.fileno()
+        os.set_inheritable(fd, True)
+        env = dict(os.environ, **{LISTEN_FD_ENV: str(fd), HANDOFF_PID_ENV: str(os.getpid())})
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "relayserve", *sys.argv[1:]], env=env, pass_fds=(fd,)
+        )
+        self._handed_off = True
+        print(f"Relay handing off listener to pid {proc.pid}")
+        return proc.pid
+
+    def _start_drain(self) -> None:
+        # Called from signal handlers and request threads; never block them.
+        threading.Thread(target=self._drain, name="relay-drain", daemon=True).start()
+
+    def _drain(self) -> None:
+        if self._handed_off:
+            # The replacement accepts new connections on the shared socket now.
+            self._stop_accepting()
+        print(f"Relay draining (deadline {self._settings.drain_timeout_s:.0f}s)")
+        if not self._app.wait_idle(self._settings.drain_timeout_s):
+            print("Relay drain deadline passed with requests still in flight")
+        self._stop()
+
+
+def listen_socket(port: int, reuse_port: bool = False) -> socket.socket:
+    """Return the socket inherited from a handoff, or bind a new one on port."""
+    raw = os.environ.pop(LISTEN_FD_ENV, "")
+    if raw:
+        return socket.socket(fileno=int(raw))
+    return socket.create_server(("", port), reuse_port=reuse_port)
+
+
+def notify_handoff_ready() -> None:
+    """Tell the process that handed us its socket that we are accepting."""
+    raw = os.environ.pop(HANDOFF_PID_ENV, "")
+    if not raw:
+        return
+    try:
+        os.kill(int(raw), signal.SIGTERM)
+    except (ProcessLookupError, ValueError):
+        pass
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Callable, List, Optional, Union
+
+from relayserve.internal.codec import json_codec
+
+SSE_DONE = b"data: [DONE]\n\n"
+CHUNKED_END = b"0\r\n\r\n"
+
+# Room reserved ahead of staged frames for the hex length line of a chunk.
+_HEAD_ROOM = 16
+
+StreamEvent = Union[str, dict]
+
+
+class SSEWriter:
+    """Writes chat.completion.chunk events as SSE, coalescing deltas into frames.
+
+    Delta frames are assembled from byte templates pre-encoded for the stream's
+    id and model, so only the content itself goes through the JSON encoder.
+    Deltas arriving within ``flush_interval_s`` of the previous write are held
+    and merged into one frame, up to ``max_frame_bytes`` of content. Output is
+    staged in one reusable buffer and handed to ``write`` as a memoryview, so
+    ``write`` must consume it before returning. A stream whose events carried
+    no finish_reason gets a final "stop" chunk before [DONE], so live and
+    cache-replayed streams end the same way.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[memoryview], object],
+        request_id: str,
+        model: str,
+        flush_interval_s: float = 0.0,
+        max_frame_bytes: int = 16384,
+        chunked: bool = False,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._write = write
+        self._prefix = (
+            'data: {"id": %s, "object": "chat.completion.chunk", "model": %s, '
+            '"choices": [{"index": 0, "delta": {"content": ' % (json.dumps(request_id), json.dumps(model))
+        ).encode("utf-8")
+        self._suffix = b'}, "finish_reason": null}]}\n\n'
+        self._stop = (
+            'data: {"id": %s, "object": "chat.completion.chunk", "model": %s, '
+            '"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}\n\n'
+            % (json.dumps(request_id), json.dumps(model))
+        ).encode("utf-8")
+        self._finished = False
+        self._flush_interval_s = max(0.0, flush_interval_s)
+        self._max_frame_bytes = max(1, max_frame_bytes)
+        self._chunked = chunked
+        self._clock = clock
+        self._pending: List[str] = []
+        self._pending_len = 0
+        self._last_write = float("-inf")
+        self._buf = bytearray(_HEAD_ROOM + 4096)
+        self._pos = _HEAD_ROOM
+        self.frames = 0
+        self.writes = 0
+
+    def send(self, event: StreamEvent) -> None:
+        if isinstance(event, str):
+            self.delta(event)
+        else:
+            self.event(event)
+
+    def delta(self, content: str) -> None:
+        """Queue delta content, writing a frame once the interval or size bound is hit."""
+        if not content:
+            return
+        self._pending.append(content)
+        self._pending_len += len(content)
+        if self._pending_len >= self._max_frame_bytes or self.due_in() == 0.0:
+            self.flush()
+
+    def event(self, chunk: dict) -> None:
+        """Write a complete chunk, after any held deltas.
+
+        A chunk carrying nothing but delta content (as llama.cpp streams them)
+        is coalesced like a delta; any other chunk is written as-is.
+        """
+        content = _delta_content(chunk)
+        if content is not None:
+            self.delta(content)
+            return
+        self._finished = self._finished or _has_finish_reason(chunk)
+        self._stage_pending()
+        self._stage(b"data: ")
+        self._stage(json_codec.dumps(chunk))
+        self._stage(b"\n\n")
+        self.frames += 1
+        self._commit()
+
+    def due_in(self) -> Optional[float]:
+        """Seconds until held deltas must be written, or None if nothing is held."""
+        if not self._pending:
+            return None
+        return max(0.0, self._last_write + self._flush_interval_s - self._clock())
+
+    def flush(self) -> None:
+        self._stage_pending()
+        self._commit()
+
+    def done(self) -> None:
+        """Write held deltas, a stop chunk unless one was sent, and the [DONE]
+        marker, ending the chunked body if framed."""
+        self._stage_pending()
+        if not self._finished:
+            self._stage(self._stop)
+            self.frames += 1
+        self._stage(SSE_DONE)
+        self.frames += 1
+        self._commit(final=True)
+
+    def _stage_pending(self) -> None:
+        if not self._pending:
+            return
+        content = self._pending[0] if len(self._pending) == 1 else "".join(self._pending)
+        self._pending.clear()
+        self._pending_len = 0
+        self._stage(self._prefix)
+        self._stage(json_codec.dumps(content))
+        self._stage(self._suffix)
+        self.frames += 1
+
+    def _stage(self, data: bytes) -> None:
+        end = self._pos + len(data)
+        if end > len(self._buf):
+            self._buf.extend(bytes(max(end - len(self._buf), len(self._buf))))
+        self._buf[self._pos:end] = data
+        self._pos = end
+
+    def _commit(self, final: bool = False) -> None:
+        size = self._pos - _HEAD_ROOM
+        start = _HEAD_ROOM
+        if self._chunked:
+            if size:
+                header = b"%x\r\n" % size
+                start -= len(header)
+                self._buf[start:_HEAD_ROOM] = header
+                self._stage(b"\r\n")
+            if final:
+                self._stage(CHUNKED_END)
+        if self._pos == start:
+            return
+        view = memoryview(self._buf)[start:self._pos]
+        try:
+            self._write(view)
+        finally:
+            view.release()
+        self._pos = _HEAD_ROOM
+        self._last_write = self._clock()
+        self.writes += 1
+
+
+def _has_finish_reason(chunk: dict) -> bool:
+    choices = chunk.get("choices")
+    if not isinstance(choices, list):
+        return False
+    return any(isinstance(choice, dict) and choice.get("finish_reason") for choice in choices)
+
+
+def _delta_content(chunk: dict) -> Optional[str]:
+    """The content of a chunk that is a plain single-choice content delta, else None."""
+    choices = chunk.get("choices")
+    if not isinstance(choices, list) or len(choices) != 1:
+        return None
+    choice = choices[0]
+    if not isinstance(choice, dict) or choice.get("index", 0) != 0 or choice.get("finish_reason"):
+        return None
+    delta = choice.get("delta")
+    if not isinstance(delta, dict) or delta.keys() != {"content"}:
+        return None
+    content = delta["content"]
+    return content if isinstance(content, str) else None
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+import signal
+import socket
+import time
+import traceback
+from typing import Dict
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.metrics.shared import SharedMetrics
+from relayserve.internal.server.app import build_app
+from relayserve.internal.server.http_server import _print_banner, run_server
+
+# A worker that dies sooner than this after starting is not restarted, so a
+# bad config (e.g. the port is taken) fails instead of spinning.
+_MIN_UPTIME_S = 1.0
+
+
+def run_workers(settings: Settings) -> None:
+    """Fork settings.workers server processes that share one port via SO_REUSEPORT.
+
+    The parent only supervises: it restarts workers that crash and forwards
+    SIGINT/SIGTERM to them, and each worker drains on SIGTERM. Metrics are
+    aggregated through a SharedMetrics segment mapped before the fork.
+    """
+    if not hasattr(os, "fork") or not hasattr(socket, "SO_REUSEPORT"):
+        raise SystemExit("--workers needs fork() and SO_REUSEPORT on this platform")
+
+    shared = SharedMetrics(settings.workers)
+    _print_banner(settings)
+    children: Dict[int, tuple[int, float]] = {}
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(shared.workers):
+        children[_spawn(settings, shared, index)] = (index, time.monotonic())
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        index, started = children.pop(pid, (None, 0.0))
+        if index is None or stopping:
+            continue
+        if time.monotonic() - started < _MIN_UPTIME_S:
+            print(f"Worker {index} (pid {pid}) exited during startup; not restarting")
+            continue
+        print(f"Worker {index} (pid {pid}) exited; restarting")
+        children[_spawn(settings, shared, index)] = (index, time.monotonic())
+
+
+def _spawn(settings: Settings, shared: SharedMetrics, index: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    code = 0
+    try:
+        shared.bind(index)
+        # The app starts its worker thread, so it must be built after the fork.
+        app = build_app(settings, shared_metrics=shared)
+        # Workers share the port through SO_REUSEPORT, so a new fleet can start
+        # alongside this one; SIGTERM still drains each worker gracefully.
+        run_server(settings, app, reuse_port=True, banner=False, handoff=False)
+    except KeyboardInterrupt:
+        pass
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
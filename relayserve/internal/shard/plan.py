@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Tuple
+import threading
+from typing import List, Optional, Tuple
 
-from relayserve.internal.device.registry import Device
+from relayserve.internal.device.registry import Device, DeviceRegistry
 
 
 @dataclass(frozen=True)
@@ -13,6 +14,23 @@ class ShardPlan:
 
 
 class ShardPlanner:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cached: Optional[Tuple[Tuple[int, int, int], ShardPlan]] = None
+
+    def plan_for(self, registry: DeviceRegistry, total_layers: int) -> ShardPlan:
+        """plan() over the registry's devices, recomputed only when its version changes."""
+        version, devices = registry.snapshot()
+        key = (id(registry), version, total_layers)
+        with self._lock:
+            cached = self._cached
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        shard_plan = self.plan(list(devices), total_layers)
+        with self._lock:
+            self._cached = (key, shard_plan)
+        return shard_plan
+
     def plan(self, devices: list[Device], total_layers: int) -> ShardPlan:
         placements = [f"{device.backend}:{device.name}" for device in devices]
         if not devices or total_layers <= 0:
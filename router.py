@@ -38,46 +38,159 @@ def build_backends(config: dict[str, Any]) -> dict[str, Any]:
     _ensure_path()
     from backends.local_backend import LocalBackend
     from backends.modal_backend import ModalBackend
+    from backends.replica_set import ReplicaSet
     from backends.vllm_backend import VllmBackend
 
+    types = {"local": LocalBackend, "modal": ModalBackend, "vllm": VllmBackend}
     backends: dict[str, Any] = {}
     raw = config.get("backends") or {}
     for name, cfg in raw.items():
         if not isinstance(cfg, dict):
             continue
-        t = (cfg.get("type") or "").strip().lower()
-        url = (cfg.get("url") or "").strip()
-        if not url:
+        factory = types.get((cfg.get("type") or "").strip().lower())
+        urls = _backend_urls(cfg)
+        if factory is None or not urls:
             continue
-        if t == "local":
-            backends[name] = LocalBackend(url=url)
-        elif t == "modal":
-            backends[name] = ModalBackend(url=url)
-        elif t == "vllm":
-            backends[name] = VllmBackend(url=url)
+        timeouts = _timeouts(cfg)
+        if len(urls) == 1:
+            backends[name] = factory(url=urls[0], **timeouts)
+            continue
+        hedge = bool(cfg.get("hedge"))
+        backends[name] = ReplicaSet(
+            {url: factory(url=url, **timeouts) for url in urls},
+            load_factor=float(cfg.get("load_factor") or 1.25),
+            prefix_tokens=int(cfg.get("prefix_tokens") or 64),
+            hedger=_hedger(cfg) if hedge else None,
+            stream_hedger=_hedger(cfg) if hedge else None,
+        )
     return backends
 
 
+def _hedger(cfg: dict[str, Any]):
+    from relayserve.internal.runner.hedge import Hedger
+
+    return Hedger(
+        percentile=float(cfg.get("hedge_percentile") or 95),
+        budget=float(cfg.get("hedge_budget") or 0.05),
+    )
+
+
+def _timeouts(cfg: dict[str, Any]) -> dict[str, float]:
+    """`timeout` (read) and `connect_timeout`, in seconds, where configured."""
+    return {key: float(cfg[key]) for key in ("timeout", "connect_timeout") if cfg.get(key) is not None}
+
+
+def build_chains(config: dict[str, Any], backends: dict[str, Any]) -> dict[str, Any]:
+    """A FailoverChain per backend: itself, then the backends in its `failover`
+    list. Each backend has one circuit breaker, shared by every chain."""
+    from backends.failover import FailoverChain
+
+    raw = config.get("backends") or {}
+    breakers = {name: _breaker(raw.get(name) or {}) for name in backends}
+    chains: dict[str, Any] = {}
+    for name in backends:
+        failover = (raw.get(name) or {}).get("failover") or []
+        if isinstance(failover, str):
+            failover = [failover]
+        names = [
+            member for member in dict.fromkeys([name, *map(str, failover)]) if member in backends
+        ]
+        chains[name] = FailoverChain([(member, backends[member], breakers[member]) for member in names])
+    return chains
+
+
+def _breaker(cfg: dict[str, Any]):
+    from relayserve.internal.runner.breaker import CircuitBreaker
+
+    breaker = cfg.get("breaker") or {}
+    slow_call_s = breaker.get("slow_call_s")
+    return CircuitBreaker(
+        failure_rate=float(breaker.get("failure_rate") or 0.5),
+        slow_call_s=float(slow_call_s) if slow_call_s is not None else None,
+        min_calls=int(breaker.get("min_calls") or 5),
+        window=int(breaker.get("window") or 20),
+        open_s=float(breaker.get("open_s") or 5),
+    )
+
+
+def _backend_urls(cfg: dict[str, Any]) -> list[str]:
+    """`replicas` (a list of URLs serving the same model) if given, else `url`."""
+    replicas = cfg.get("replicas")
+    if isinstance(replicas, list):
+        urls = [str(url).strip() for url in replicas if str(url).strip()]
+    else:
+        urls = [(cfg.get("url") or "").strip()]
+    return [url for url in dict.fromkeys(urls) if url]
+
+
 class Router:
     def __init__(self, config: Optional[dict[str, Any]] = None, config_path: Optional[Path] = None) -> None:
         self._config = config or load_config(config_path)
         self._backends: dict[str, Any] = {}
+        self._chains: dict[str, Any] = {}
         self._default_key: Optional[str] = None
         if self._config:
             self._backends = build_backends(self._config)
+            self._chains = build_chains(self._config, self._backends)
             self._default_key = (self._config.get("default_backend") or "").strip() or None
             if self._default_key and self._default_key not in self._backends:
                 self._default_key = next(iter(self._backends), None)
 
+    def resolve(self, model: Optional[str] = None) -> tuple[Optional[str], Any]:
+        """Return (backend name, backend) for a model, falling back to the default.
+
+        The backend is the name's FailoverChain: the backend itself behind its
+        circuit breaker, then its `failover` backends.
+        """
+        if not self._chains:
+            return None, None
+        key = (model or "").strip() if model else None
+        if key and key in self._chains:
+            return key, self._chains[key]
+        if self._default_key and self._default_key in self._chains:
+            return self._default_key, self._chains[self._default_key]
+        key = next(iter(self._chains))
+        return key, self._chains[key]
+
     def get_backend(self, model: Optional[str] = None):
-        if not self._backends:
+        return self.resolve(model)[1]
+
+    def concurrency(self, key: str) -> Optional[int]:
+        """The `concurrency` configured for a backend, if any."""
+        cfg = ((self._config or {}).get("backends") or {}).get(key)
+        if not isinstance(cfg, dict) or cfg.get("concurrency") is None:
             return None
-        key = (model or "").strip() if model else None
-        if key and key in self._backends:
-            return self._backends[key]
-        if self._default_key:
-            return self._backends.get(self._default_key)
-        return next(iter(self._backends.values()), None)
+        try:
+            return max(1, int(cfg["concurrency"]))
+        except (TypeError, ValueError):
+            return None
+
+    def affinity_report(self) -> dict[str, Any]:
+        """Per-replica affinity stats of backends that have replicas."""
+        report = {}
+        for name, backend in self._backends.items():
+            affinity_report = getattr(backend, "affinity_report", None)
+            if affinity_report is not None:
+                report[name] = affinity_report()
+        return report
+
+    def hedge_report(self) -> dict[str, Any]:
+        """Hedging stats of backends with hedging enabled."""
+        report = {}
+        for name, backend in self._backends.items():
+            hedge_report = getattr(backend, "hedge_report", None)
+            stats = hedge_report() if hedge_report is not None else None
+            if stats:
+                report[name] = stats
+        return report
+
+    def breaker_report(self) -> dict[str, Any]:
+        """Circuit breaker state and counts per backend."""
+        report = {}
+        for chain in self._chains.values():
+            for name, _, breaker in chain.members:
+                report.setdefault(name, breaker.report())
+        return report
 
     @property
     def has_backends(self) -> bool:
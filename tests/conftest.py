@@ -0,0 +1,49 @@
+"""Fakes shared by the test modules; import them from tests.conftest."""
+from __future__ import annotations
+
+import dataclasses
+from typing import Any, Optional
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.server.app import RelayApp
+
+
+class FakeClock:
+    """A clock that only moves when a test sets `now`."""
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRouter:
+    """A Router over test backends keyed by lane; unknown models go to the first."""
+
+    has_backends = True
+
+    def __init__(self, backends: dict, concurrency: Optional[dict] = None) -> None:
+        self._backends = backends
+        self._concurrency = concurrency or {}
+
+    def resolve(self, model):
+        key = model if model in self._backends else next(iter(self._backends))
+        return key, self._backends[key]
+
+    def get_backend(self, model=None):
+        return self.resolve(model)[1]
+
+    def concurrency(self, key):
+        return self._concurrency.get(key)
+
+
+def make_app(backend: Any, concurrency: Optional[int] = None, **overrides: Any) -> RelayApp:
+    """A RelayApp without llama.cpp endpoints that serves everything from
+    `backend` on a "local" lane (or routes through `backend` if it is a
+    FakeRouter); `overrides` replace Settings fields."""
+    router = backend
+    if not isinstance(backend, FakeRouter):
+        router = FakeRouter({"local": backend}, {"local": concurrency})
+    settings = dataclasses.replace(Settings.from_env(), backends=[], **overrides)
+    return RelayApp(settings, router=router)
@@ -0,0 +1,47 @@
+"""Tests for admission control and load shedding."""
+from __future__ import annotations
+
+import pytest
+
+from relayserve.internal.queue.admission import AdmissionController, OverloadedError
+from tests.conftest import FakeClock
+
+
+def test_depth_cap_sheds_with_retry_after_from_drain_rate():
+    clock = FakeClock(100.0)
+    ctrl = AdmissionController(max_depth=4, clock=clock)
+    for _ in range(4):
+        ctrl.admit(10)
+    # Two requests drained over two seconds: 1 request/s.
+    ctrl.release(10)
+    clock.now += 2.0
+    ctrl.release(10)
+    ctrl.admit(10)
+    ctrl.admit(10)
+    with pytest.raises(OverloadedError) as exc:
+        ctrl.admit(10)
+    assert exc.value.reason == "queue_depth"
+    assert exc.value.retry_after_s == 4
+    report = ctrl.report()
+    assert report["shed"] == 1
+    assert report["shed_by_reason"]["queue_depth"] == 1
+    assert report["queued"] == 4
+
+
+def test_token_cap_sheds_but_never_blocks_an_empty_queue():
+    ctrl = AdmissionController(max_tokens=100, clock=FakeClock(100.0))
+    ctrl.admit(500)
+    with pytest.raises(OverloadedError) as exc:
+        ctrl.admit(1)
+    assert exc.value.reason == "queued_tokens"
+    assert exc.value.retry_after_s >= 1
+    ctrl.release(500)
+    ctrl.admit(60)
+    ctrl.admit(40)
+
+
+def test_zero_limits_disable_shedding():
+    ctrl = AdmissionController(clock=FakeClock(100.0))
+    for _ in range(1000):
+        ctrl.admit(1000)
+    assert ctrl.report()["shed"] == 0
@@ -0,0 +1,85 @@
+"""Tests for prefix-affinity routing with bounded-load consistent hashing."""
+from __future__ import annotations
+
+from backends.replica_set import ReplicaSet
+from relayserve.internal.runner.affinity import AffinityRing, prefix_key
+from router import Router
+
+_ENDPOINTS = ["http://a:8080", "http://b:8080", "http://c:8080"]
+
+
+def test_prefix_key_keeps_the_leading_tokens():
+    assert prefix_key("you are  a helpful\nassistant. question one", 4) == "you are a helpful"
+    assert prefix_key("short", 4) == "short"
+
+
+def test_shared_prefix_lands_on_the_same_endpoint():
+    ring = AffinityRing(_ENDPOINTS)
+    system = "You are a support agent for ACME. Answer briefly. "
+    chosen = set()
+    for question in ("where is my order", "reset my password", "cancel my plan"):
+        key = prefix_key(system + question, 8)
+        with ring.lease(key) as endpoint:
+            chosen.add(endpoint)
+    assert len(chosen) == 1
+    endpoint = chosen.pop()
+    assert ring.report()[endpoint]["hit_rate"] == 1.0
+
+
+def test_keys_spread_over_every_endpoint():
+    ring = AffinityRing(_ENDPOINTS)
+    homes = set()
+    for index in range(200):
+        endpoint = ring.acquire(f"prompt {index}")
+        ring.release(endpoint)
+        homes.add(endpoint)
+    assert homes == set(_ENDPOINTS)
+
+
+def test_overloaded_home_spills_to_the_next_endpoint():
+    ring = AffinityRing(_ENDPOINTS, load_factor=1.0)
+    held = [ring.acquire("same prefix") for _ in range(3)]
+    # Each endpoint may hold at most its even share, so the hot key spreads out.
+    assert sorted(held) == sorted(_ENDPOINTS)
+    home = held[0]
+    report = ring.report()[home]
+    assert (report["requests"], report["affinity_hits"], report["spills"]) == (3, 1, 2)
+    for endpoint in held:
+        ring.release(endpoint)
+    assert all(entry["inflight"] == 0 for entry in ring.report().values())
+
+
+def test_removing_an_endpoint_only_moves_its_own_keys():
+    full = AffinityRing(_ENDPOINTS)
+    reduced = AffinityRing(_ENDPOINTS[:2])
+    for index in range(100):
+        key = f"prompt {index}"
+        before = full.acquire(key)
+        full.release(before)
+        after = reduced.acquire(key)
+        reduced.release(after)
+        if before != _ENDPOINTS[2]:
+            assert after == before
+
+
+class _Replica:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def generate(self, prompt, stream=False, timeout=None, cancel=None, params=None):
+        if stream:
+            return iter([{"content": self.name}])
+        return self.name
+
+
+def test_replica_set_routes_by_prefix_and_router_builds_it():
+    replicas = ReplicaSet({url: _Replica(url) for url in _ENDPOINTS}, prefix_tokens=3)
+    first = replicas.generate("shared system prompt, then question one")
+    assert replicas.generate("shared system prompt, and another") == first
+    assert list(replicas.generate("shared system prompt, streamed", stream=True)) == [{"content": first}]
+    assert replicas.affinity_report()[first]["affinity_hits"] == 3
+
+    router = Router(config={"backends": {"pool": {"type": "vllm", "replicas": _ENDPOINTS}}})
+    [(_, backend, _)] = router.get_backend("pool").members
+    assert isinstance(backend, ReplicaSet)
+    assert set(router.affinity_report()["pool"]) == set(_ENDPOINTS)
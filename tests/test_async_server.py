@@ -0,0 +1,137 @@
+"""Tests for the asyncio server mode."""
+from __future__ import annotations
+
+import asyncio
+import http.client
+import json
+import os
+import socket
+import threading
+
+os.environ.setdefault("RELAYSERVE_BACKENDS", "")
+os.environ.setdefault("RELAYSERVE_PORT", "0")
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.server.app import RelayApp
+from relayserve.internal.server.async_server import AsyncRelayServer
+
+
+def _start_async_server() -> tuple[asyncio.AbstractEventLoop, asyncio.AbstractServer, int]:
+    settings = Settings.from_env()
+    app = RelayApp(settings)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(AsyncRelayServer(app, settings).start("127.0.0.1", 0))
+    port = server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop, server, port
+
+
+def _stop(loop: asyncio.AbstractEventLoop, server: asyncio.AbstractServer) -> None:
+    async def shutdown() -> None:
+        server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_async_routes_match_threaded_server():
+    loop, server, port = _start_async_server()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", "/healthz")
+        resp = conn.getresponse()
+        assert resp.status == 200
+        assert json.loads(resp.read()) == {"status": "ok"}
+
+        # Same socket is reused for the next request.
+        conn.request("GET", "/v1/models")
+        resp = conn.getresponse()
+        assert resp.status == 200
+        assert "data" in json.loads(resp.read())
+
+        conn.request("GET", "/nope")
+        resp = conn.getresponse()
+        assert resp.status == 404
+        resp.read()
+        conn.close()
+    finally:
+        _stop(loop, server)
+
+
+def test_async_non_streaming_chat():
+    loop, server, port = _start_async_server()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request(
+            "POST",
+            "/v1/chat/completions",
+            json.dumps({"messages": [{"role": "user", "content": "Hi"}]}),
+            {"Content-Type": "application/json", "Accept": "application/json", "X-Request-ID": "abc"},
+        )
+        resp = conn.getresponse()
+        data = json.loads(resp.read())
+        assert resp.status == 200
+        assert resp.getheader("X-Request-ID") == "abc"
+        assert data["id"] == "abc"
+        assert data["choices"][0]["message"]["content"]
+        conn.close()
+    finally:
+        _stop(loop, server)
+
+
+def test_async_streaming_ends_with_done():
+    loop, server, port = _start_async_server()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request(
+            "POST",
+            "/v1/chat/completions",
+            json.dumps({"messages": [{"role": "user", "content": "Hi"}], "stream": True}),
+            {"Content-Type": "application/json"},
+        )
+        resp = conn.getresponse()
+        body = resp.read().decode("utf-8")
+        assert resp.status == 200
+        assert "text/event-stream" in resp.getheader("Content-Type", "")
+        assert body.rstrip().endswith("data: [DONE]")
+        conn.close()
+    finally:
+        _stop(loop, server)
+
+
+def test_async_invalid_json_returns_400():
+    loop, server, port = _start_async_server()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("POST", "/v1/chat/completions", b"not json", {"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        assert resp.status == 400
+        assert json.loads(resp.read()) == {"error": "invalid_json"}
+        conn.close()
+    finally:
+        _stop(loop, server)
+
+
+def test_async_expect_continue_gets_100_before_the_body():
+    loop, server, port = _start_async_server()
+    try:
+        body = json.dumps({"messages": [{"role": "user", "content": "hi"}]}).encode()
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            sock.sendall(
+                b"POST /v1/chat/completions HTTP/1.1\r\nHost: x\r\n"
+                b"Content-Type: application/json\r\nExpect: 100-continue\r\n"
+                b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body)
+            )
+            # The client holds its body until told to go on.
+            assert sock.recv(64) == b"HTTP/1.1 100 Continue\r\n\r\n"
+            sock.sendall(body)
+            reply = b""
+            while chunk := sock.recv(65536):
+                reply += chunk
+        assert reply.startswith(b"HTTP/1.1 200")
+    finally:
+        _stop(loop, server)
@@ -0,0 +1,115 @@
+"""Tests for backend streams over the pooled upstream connections."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import pytest
+
+from backends.local_backend import LocalBackend
+from backends.modal_backend import ModalBackend
+from backends.vllm_backend import VllmBackend
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.pool import UpstreamHTTPError, pools_report
+
+_TOKENS = ("Hello", " ", "wörld")
+
+
+def _sse_body(tokens=_TOKENS) -> bytes:
+    return b"".join(
+        b"data: " + json.dumps({"choices": [{"delta": {"content": token}}]}).encode() + b"\n\n"
+        for token in tokens
+    ) + b"data: [DONE]\n\n"
+
+
+class _Upstream(BaseHTTPRequestHandler):
+    """Content-Length, close-delimited and failing SSE responses."""
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/fail/v1/chat/completions":
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path.startswith("/stall"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            self.wfile.write(_sse_body(("one",))[: -len(b"data: [DONE]\n\n")])
+            self.wfile.flush()
+            time.sleep(5)
+            return
+        body = _sse_body()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        if self.path.startswith("/sized"):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+@pytest.fixture()
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Upstream)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("prefix", ["/sized", "/closed"])
+def test_sync_generate_streams_through_the_pool(upstream, prefix):
+    for backend in (LocalBackend(upstream + prefix), VllmBackend(upstream + prefix)):
+        chunks = backend.generate("hi", stream=True)
+        assert [chunk["content"] for chunk in chunks] == list(_TOKENS)
+
+
+class _KeepAlive(_Upstream):
+    protocol_version = "HTTP/1.1"
+
+
+def test_sync_streams_reuse_keep_alive_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAlive)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        backend = VllmBackend(origin + "/sized")
+        for _ in range(3):
+            assert [chunk["content"] for chunk in backend.generate("hi", stream=True)] == list(_TOKENS)
+        assert pools_report()[origin]["created"] == 1
+        assert pools_report()[origin]["reused"] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_modal_backend_streams_without_stripping(upstream):
+    # ModalBackend posts to /completion; the handler replies with the same events.
+    chunks = ModalBackend(upstream).generate("hi", stream=True)
+    assert [chunk["content"] for chunk in chunks] == list(_TOKENS)
+
+
+def test_error_status_raises(upstream):
+    with pytest.raises(UpstreamHTTPError) as excinfo:
+        list(LocalBackend(upstream + "/fail").generate("hi", stream=True))
+    assert excinfo.value.status == 502
+
+
+def test_cancel_aborts_a_stalled_stream(upstream):
+    token = CancelToken()
+    chunks = LocalBackend(upstream + "/stall").generate("hi", stream=True, cancel=token)
+    assert next(chunks) == {"content": "one"}
+    threading.Timer(0.1, token.cancel).start()
+    started = time.perf_counter()
+    with pytest.raises(ConnectionError):
+        next(chunks)
+    assert time.perf_counter() - started < 2.0
+
@@ -0,0 +1,158 @@
+"""Tests for health-checked load balancing over llama.cpp endpoints."""
+from __future__ import annotations
+
+import dataclasses
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import socket
+import threading
+
+import pytest
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.runner.balancer import EndpointBalancer, HealthChecker
+from relayserve.internal.runner.runner import LlamaServerClient
+from relayserve.internal.server.app import RelayApp, UpstreamUnavailableError
+from tests.conftest import FakeClock
+
+_ENDPOINTS = ["http://a:8080", "http://b:8080", "http://c:8080"]
+
+
+def _fail(balancer: EndpointBalancer, endpoint: str, times: int = 1) -> None:
+    others = [other for other in balancer.endpoints if other != endpoint]
+    for _ in range(times):
+        assert balancer.acquire("key", exclude=others) == endpoint
+        balancer.release(endpoint, 0.01, ok=False)
+
+
+def test_repeated_failures_eject_then_readmit_gradually():
+    clock = FakeClock()
+    balancer = EndpointBalancer(_ENDPOINTS, eject_failures=3, eject_s=10, ramp_s=20, clock=clock)
+    _fail(balancer, _ENDPOINTS[0], times=2)
+    assert balancer.weight(_ENDPOINTS[0]) == 1.0
+    _fail(balancer, _ENDPOINTS[0])
+    assert balancer.report()[_ENDPOINTS[0]]["state"] == "ejected"
+    assert all(balancer.acquire(f"key {i}") != _ENDPOINTS[0] for i in range(50))
+
+    clock.now = 15.0  # 5 s into the 20 s ramp
+    assert balancer.weight(_ENDPOINTS[0]) == pytest.approx(0.25)
+    assert balancer.report()[_ENDPOINTS[0]]["state"] == "recovering"
+    clock.now = 31.0
+    assert balancer.weight(_ENDPOINTS[0]) == 1.0
+
+
+def test_failure_while_recovering_ejects_again_for_longer():
+    clock = FakeClock()
+    balancer = EndpointBalancer(_ENDPOINTS, eject_failures=3, eject_s=10, ramp_s=20, clock=clock)
+    _fail(balancer, _ENDPOINTS[0], times=3)
+    clock.now = 12.0
+    assert 0.0 < balancer.weight(_ENDPOINTS[0]) < 1.0
+    _fail(balancer, _ENDPOINTS[0])
+    clock.now = 31.0  # a second ejection lasts 2 x eject_s
+    assert balancer.weight(_ENDPOINTS[0]) == 0.0
+    clock.now = 33.0
+    assert balancer.weight(_ENDPOINTS[0]) > 0.0
+    assert balancer.report()[_ENDPOINTS[0]]["ejections"] == 2
+
+
+def test_every_endpoint_ejected_still_serves():
+    balancer = EndpointBalancer(_ENDPOINTS[:2], eject_failures=1, clock=FakeClock())
+    for endpoint in _ENDPOINTS[:2]:
+        _fail(balancer, endpoint)
+    assert balancer.acquire("key") in _ENDPOINTS[:2]
+
+
+def test_p2c_prefers_the_idle_and_fast_endpoint():
+    balancer = EndpointBalancer(_ENDPOINTS[:2], policy="p2c", rng=random.Random(1))
+    slow, fast = _ENDPOINTS[:2]
+    for endpoint, latency_s in ((slow, 0.5), (fast, 0.05)):
+        balancer.acquire("key", exclude=[e for e in _ENDPOINTS[:2] if e != endpoint])
+        balancer.release(endpoint, latency_s, ok=True)
+    assert all(balancer.acquire("key") == fast for _ in range(5))
+    # With enough work queued on the fast one, the slow one becomes the better pick.
+    for _ in range(10):
+        balancer.acquire("key", exclude=[slow])
+    assert balancer.acquire("key") == slow
+    assert balancer.report()[fast]["inflight"] == 15
+
+
+def test_affinity_policy_moves_keys_off_an_ejected_home():
+    balancer = EndpointBalancer(_ENDPOINTS, eject_failures=1, clock=FakeClock())
+    home = balancer.acquire("shared prefix")
+    balancer.release(home, 0.01, ok=True)
+    _fail(balancer, home)
+    other = balancer.acquire("shared prefix")
+    assert other != home
+    assert balancer.affinity_report()[home]["spills"] >= 1
+
+
+def test_failed_probe_ejects():
+    balancer = EndpointBalancer(_ENDPOINTS, clock=FakeClock())
+    checker = HealthChecker(balancer, 0, probe=lambda endpoint: endpoint != _ENDPOINTS[1])
+    checker.check()
+    report = balancer.report()
+    assert report[_ENDPOINTS[1]]["state"] == "ejected"
+    assert report[_ENDPOINTS[0]]["state"] == "healthy"
+    assert report[_ENDPOINTS[1]]["probe_failures"] == 1
+
+
+class _Llama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self._reply(b'{"status": "ok"}')
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._reply(json.dumps({"choices": [{"message": {"content": "hello"}}]}).encode())
+
+    def _reply(self, body: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+def _dead_endpoint() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def test_client_retries_on_another_endpoint_and_ejects_the_dead_one():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Llama)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        live = f"http://127.0.0.1:{server.server_address[1]}"
+        dead = _dead_endpoint()
+        balancer = EndpointBalancer([dead, live], policy="p2c", eject_failures=2)
+        client = LlamaServerClient([dead, live], balancer=balancer)
+        assert all(client.chat(f"prompt {i}") == "hello" for i in range(10))
+        report = client.endpoint_report()
+        assert report[dead]["state"] == "ejected"
+        assert report[dead]["errors"] == 2
+        assert report[live]["ewma_ms"] > 0.0
+
+        HealthChecker(balancer, 0).check()
+        assert client.endpoint_report()[live]["probes"] == 1
+        assert client.endpoint_report()[live]["probe_failures"] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_failed_endpoints_surface_as_an_error_not_a_local_reply():
+    endpoints = [_dead_endpoint(), _dead_endpoint()]
+    with pytest.raises(ConnectionError):
+        LlamaServerClient(endpoints).chat("hi")
+    app = RelayApp(dataclasses.replace(Settings.from_env(), backends=endpoints))
+    with pytest.raises(UpstreamUnavailableError):
+        app.handle_chat("hello there", timeout_s=5)
@@ -0,0 +1,105 @@
+"""Tests for the adaptive batching policy."""
+from __future__ import annotations
+
+from concurrent.futures import Future
+import statistics
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from relayserve.internal.queue.batching import AdaptiveBatching
+from relayserve.internal.queue.lanes import DispatchLane
+from tests.conftest import FakeClock
+
+
+def _warm(policy: AdaptiveBatching, clock: FakeClock, gap_s: float, service_s: float) -> None:
+    for _ in range(50):
+        clock.now += gap_s
+        policy.observe_arrival()
+    policy.observe_batch(4, 4 * service_s)
+
+
+def test_no_history_dispatches_immediately():
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32, clock=FakeClock(100.0))
+    assert policy.plan(1) == (32, 0.0)
+
+
+def test_busy_lane_waits_only_within_slo():
+    clock = FakeClock(100.0)
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32, clock=clock)
+    _warm(policy, clock, gap_s=0.001, service_s=0.001)
+    size, window = policy.plan(1, inflight=40)
+    assert size == 32
+    # 31 more arrivals would take 31 ms, but serving 32 back to back leaves 19 ms.
+    assert window == pytest.approx(0.019)
+    report = policy.report()
+    assert report["batch_size"] == 32
+    assert report["window_ms"] == pytest.approx(19.0)
+    assert report["arrival_rps"] == pytest.approx(1000.0)
+
+
+def test_window_ends_when_the_work_in_flight_would():
+    clock = FakeClock(100.0)
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32, clock=clock)
+    _warm(policy, clock, gap_s=0.001, service_s=0.001)
+    assert policy.plan(1, inflight=5)[1] == pytest.approx(0.005)
+    # Nothing in flight: the upstream is idle, so waiting only adds latency.
+    assert policy.plan(1, inflight=0) == (32, 0.0)
+
+
+def test_backend_without_upstream_batching_takes_one_request_at_once():
+    clock = FakeClock(100.0)
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32, clock=clock, batches_upstream=False)
+    _warm(policy, clock, gap_s=0.001, service_s=0.001)
+    assert policy.plan(1, inflight=40) == (1, 0.0)
+    assert policy.plan(40, inflight=40) == (1, 0.0)
+
+
+def test_closed_loop_client_is_not_held_by_the_window():
+    # One client sending its next request as soon as the last is answered
+    # never has company in the queue; waiting for it would be pure latency.
+    service_s = 0.0005
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32)
+
+    def process(batch):
+        time.sleep(service_s * len(batch))
+        for item in batch:
+            item.future.set_result(len(batch))
+
+    lane = DispatchLane("local", process, concurrency=1, policy=policy)
+    latencies = []
+    for _ in range(30):
+        item = SimpleNamespace(future=Future())
+        started = time.perf_counter()
+        lane.put(item)
+        assert item.future.result(timeout=5) == 1
+        latencies.append(time.perf_counter() - started)
+    # The old window would have held each request ~(slo - batch service) ≈ 0.03 s.
+    assert statistics.median(latencies) < service_s + 0.01
+
+
+def test_deep_queue_takes_a_full_batch_without_waiting():
+    clock = FakeClock(100.0)
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32, clock=clock)
+    _warm(policy, clock, gap_s=0.001, service_s=0.001)
+    assert policy.plan(40) == (32, 0.0)
+
+
+def test_slow_service_shrinks_batch_to_fit_slo():
+    clock = FakeClock(100.0)
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32, clock=clock)
+    _warm(policy, clock, gap_s=0.001, service_s=0.01)
+    size, _ = policy.plan(1)
+    assert size == 5
+
+
+def test_sparse_traffic_does_not_wait():
+    clock = FakeClock(100.0)
+    policy = AdaptiveBatching(slo_s=0.05, max_batch_size=32, clock=clock)
+    _warm(policy, clock, gap_s=0.2, service_s=0.001)
+    assert policy.plan(1) == (32, 0.0)
+    # A burst followed by silence decays the rate instead of keeping the window open.
+    _warm(policy, clock, gap_s=0.001, service_s=0.001)
+    clock.now += 5.0
+    assert policy.plan(1)[1] == 0.0
@@ -0,0 +1,111 @@
+"""Tests for single-flight coalescing of identical deterministic requests."""
+from __future__ import annotations
+
+import threading
+import time
+
+from relayserve.internal.queue.singleflight import Broadcast
+from relayserve.internal.server.app import RelayApp
+from relayserve.internal.server.keys import request_key
+from tests.conftest import make_app
+
+
+class _GatedBackend:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.release = threading.Event()
+
+    def generate(self, prompt: str, stream: bool = False, timeout=None, cancel=None, params=None):
+        self.calls.append(prompt)
+        if stream:
+            return self._stream(prompt)
+        self.release.wait(5)
+        return f"done: {prompt}"
+
+    def _stream(self, prompt: str):
+        yield {"content": "one "}
+        self.release.wait(5)
+        yield {"content": "two"}
+
+
+def _app(backend) -> RelayApp:
+    return make_app(backend, 4, batch_policy="fixed", batch_size=1)
+
+
+def _wait_for_call(backend) -> None:
+    for _ in range(200):
+        if backend.calls:
+            return
+        time.sleep(0.005)
+
+
+def _payload(content: str, **fields) -> dict:
+    return {"messages": [{"role": "user", "content": content}], "temperature": 0, **fields}
+
+
+def test_request_key_covers_deterministic_requests_only():
+    key = request_key(_payload("hi"), "m")
+    assert key is not None
+    assert request_key({**_payload("  hi "), "messages": [{"role": "User", "content": " hi "}]}, "m") == key
+    assert request_key(_payload("hi"), "other") != key
+    assert request_key(_payload("hi", max_tokens=5), "m") != key
+    assert request_key({"messages": [{"role": "user", "content": "hi"}]}, "m") is None
+    assert request_key(_payload("hi", temperature=0.7), "m") is None
+    assert request_key(_payload("hi", n=2), "m") is None
+
+
+def test_identical_requests_share_one_upstream_call():
+    backend = _GatedBackend()
+    app = _app(backend)
+    leader = app.submit_chat("hi", key="k")
+    _wait_for_call(backend)
+    follower = app.submit_chat("hi", key="k")
+    backend.release.set()
+    assert leader.result(timeout=5)["reply"] == follower.result(timeout=5)["reply"] == "done: hi"
+    assert follower.result()["meta"]["coalesced"] is True
+    assert "coalesced" not in leader.result()["meta"]
+    assert backend.calls == ["hi"]
+    report = app.metrics_report()["coalescing"]
+    assert (report["leaders"], report["followers"], report["rate"]) == (1, 1, 0.5)
+
+
+def test_shared_call_is_abandoned_only_by_its_last_caller():
+    backend = _GatedBackend()
+    app = _app(backend)
+    leader = app.submit_chat("hi", key="k")
+    _wait_for_call(backend)
+    follower = app.submit_chat("hi", key="k")
+    app.abandon(leader)
+    assert leader.cancelled()
+    assert app.metrics_report()["dropped"]["disconnect_running"] == 0
+    backend.release.set()
+    assert follower.result(timeout=5)["reply"] == "done: hi"
+
+
+def test_identical_streams_fan_out_one_upstream_stream():
+    backend = _GatedBackend()
+    app = _app(backend)
+    leader = app.submit_stream("hi", "req-1", key="k")
+    first = leader.get(timeout=5)
+    follower = app.submit_stream("hi", "req-2", key="k")
+    backend.release.set()
+    assert [first] + list(leader) == ["one ", "two"]
+    # The late subscriber is replayed what it missed.
+    assert list(follower) == ["one ", "two"]
+    assert backend.calls == ["hi"]
+
+
+def test_broadcast_readdresses_chunks_and_cancels_when_everyone_leaves():
+    broadcast = Broadcast()
+    cancelled = []
+    broadcast.on_cancel(lambda: cancelled.append(True))
+    first = broadcast.subscribe("a")
+    second = broadcast.subscribe("b")
+    assert broadcast.put({"id": "a", "choices": []})
+    assert first.get(timeout=1)["id"] == "a"
+    assert second.get(timeout=1)["id"] == "b"
+    first.cancel()
+    assert not cancelled
+    second.cancel()
+    assert cancelled == [True]
+    assert not broadcast.put("late")
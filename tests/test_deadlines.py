@@ -0,0 +1,93 @@
+"""Tests for request deadlines and earliest-deadline-first dispatch."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from relayserve.internal.queue.queue import RequestQueue
+from relayserve.internal.server.app import DeadlineExceededError, RelayApp
+from relayserve.internal.server.http_server import _HTTPError, _request_timeout
+from tests.conftest import make_app
+
+
+class _SlowBackend:
+    def __init__(self, delay_s: float) -> None:
+        self.delay_s = delay_s
+        self.calls: list[tuple[str, float | None]] = []
+        self.release = threading.Event()
+
+    def generate(self, prompt: str, stream: bool = False, timeout=None, cancel=None, params=None):
+        self.calls.append((prompt, timeout))
+        self.release.wait(self.delay_s)
+        return f"done: {prompt}"
+
+
+def _wait_for_call(backend) -> None:
+    for _ in range(200):
+        if backend.calls:
+            return
+        time.sleep(0.005)
+
+
+def _app(backend, **overrides) -> RelayApp:
+    return make_app(backend, 1, batch_policy="fixed", batch_size=1, **overrides)
+
+
+def test_queue_orders_a_tenants_requests_by_deadline():
+    queue = RequestQueue()
+    queue.enqueue("relaxed", deadline=30.0)
+    queue.enqueue("none")
+    queue.enqueue("urgent", deadline=10.0)
+    assert [queue.dequeue() for _ in range(3)] == ["urgent", "relaxed", "none"]
+
+
+def test_request_past_its_deadline_never_reaches_the_backend():
+    backend = _SlowBackend(delay_s=5.0)
+    app = _app(backend)
+    busy = app.submit_chat("first")
+    _wait_for_call(backend)
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceededError):
+        app.handle_chat("second", timeout_s=0.2)
+    assert time.perf_counter() - started < 1.0
+    backend.release.set()
+    assert busy.result(timeout=5)["reply"] == "done: first"
+    # The cancelled request is dropped when the lane reaches it.
+    for _ in range(200):
+        if app.metrics_report()["dropped"]["cancelled"]:
+            break
+        time.sleep(0.005)
+    assert app.metrics_report()["dropped"]["cancelled"] == 1
+    assert [prompt for prompt, _ in backend.calls] == ["first"]
+
+
+def test_lane_fails_requests_that_expire_while_queued():
+    backend = _SlowBackend(delay_s=0.3)
+    app = _app(backend)
+    app.submit_chat("first")
+    _wait_for_call(backend)
+    doomed = app.submit_chat("second", timeout_s=0.1)
+    with pytest.raises(DeadlineExceededError):
+        doomed.result(timeout=5)
+    assert app.metrics_report()["dropped"]["deadline"] == 1
+
+
+def test_upstream_timeout_is_capped_by_the_deadline():
+    backend = _SlowBackend(delay_s=0.0)
+    app = _app(backend, request_timeout_ms=2000)
+    app.handle_chat("hi")
+    _, timeout = backend.calls[0]
+    assert 0 < timeout <= 2.0
+
+
+def test_timeout_from_header_or_body():
+    assert _request_timeout({"X-Request-Timeout-Ms": "1500"}, {}) == 1.5
+    assert _request_timeout({}, {"timeout_ms": 250}) == 0.25
+    assert _request_timeout({}, {}) is None
+    for bad in ("soon", "-5", "0", "inf", "Infinity", "nan"):
+        with pytest.raises(_HTTPError):
+            _request_timeout({"X-Request-Timeout-Ms": bad}, {})
+    with pytest.raises(_HTTPError):
+        _request_timeout({}, {"timeout_ms": float("inf")})
@@ -0,0 +1,62 @@
+"""Tests for the versioned device registry, background re-probe and cached shard plans."""
+from __future__ import annotations
+
+import time
+
+from relayserve.internal.device.registry import Device, DeviceRegistry, RegistryRefresher
+from relayserve.internal.shard.plan import ShardPlanner
+
+_CPU = Device(name="cpu", backend="cpu", vram_gb=0.0, tflops=0.4, bandwidth_gbps=10.0)
+_GPU = Device(name="gpu0", backend="cuda", vram_gb=24.0, tflops=20.0, bandwidth_gbps=300.0)
+
+
+def test_version_changes_only_with_the_device_set():
+    registry = DeviceRegistry()
+    registry.add_all([_CPU])
+    version = registry.version
+    assert not registry.replace([_CPU])
+    assert registry.version == version
+    assert registry.replace([_CPU, _GPU])
+    assert registry.version == version + 1
+    assert registry.best_device() == _GPU
+    assert registry.replace([_CPU])
+    assert registry.best_device() == _CPU
+
+
+def test_shard_plan_is_cached_per_registry_version():
+    registry = DeviceRegistry()
+    registry.add_all([_CPU, _GPU])
+    planner = ShardPlanner()
+    first = planner.plan_for(registry, 32)
+    assert planner.plan_for(registry, 32) is first
+    assert planner.plan_for(registry, 16) is not first
+    registry.replace([_GPU])
+    replanned = planner.plan_for(registry, 32)
+    assert replanned.placements == ["cuda:gpu0"]
+    assert replanned.layer_ranges == [(0, 31)]
+
+
+def test_refresher_picks_up_new_devices_and_survives_probe_failures():
+    registry = DeviceRegistry()
+    registry.add_all([_CPU])
+    probes = [[_CPU, _GPU], RuntimeError("nvidia-smi hung"), [_CPU]]
+
+    def probe():
+        result = probes.pop(0) if probes else [_CPU]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    refresher = RegistryRefresher(registry, probe, interval_s=0.01)
+    refresher.start()
+    try:
+        for _ in range(200):
+            if not probes and registry.version == 3:
+                break
+            time.sleep(0.01)
+    finally:
+        refresher.stop()
+    report = refresher.report()
+    assert report["probe_failures"] == 1
+    assert report["version"] == 3
+    assert registry.list() == [_CPU]
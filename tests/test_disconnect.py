@@ -0,0 +1,139 @@
+"""Tests for dropping and aborting work whose client has gone away."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import threading
+import time
+
+import pytest
+
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.pool import post_json
+from relayserve.internal.server.app import ClientGoneError, RelayApp
+from relayserve.internal.server.http_server import _peer_closed
+from tests.conftest import make_app
+
+
+class _BlockingBackend:
+    """Blocks every call until released or until its cancel token fires."""
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.release = threading.Event()
+
+    def generate(self, prompt: str, stream: bool = False, timeout=None, cancel=None, params=None):
+        self.calls.append(prompt)
+        aborted = threading.Event()
+        if cancel is not None:
+            cancel.register(aborted.set)
+        while not self.release.is_set():
+            if aborted.wait(0.01):
+                raise ConnectionError("aborted")
+        return f"done: {prompt}"
+
+
+def _app(backend) -> RelayApp:
+    return make_app(backend, 1, batch_policy="fixed", batch_size=1)
+
+
+def _wait_until(condition) -> None:
+    for _ in range(400):
+        if condition():
+            return
+        time.sleep(0.005)
+
+
+def test_abandoned_queued_request_is_removed():
+    backend = _BlockingBackend()
+    app = _app(backend)
+    busy = app.submit_chat("first")
+    _wait_until(lambda: backend.calls)
+    queued = app.submit_chat("second")
+    app.abandon(queued)
+    assert queued.cancelled()
+    assert app.metrics_report()["dropped"]["disconnect_queued"] == 1
+    assert app.metrics_report()["queue_depth"] == 0
+    backend.release.set()
+    assert busy.result(timeout=5)["reply"] == "done: first"
+    assert backend.calls == ["first"]
+
+
+def test_abandoned_running_request_aborts_upstream():
+    backend = _BlockingBackend()
+    app = _app(backend)
+    running = app.submit_chat("first")
+    _wait_until(lambda: backend.calls)
+    app.abandon(running)
+    with pytest.raises(ClientGoneError):
+        running.result(timeout=5)
+    assert app.metrics_report()["dropped"]["disconnect_running"] == 1
+    # No fallback generation is started for a request nobody is waiting on.
+    assert app.metrics_report()["stats"]["count"] == 0
+
+
+def test_cancelling_an_unfinished_stream_abandons_it():
+    backend = _BlockingBackend()
+    app = _app(backend)
+    app.submit_chat("first")
+    _wait_until(lambda: backend.calls)
+    channel = app.submit_stream("second", "req-1")
+    channel.cancel()
+    assert app.metrics_report()["dropped"]["disconnect_queued"] == 1
+    backend.release.set()
+    assert app.wait_idle(timeout=5)
+    assert backend.calls == ["first"]
+
+
+def test_handle_chat_gives_up_when_the_client_leaves():
+    backend = _BlockingBackend()
+    app = _app(backend)
+    started = time.perf_counter()
+    with pytest.raises(ClientGoneError):
+        app.handle_chat("hi", client_gone=lambda: True)
+    assert time.perf_counter() - started < 2.0
+    _wait_until(lambda: app.metrics_report()["dropped"]["disconnect_running"])
+    assert app.wait_idle(timeout=5)
+
+
+def test_cancel_token_unblocks_an_upstream_read():
+    class _Stall(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(200)
+            self.send_header("Content-Length", "100")
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(5)
+
+        def log_message(self, format: str, *args) -> None:
+            return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stall)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        token = CancelToken()
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        resp = post_json(url, {}, timeout=10, cancel=token)
+        threading.Timer(0.1, token.cancel).start()
+        started = time.perf_counter()
+        with pytest.raises(Exception):
+            resp.read()
+        assert time.perf_counter() - started < 2.0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_peer_closed_detects_a_closed_connection():
+    left, right = socket.socketpair()
+    try:
+        assert not _peer_closed(left)
+        right.sendall(b"GET")
+        assert not _peer_closed(left)
+        left.recv(3)
+        right.close()
+        assert _peer_closed(left)
+    finally:
+        left.close()
@@ -0,0 +1,79 @@
+"""Tests for graceful drain."""
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+os.environ.setdefault("RELAYSERVE_BACKENDS", "")
+os.environ.setdefault("RELAYSERVE_PORT", "0")
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.server.app import DrainingError, build_app
+from relayserve.internal.server.http_server import _make_handler
+from relayserve.internal.server.lifecycle import Lifecycle
+
+
+def _start_server(**overrides):
+    settings = dataclasses.replace(Settings.from_env(), **overrides)
+    app = build_app(settings)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(app))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1], app
+
+
+def _call(port: int, method: str, path: str, payload=None, headers=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = Request(f"http://127.0.0.1:{port}{path}", data=data, headers=headers or {}, method=method)
+    try:
+        with urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_admin_drain_turns_healthz_not_ready_and_refuses_work():
+    server, port, app = _start_server()
+    try:
+        assert _call(port, "POST", "/admin/drain", {}) == (202, {"status": "draining"})
+        assert _call(port, "GET", "/healthz") == (503, {"status": "draining"})
+        status, body = _call(
+            port,
+            "POST",
+            "/v1/chat/completions",
+            {"messages": [{"role": "user", "content": "Hi"}]},
+            {"Accept": "application/json"},
+        )
+        assert (status, body) == (503, {"error": "draining"})
+        with pytest.raises(DrainingError):
+            app.submit_chat("Hi")
+    finally:
+        server.shutdown()
+
+
+def test_admin_drain_requires_token_when_configured():
+    server, port, app = _start_server(admin_token="secret")
+    try:
+        assert _call(port, "POST", "/admin/drain", {})[0] == 403
+        assert not app.draining
+        assert _call(port, "POST", "/admin/drain", {}, {"X-Admin-Token": "secret"})[0] == 202
+        assert app.draining
+    finally:
+        server.shutdown()
+
+
+def test_lifecycle_stops_server_only_after_inflight_work_finishes():
+    settings = dataclasses.replace(Settings.from_env(), drain_timeout_s=5.0)
+    app = build_app(settings)
+    stopped = threading.Event()
+    Lifecycle(app, settings, listen_socket=None, stop_accepting=lambda: None, stop=stopped.set)
+    with app.inflight():
+        app.request_drain()
+        assert not stopped.wait(0.2)
+    assert stopped.wait(2.0)
@@ -0,0 +1,210 @@
+"""Tests for circuit breakers and failover chains over configured backends."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from backends.failover import FailoverChain
+from relayserve.internal.runner.breaker import CircuitBreaker
+from relayserve.internal.server.app import UpstreamUnavailableError
+from router import Router
+from tests.conftest import FakeClock, make_app
+
+
+class _Backend:
+    def __init__(self, name: str, fail: bool = False, fail_midway: bool = False) -> None:
+        self.name = name
+        self.fail = fail
+        self.fail_midway = fail_midway
+        self.calls = 0
+
+    def generate(self, prompt, stream=False, timeout=None, cancel=None, params=None):
+        self.calls += 1
+        if stream:
+            return self._stream()
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        return self.name
+
+    def _stream(self):
+        if self.fail:
+            raise ConnectionError(f"{self.name} is down")
+        yield {"content": self.name}
+        if self.fail_midway:
+            raise ConnectionError(f"{self.name} dropped the stream")
+
+
+
+def test_breaker_opens_on_error_rate_then_half_opens_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, open_s=5, clock=clock)
+    for ok in (True, False, True):
+        assert breaker.allow()
+        breaker.record(ok)
+    assert breaker.state == "closed"  # too few calls to judge
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now = 5.0
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial call at a time
+    breaker.record(True)
+    assert breaker.state == "closed"
+    report = breaker.report()
+    assert report["opens"] == 1
+    assert report["rejected"] == 2
+
+
+def test_failed_trial_call_opens_again():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_s=5, clock=clock)
+    breaker.allow()
+    breaker.record(False)
+    clock.now = 5.0
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    clock.now = 9.0
+    assert not breaker.allow()
+
+
+def test_slow_calls_open_the_breaker():
+    breaker = CircuitBreaker(slow_call_s=1.0, min_calls=3, clock=FakeClock())
+    for _ in range(3):
+        breaker.allow()
+        breaker.record(True, latency_s=2.0)
+    assert breaker.state == "open"
+    assert breaker.report()["slow_calls"] == 3
+
+
+def test_chain_fails_over_and_stops_calling_an_open_backend():
+    primary, secondary = _Backend("primary", fail=True), _Backend("secondary")
+    chain = FailoverChain(
+        [
+            ("primary", primary, CircuitBreaker(min_calls=2, open_s=60)),
+            ("secondary", secondary, CircuitBreaker()),
+        ]
+    )
+    assert [chain.generate("hi") for _ in range(5)] == ["secondary"] * 5
+    assert primary.calls == 2
+    assert list(chain.generate("hi", stream=True)) == [{"content": "secondary"}]
+
+
+def test_stream_fails_over_with_the_same_breakers():
+    primary, secondary = _Backend("primary", fail=True), _Backend("secondary")
+    primary_breaker = CircuitBreaker(min_calls=2, open_s=60)
+    chain = FailoverChain(
+        [("primary", primary, primary_breaker), ("secondary", secondary, CircuitBreaker())]
+    )
+
+    def collect() -> list:
+        return [chunk["content"] for chunk in chain.generate("hi", stream=True)]
+
+    assert [collect() for _ in range(3)] == [["secondary"]] * 3
+    assert primary.calls == 2
+    assert primary_breaker.report()["rejected"] == 1
+
+
+def test_stream_failing_after_its_first_chunk_is_recorded_once():
+    breaker = CircuitBreaker()
+    chain = FailoverChain([("only", _Backend("only", fail_midway=True), breaker)])
+    chunks = chain.generate("hi", stream=True)
+    assert next(chunks) == {"content": "only"}
+    with pytest.raises(ConnectionError, match="dropped"):
+        next(chunks)
+    assert breaker.report()["calls"] == 1
+    assert breaker.report()["failures"] == 1
+
+    closed = CircuitBreaker()
+    chain = FailoverChain([("only", _Backend("only"), closed)])
+    chunks = chain.generate("hi", stream=True)
+    next(chunks)
+    chunks.close()
+    assert closed.report()["calls"] == 1
+    assert closed.report()["failures"] == 0
+
+
+def test_chain_raises_when_every_backend_is_down():
+    chain = FailoverChain([("only", _Backend("only", fail=True), CircuitBreaker(min_calls=1))])
+    with pytest.raises(ConnectionError):
+        chain.generate("hi")
+    with pytest.raises(ConnectionError, match="no backend available"):
+        chain.generate("hi")
+
+
+def test_request_fails_with_502_when_every_chain_member_fails():
+    chain = FailoverChain(
+        [
+            ("primary", _Backend("primary", fail=True), CircuitBreaker()),
+            ("secondary", _Backend("secondary", fail=True), CircuitBreaker()),
+        ]
+    )
+    app = make_app(chain, batch_policy="fixed", batch_size=1)
+    with pytest.raises(UpstreamUnavailableError):
+        app.handle_chat("hello there", timeout_s=5)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = json.dumps({"choices": [{"message": {"content": "from the fallback"}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+def _dead_url() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def test_router_builds_failover_chains_from_config():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        config = {
+            "default_backend": "main",
+            "backends": {
+                "main": {
+                    "type": "local",
+                    "url": _dead_url(),
+                    "connect_timeout": 0.5,
+                    "failover": ["spare"],
+                    "breaker": {"min_calls": 2, "open_s": 60},
+                },
+                "spare": {"type": "vllm", "url": f"http://127.0.0.1:{server.server_address[1]}"},
+            },
+        }
+        router = Router(config=config)
+        assert router.get_backend().names == ["main", "spare"]
+        started = time.perf_counter()
+        replies = [router.get_backend().generate("hi", timeout=120) for _ in range(10)]
+        assert time.perf_counter() - started < 2.0
+        assert replies == ["from the fallback"] * 10
+        report = router.breaker_report()
+        assert report["main"]["state"] == "open"
+        assert report["main"]["failures"] == 2
+        assert report["main"]["rejected"] == 8
+        assert report["spare"]["calls"] == 10
+    finally:
+        server.shutdown()
+        server.server_close()
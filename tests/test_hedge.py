@@ -0,0 +1,173 @@
+"""Tests for hedged requests across replicas."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+from relayserve.internal.runner.balancer import EndpointBalancer
+from relayserve.internal.runner.cancel import CancelToken
+from relayserve.internal.runner.hedge import Hedger
+from relayserve.internal.runner.runner import LlamaServerClient
+
+
+def _warm(hedger: Hedger, latency_s: float = 0.01, samples: int = 20) -> None:
+    for _ in range(samples):
+        hedger._observe(latency_s)
+
+
+def _replicas(latencies: dict[str, float], cancelled: list[str]):
+    """An attempt that picks the first replica not yet tried and sleeps for its
+    latency, stopping early if its token is cancelled."""
+
+    def attempt(token: CancelToken, tried: list[str]) -> str:
+        name = next(name for name in latencies if name not in tried)
+        tried.append(name)
+        done = threading.Event()
+        token.register(done.set)
+        if done.wait(latencies[name]):
+            cancelled.append(name)
+            raise ConnectionError("cancelled")
+        return name
+
+    return attempt
+
+
+def test_no_hedge_until_enough_samples():
+    hedger = Hedger(min_samples=5, budget=1.0)
+    assert hedger.delay() is None
+    assert hedger.run(_replicas({"slow": 0.05, "fast": 0.0}, [])) == "slow"
+    assert hedger.report()["hedged"] == 0
+
+
+def test_slow_primary_loses_to_the_backup_which_cancels_it():
+    hedger = Hedger(budget=1.0)
+    _warm(hedger)
+    cancelled: list[str] = []
+    started = time.perf_counter()
+    assert hedger.run(_replicas({"slow": 5.0, "fast": 0.0}, cancelled)) == "fast"
+    assert time.perf_counter() - started < 1.0
+    assert cancelled == ["slow"]
+    report = hedger.report()
+    assert report["hedged"] == 1
+    assert report["hedge_wins"] == 1
+
+
+def test_fast_primary_sends_no_hedge():
+    hedger = Hedger(budget=1.0)
+    _warm(hedger, latency_s=0.2)
+    assert hedger.run(_replicas({"fast": 0.0, "other": 0.0}, [])) == "fast"
+    time.sleep(0.3)
+    assert hedger.report()["hedged"] == 0
+
+
+def test_budget_caps_the_share_of_hedged_requests():
+    hedger = Hedger(budget=0.1)
+    _warm(hedger, latency_s=0.001)
+    for _ in range(20):
+        hedger.run(_replicas({"slow": 0.02, "fast": 0.0}, []))
+    report = hedger.report()
+    assert report["hedged"] <= 2
+    assert report["budget_denied"] > 0
+
+
+def test_failed_primary_waits_for_the_backup():
+    hedger = Hedger(budget=1.0)
+    _warm(hedger)
+
+    def attempt(token: CancelToken, tried: list[str]) -> str:
+        tried.append("replica %d" % len(tried))
+        if len(tried) == 1:
+            time.sleep(0.05)
+            raise ConnectionError("primary down")
+        time.sleep(0.1)
+        return tried[-1]
+
+    assert hedger.run(attempt) == "replica 1"
+
+
+def test_client_cancel_stops_both_attempts():
+    hedger = Hedger(budget=1.0)
+    _warm(hedger)
+    cancel = CancelToken()
+    cancelled: list[str] = []
+    threading.Timer(0.1, cancel.cancel).start()
+    try:
+        hedger.run(_replicas({"a": 5.0, "b": 5.0}, cancelled), cancel)
+    except ConnectionError:
+        pass
+    time.sleep(0.05)
+    assert sorted(cancelled) == ["a", "b"]
+
+
+def _server(delay_s: float, reply: str) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(delay_s)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            event = {"choices": [{"delta": {"content": reply}}]}
+            self.wfile.write(b"data: " + json.dumps(event).encode() + b"\n\ndata: [DONE]\n\n")
+
+        def log_message(self, format: str, *args) -> None:
+            return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_stream_is_hedged_before_its_first_chunk():
+    slow, fast = _server(2.0, "slow"), _server(0.0, "fast")
+    try:
+        endpoints = [f"http://127.0.0.1:{server.server_address[1]}" for server in (slow, fast)]
+        hedger = Hedger(budget=1.0)
+        _warm(hedger)
+        balancer = EndpointBalancer(endpoints, policy="p2c")
+        # Make the slow server the primary pick.
+        balancer.acquire("key", exclude=endpoints[:1])
+        client = LlamaServerClient(endpoints, balancer=balancer, stream_hedger=hedger)
+        started = time.perf_counter()
+        chunks = list(client.chat_stream("prompt", "id", "model"))
+        assert time.perf_counter() - started < 1.5
+        assert chunks[0]["choices"][0]["delta"]["content"] == "fast"
+        assert client.hedge_report()["stream"]["hedge_wins"] == 1
+    finally:
+        for server in (slow, fast):
+            server.shutdown()
+            server.server_close()
+
+
+class _Replica:
+    def __init__(self, name: str, delay_s: float) -> None:
+        self.name = name
+        self.delay_s = delay_s
+
+    def generate(self, prompt, stream=False, timeout=None, cancel=None, params=None):
+        done = threading.Event()
+        cancel.register(done.set)
+        if done.wait(self.delay_s):
+            raise ConnectionError("cancelled")
+        return self.name
+
+
+def test_replica_set_hedges_to_another_replica():
+    from backends.replica_set import ReplicaSet
+
+    hedger = Hedger(budget=1.0)
+    _warm(hedger)
+    replicas = ReplicaSet({"a": _Replica("a", 0.0), "b": _Replica("b", 0.0)}, hedger=hedger)
+    home = replicas._ring.acquire("prompt")
+    replicas._ring.release(home)
+    replicas._replicas[home].delay_s = 2.0
+    started = time.perf_counter()
+    assert replicas.generate("prompt") != home
+    assert time.perf_counter() - started < 1.0
+    assert replicas.hedge_report()["generate"]["hedge_wins"] == 1
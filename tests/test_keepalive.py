@@ -0,0 +1,108 @@
+"""Tests for HTTP/1.1 persistent connections on the threaded server."""
+from __future__ import annotations
+
+import dataclasses
+import http.client
+import json
+import os
+import re
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+os.environ.setdefault("RELAYSERVE_BACKENDS", "")
+os.environ.setdefault("RELAYSERVE_PORT", "0")
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.server.app import RelayApp
+from relayserve.internal.server.http_server import _make_handler
+
+
+def _start_server(**overrides) -> tuple[ThreadingHTTPServer, int]:
+    settings = dataclasses.replace(Settings.from_env(), **overrides)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(RelayApp(settings)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def _chat(conn: http.client.HTTPConnection, stream: bool = False) -> http.client.HTTPResponse:
+    conn.request(
+        "POST",
+        "/v1/chat/completions",
+        json.dumps({"messages": [{"role": "user", "content": "Hi"}], "stream": stream}),
+        {"Content-Type": "application/json", "Accept": "application/json"},
+    )
+    return conn.getresponse()
+
+
+def test_connection_reused_across_requests():
+    server, port = _start_server()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        resp = _chat(conn)
+        assert resp.status == 200
+        resp.read()
+        first_sock = conn.sock
+        resp = _chat(conn)
+        assert resp.status == 200
+        resp.read()
+        assert conn.sock is first_sock
+        conn.close()
+    finally:
+        server.shutdown()
+
+
+def test_streaming_is_chunked_and_keeps_connection():
+    server, port = _start_server()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        resp = _chat(conn, stream=True)
+        assert resp.getheader("Transfer-Encoding") == "chunked"
+        body = resp.read().decode("utf-8")
+        assert body.rstrip().endswith("data: [DONE]")
+        first_sock = conn.sock
+        resp = _chat(conn)
+        assert resp.status == 200
+        resp.read()
+        assert conn.sock is first_sock
+        conn.close()
+    finally:
+        server.shutdown()
+
+
+def test_pipelined_requests_are_answered_in_order():
+    server, port = _start_server()
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            sock.sendall(
+                b"GET /healthz HTTP/1.1\r\nHost: x\r\n\r\n"
+                b"POST /missing HTTP/1.1\r\nHost: x\r\nContent-Length: 2\r\n\r\n{}"
+                b"GET /v1/models HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n"
+            )
+            data = b""
+            while True:
+                part = sock.recv(65536)
+                if not part:
+                    break
+                data += part
+        statuses = re.findall(rb"HTTP/1\.1 (\d{3}) ", data)
+        assert statuses == [b"200", b"404", b"200"]
+    finally:
+        server.shutdown()
+
+
+def test_max_requests_per_connection_closes_socket():
+    server, port = _start_server(max_keepalive_requests=2)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", "/healthz")
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.getheader("Connection") is None
+        conn.request("GET", "/healthz")
+        resp = conn.getresponse()
+        resp.read()
+        assert resp.getheader("Connection") == "close"
+        conn.close()
+    finally:
+        server.shutdown()
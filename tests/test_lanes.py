@@ -0,0 +1,88 @@
+"""Tests for per-backend dispatch lanes."""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+from relayserve.internal.queue.batching import FixedBatching
+from relayserve.internal.queue.lanes import DispatchLane
+from relayserve.internal.server.app import RelayApp
+from tests.conftest import FakeRouter, make_app
+
+
+class _Backend:
+    def __init__(self, name: str, delay_s: float = 0.0) -> None:
+        self.name = name
+        self.delay_s = delay_s
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, stream: bool = False, timeout=None, cancel=None, params=None) -> str:
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay_s)
+        with self._lock:
+            self.active -= 1
+        return f"{self.name}: {prompt}"
+
+
+def _app(router: FakeRouter, **overrides) -> RelayApp:
+    return make_app(router, batch_wait_ms=0, **overrides)
+
+
+def test_slow_backend_does_not_block_other_lanes():
+    slow = _Backend("slow", delay_s=1.0)
+    fast = _Backend("fast")
+    app = _app(FakeRouter({"slow": slow, "fast": fast}))
+    pending = app.submit_chat("hello", model="slow")
+    started = time.perf_counter()
+    result = app.handle_chat("hi", model="fast")
+    assert time.perf_counter() - started < 0.5
+    assert result["reply"] == "fast: hi"
+    assert pending.result(timeout=5)["reply"] == "slow: hello"
+    assert set(app.metrics_report()["lanes"]) == {"backend:slow", "backend:fast"}
+
+
+def test_lane_concurrency_comes_from_backend_config():
+    backend = _Backend("local", delay_s=0.2)
+    router = FakeRouter({"local": backend}, concurrency={"local": 3})
+    app = _app(router, batch_policy="fixed", batch_size=1)
+    futures = [app.submit_chat(f"p{i}", model="local") for i in range(6)]
+    for future in futures:
+        future.result(timeout=5)
+    assert backend.peak == 3
+    lane = app.metrics_report()["lanes"]["backend:local"]
+    assert lane["concurrency"] == 3
+    assert lane["requests"] == 6
+
+
+def test_lane_batches_queued_items_and_survives_errors():
+    batches = []
+    gate = threading.Event()
+
+    def process(batch):
+        gate.wait(5)
+        batches.append(len(batch))
+        if len(batches) == 1:
+            raise RuntimeError("upstream exploded")
+        for item in batch:
+            item.future.set_result(len(batch))
+
+    lane = DispatchLane("test", process, concurrency=1, policy=FixedBatching(4))
+    first = SimpleNamespace(future=Future())
+    lane.put(first)
+    time.sleep(0.05)
+    rest = [SimpleNamespace(future=Future()) for _ in range(3)]
+    for item in rest:
+        lane.put(item)
+    gate.set()
+    with pytest.raises(RuntimeError):
+        first.future.result(timeout=5)
+    assert [item.future.result(timeout=5) for item in rest] == [3, 3, 3]
+    assert batches == [1, 3]
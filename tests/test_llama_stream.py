@@ -0,0 +1,95 @@
+"""Tests for relaying llama.cpp streams as their events arrive."""
+from __future__ import annotations
+
+import dataclasses
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import pytest
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.queue.channel import END
+from relayserve.internal.runner.runner import LlamaServerClient, StreamTiming
+from relayserve.internal.server.app import RelayApp
+
+_PAUSE_S = 0.5
+
+
+class _SlowSSE(BaseHTTPRequestHandler):
+    """Sends one token, pauses, then sends the rest."""
+
+    protocol_version = "HTTP/1.1"
+    payloads: list = []
+
+    def do_POST(self) -> None:
+        self.payloads.append(json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0))))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._event({"choices": [{"index": 0, "delta": {"content": "first"}}]})
+        time.sleep(_PAUSE_S)
+        self._event({"choices": [{"index": 0, "delta": {"content": " second"}}]})
+        self._frame(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _event(self, chunk: dict) -> None:
+        self._frame(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+
+    def _frame(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+@pytest.fixture()
+def endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowSSE)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_chat_stream_yields_each_event_as_it_arrives(endpoint):
+    client = LlamaServerClient([endpoint])
+    timing = StreamTiming()
+    started = time.perf_counter()
+    chunks = client.chat_stream("hi", "req-1", "relay-model", timing=timing)
+    first = next(chunks)
+    assert time.perf_counter() - started < _PAUSE_S
+    assert first["id"] == "req-1" and first["model"] == "relay-model"
+    assert first["choices"][0]["delta"]["content"] == "first"
+    assert [c["choices"][0]["delta"]["content"] for c in chunks] == [" second"]
+    assert 0.0 <= timing.ttfb_ms() < _PAUSE_S * 1000.0
+
+
+def test_relayed_stream_reports_upstream_and_relay_latency(endpoint):
+    settings = dataclasses.replace(Settings.from_env(), backends=[endpoint])
+    app = RelayApp(settings)
+    started = time.perf_counter()
+    channel = app.submit_stream("hi", "req-1")
+    first = channel.get(timeout=5)
+    assert time.perf_counter() - started < _PAUSE_S
+    assert first["choices"][0]["delta"]["content"] == "first"
+    while channel.get(timeout=5) is not END:
+        pass
+    assert app.wait_idle(timeout=5)
+    streaming = app.metrics_report()["streaming"]
+    assert streaming["count"] == 1
+    assert streaming["avg_relay_ttft_ms"] >= streaming["avg_upstream_ttfb_ms"]
+    assert streaming["avg_relay_added_ms"] < _PAUSE_S * 1000.0
+
+
+def test_chat_stream_forwards_sampling_fields(endpoint):
+    client = LlamaServerClient([endpoint])
+    _SlowSSE.payloads.clear()
+    chunks = client.chat_stream("hi", "req-1", "relay-model", params={"temperature": 0, "max_tokens": 8})
+    assert len(list(chunks)) == 2
+    sent = _SlowSSE.payloads[-1]
+    assert (sent["temperature"], sent["max_tokens"], sent["model"]) == (0, 8, "relay-model")
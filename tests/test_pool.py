@@ -0,0 +1,158 @@
+"""Tests for the keep-alive upstream connection pool."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socket
+import threading
+import time
+
+import pytest
+
+from relayserve.internal.runner.pool import ConnectionPool, UpstreamHTTPError, _healthy
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/fail":
+            self._reply(503, b"busy")
+        elif self.path == "/slow":
+            time.sleep(1.0)
+            self._reply(200, b"late")
+        elif self.path == "/sse":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for frame in (b"data: one\n\n", b"data: [DONE]\n\n"):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+            self.wfile.write(b"0\r\n\r\n")
+        elif self.path == "/trickle":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for _ in range(1000):
+                    frame = b"data: token\n\n"
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+                    self.wfile.flush()
+                    time.sleep(0.03)
+            except OSError:
+                return
+        else:
+            self._reply(200, b'{"ok": true}')
+
+    def _reply(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+@pytest.fixture()
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _pool(server, **kwargs) -> ConnectionPool:
+    return ConnectionPool("http", "127.0.0.1", server.server_address[1], **kwargs)
+
+
+def _post(pool: ConnectionPool, path: str = "/", **kwargs) -> bytes:
+    with pool.request("POST", path, body=b"{}", **kwargs) as resp:
+        return resp.read()
+
+
+def test_sequential_requests_reuse_one_connection(server):
+    pool = _pool(server)
+    for _ in range(3):
+        assert _post(pool) == b'{"ok": true}'
+    report = pool.report()
+    assert (report["created"], report["reused"], report["idle"]) == (1, 2, 1)
+
+
+def test_idle_connections_expire(server):
+    now = [0.0]
+    pool = _pool(server, idle_timeout_s=10, clock=lambda: now[0])
+    _post(pool)
+    now[0] = 11.0
+    _post(pool)
+    report = pool.report()
+    assert (report["created"], report["evicted_idle"]) == (2, 1)
+
+
+def test_connection_closed_by_the_server_fails_the_health_check(server):
+    pool = _pool(server)
+    _post(pool)
+    _, conn = pool._idle[-1]
+    # Half-closing our side makes the server's handler see EOF and close too,
+    # as it would after its own keep-alive timeout.
+    conn.sock.shutdown(socket.SHUT_WR)
+    for _ in range(200):
+        if not _healthy(conn):
+            break
+        time.sleep(0.01)
+    assert _post(pool) == b'{"ok": true}'
+    report = pool.report()
+    assert (report["created"], report["evicted_unhealthy"]) == (2, 1)
+
+
+def test_error_status_raises_and_keeps_the_drained_connection(server):
+    pool = _pool(server)
+    with pytest.raises(UpstreamHTTPError) as excinfo:
+        _post(pool, "/fail")
+    assert excinfo.value.status == 503
+    assert pool.report()["idle"] == 1
+
+
+def test_read_timeout_is_separate_from_connect_timeout(server):
+    pool = _pool(server)
+    started = time.perf_counter()
+    with pytest.raises(OSError):
+        _post(pool, "/slow", read_timeout=0.2, connect_timeout=5.0)
+    assert time.perf_counter() - started < 0.9
+
+
+def test_pool_keeps_at_most_max_size_idle_connections(server):
+    pool = _pool(server, max_size=1)
+    first = pool.request("POST", "/", body=b"{}")
+    second = pool.request("POST", "/", body=b"{}")
+    for resp in (first, second):
+        resp.read()
+        resp.close()
+    report = pool.report()
+    assert (report["created"], report["idle"], report["discarded"]) == (2, 1, 1)
+
+
+def test_stream_closed_after_done_is_drained_and_reused(server):
+    pool = _pool(server)
+    with pool.request("POST", "/sse", body=b"{}") as resp:
+        while resp.readline() != b"data: [DONE]\n":
+            pass
+        resp.mark_complete()
+    assert pool.report()["idle"] == 1
+    assert _post(pool) == b'{"ok": true}'
+    assert pool.report()["reused"] == 1
+
+
+def test_stream_closed_before_its_end_is_shut_down_not_drained(server):
+    pool = _pool(server)
+    resp = pool.request("POST", "/trickle", body=b"{}")
+    for _ in range(3):
+        assert resp.readline() == b"data: token\n"
+        assert resp.readline() == b"\n"
+    started = time.perf_counter()
+    resp.close()
+    assert time.perf_counter() - started < 0.2
+    assert pool.report()["idle"] == 0
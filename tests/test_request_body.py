@@ -0,0 +1,90 @@
+"""Tests for bounded request-body parsing."""
+from __future__ import annotations
+
+import dataclasses
+import http.client
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+os.environ.setdefault("RELAYSERVE_BACKENDS", "")
+os.environ.setdefault("RELAYSERVE_PORT", "0")
+
+from relayserve.internal.codec import json_codec
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.server.app import RelayApp
+from relayserve.internal.server.http_server import _make_handler
+
+
+def _start_server(**overrides) -> tuple[ThreadingHTTPServer, int]:
+    settings = dataclasses.replace(Settings.from_env(), **overrides)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(RelayApp(settings)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def test_oversized_content_length_rejected_before_body_is_read():
+    server, port = _start_server(max_body_bytes=64)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.putrequest("POST", "/v1/chat/completions")
+        conn.putheader("Content-Type", "application/json")
+        conn.putheader("Content-Length", str(10 * 1024 * 1024))
+        conn.endheaders()
+        resp = conn.getresponse()
+        assert resp.status == 413
+        assert json.loads(resp.read()) == {"error": "body_too_large"}
+        assert resp.getheader("Connection") == "close"
+        conn.close()
+    finally:
+        server.shutdown()
+
+
+def test_chunked_body_is_parsed():
+    server, port = _start_server()
+    try:
+        body = json.dumps({"messages": [{"role": "user", "content": "Hi"}]}).encode("utf-8")
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request(
+            "POST",
+            "/v1/chat/completions",
+            iter([body[:10], body[10:]]),
+            {"Content-Type": "application/json", "Accept": "application/json"},
+            encode_chunked=True,
+        )
+        resp = conn.getresponse()
+        assert resp.status == 200
+        assert json.loads(resp.read())["choices"][0]["message"]["content"]
+        conn.close()
+    finally:
+        server.shutdown()
+
+
+def test_chunked_body_over_limit_rejected():
+    server, port = _start_server(max_body_bytes=16)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request(
+            "POST",
+            "/v1/chat/completions",
+            iter([b"x" * 10, b"y" * 10]),
+            {"Content-Type": "application/json"},
+            encode_chunked=True,
+        )
+        resp = conn.getresponse()
+        assert resp.status == 413
+        conn.close()
+    finally:
+        server.shutdown()
+
+
+def test_codec_round_trip_and_decode_error():
+    assert json_codec.loads(json_codec.dumps({"a": [1, "é"]})) == {"a": [1, "é"]}
+    for bad in (b"not json", b"\xff"):
+        try:
+            json_codec.loads(bad)
+        except json_codec.JSONDecodeError:
+            pass
+        else:
+            raise AssertionError("expected JSONDecodeError")
@@ -0,0 +1,191 @@
+"""Tests for the two-tier response cache and its use in the request path."""
+from __future__ import annotations
+
+import http.client
+from http.server import ThreadingHTTPServer
+import json
+import threading
+
+import pytest
+
+from relayserve.internal.cache import response_cache
+from relayserve.internal.cache.response_cache import ResponseCache
+from relayserve.internal.server.app import RelayApp, UpstreamUnavailableError
+from relayserve.internal.server.http_server import _make_handler
+from tests.conftest import FakeClock, make_app
+
+
+def test_memory_tier_is_a_byte_bounded_lru():
+    cache = ResponseCache(max_bytes=120, ttl_s=60)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"reply": "x" * 20})
+    assert cache.get("a") is not None  # "a" is now the most recent
+    cache.put("d", {"reply": "x" * 20})
+    assert cache.get("b") is None
+    assert cache.get("a")[1] == "memory"
+    report = cache.report()
+    assert report["evictions"] == 1
+    assert report["bytes"] <= 120
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock(1000.0)
+    cache = ResponseCache(max_bytes=1024, ttl_s=10, clock=clock)
+    cache.put("k", {"reply": "hi"})
+    clock.now += 5
+    assert cache.get("k") == ({"reply": "hi"}, "memory")
+    clock.now += 6
+    assert cache.get("k") is None
+    assert cache.report()["expirations"] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = ResponseCache(max_bytes=1024, ttl_s=60, path=path)
+    first.put("k", {"reply": "hi"})
+    first.close()
+    second = ResponseCache(max_bytes=1024, ttl_s=60, path=path)
+    assert second.get("k") == ({"reply": "hi"}, "disk")
+    assert second.get("k") == ({"reply": "hi"}, "memory")
+    assert second.get("other") is None
+    report = second.report()
+    assert (report["disk_hits"], report["memory_hits"], report["misses"]) == (1, 1, 1)
+    assert report["hit_ratio"] == 2 / 3
+    second.close()
+
+
+def test_memory_hits_do_not_wait_on_disk_io(tmp_path):
+    cache = ResponseCache(max_bytes=1024, ttl_s=60, path=str(tmp_path / "cache.db"))
+    cache.put("k", {"reply": "hello"})
+    with cache._db_lock:  # as if another thread were writing the disk tier
+        assert cache.get("k") == ({"reply": "hello"}, "memory")
+    cache.close()
+
+
+def test_disk_tier_is_trimmed_oldest_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "_DISK_SWEEP_EVERY", 1)
+    clock = FakeClock(1000.0)
+    cache = ResponseCache(
+        max_bytes=0, ttl_s=60, path=str(tmp_path / "cache.sqlite"), disk_max_bytes=100, clock=clock
+    )
+    for index in range(5):
+        clock.now += 1
+        cache.put(f"k{index}", {"reply": "x" * 20})
+    assert cache.get("k0") is None
+    assert cache.get("k4") == ({"reply": "x" * 20}, "disk")
+    assert cache.report()["disk_evictions"] >= 1
+    cache.close()
+
+
+class _CountingBackend:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.params = []
+
+    def generate(self, prompt: str, stream: bool = False, timeout=None, cancel=None, params=None):
+        self.calls += 1
+        self.params.append(params)
+        if stream:
+            return iter([{"content": "cached "}, {"content": "answer"}])
+        return "cached answer"
+
+
+def _app(backend) -> RelayApp:
+    return make_app(backend, 1, cache_path="")
+
+
+def test_repeated_request_is_served_from_cache_and_replayed_as_a_stream():
+    backend = _CountingBackend()
+    app = _app(backend)
+    first = app.handle_chat("hi", key="k")
+    assert "cache" not in first["meta"]
+    second = app.handle_chat("hi", key="k")
+    assert second["reply"] == "cached answer"
+    assert second["meta"]["cache"] == "memory"
+    assert list(app.submit_stream("hi", "req-1", key="k")) == ["cached answer"]
+    assert backend.calls == 1
+    assert app.metrics_report()["cache"]["memory_hits"] == 2
+
+
+def test_streamed_reply_is_cached_once_complete():
+    backend = _CountingBackend()
+    app = _app(backend)
+    assert list(app.submit_stream("hi", "req-1", key="k")) == ["cached ", "answer"]
+    assert app.wait_idle(timeout=5)
+    assert app.handle_chat("hi", key="k")["reply"] == "cached answer"
+    assert backend.calls == 1
+
+
+def test_failed_requests_are_not_cached():
+    class _Failing(_CountingBackend):
+        def generate(self, prompt, stream=False, timeout=None, cancel=None, params=None):
+            self.calls += 1
+            raise ConnectionError("down")
+
+    backend = _Failing()
+    app = _app(backend)
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError):
+            app.handle_chat("hi", key="k")
+    assert backend.calls == 2
+
+
+def _serve_http(app: RelayApp) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(app))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _post_chat(port: int, payload: dict) -> tuple[int, dict]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    conn.request("POST", "/v1/chat/completions", json.dumps(payload), headers)
+    resp = conn.getresponse()
+    status, body = resp.status, json.loads(resp.read())
+    conn.close()
+    return status, body
+
+
+def test_sampling_fields_the_key_depends_on_reach_the_backend():
+    backend = _CountingBackend()
+    server = _serve_http(_app(backend))
+    messages = [{"role": "user", "content": "hi"}]
+    try:
+        port = server.server_address[1]
+        sampled = {"messages": messages, "temperature": 0, "max_completion_tokens": 5, "stop": "\n"}
+        assert _post_chat(port, sampled)[0] == 200
+        status, body = _post_chat(port, {"messages": messages, "temperature": "hot"})
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert backend.params == [{"temperature": 0, "max_tokens": 5, "stop": ["\n"]}]
+    assert (status, body) == (400, {"error": "invalid_temperature"})
+
+
+def _stream_events(port: int) -> list[dict]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    payload = {"messages": [{"role": "user", "content": "hi"}], "temperature": 0, "stream": True}
+    conn.request("POST", "/v1/chat/completions", json.dumps(payload), {"Content-Type": "application/json"})
+    body = conn.getresponse().read().decode("utf-8")
+    conn.close()
+    events = [line[6:] for line in body.split("\n") if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    return [json.loads(event) for event in events[:-1]]
+
+
+def test_replayed_stream_ends_like_the_live_one():
+    backend = _CountingBackend()
+    app = _app(backend)
+    server = _serve_http(app)
+    try:
+        live = _stream_events(server.server_address[1])
+        assert app.wait_idle(timeout=5)
+        replayed = _stream_events(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert backend.calls == 1
+    for events in (live, replayed):
+        assert "".join(e["choices"][0]["delta"].get("content", "") for e in events) == "cached answer"
+        assert events[-1]["choices"][0] == {"index": 0, "delta": {}, "finish_reason": "stop"}
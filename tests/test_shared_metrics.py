@@ -0,0 +1,37 @@
+"""Tests for fleet-wide metrics shared between worker processes."""
+from __future__ import annotations
+
+import os
+import unittest
+
+from relayserve.internal.metrics.shared import SharedMetrics
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "requires fork()")
+def test_workers_publish_into_one_fleet_view():
+    shared = SharedMetrics(2)
+    pid = os.fork()
+    if pid == 0:
+        shared.bind(1)
+        shared.publish({"count": 3, "ttft_ms": 30.0, "queue_ms": 3.0, "kv_handoffs": 2})
+        os._exit(0)
+    os.waitpid(pid, 0)
+    shared.bind(0)
+    shared.publish({"count": 1, "ttft_ms": 10.0, "queue_ms": 1.0, "kv_handoffs": 1})
+
+    report = shared.report()
+    assert report["workers"] == 2
+    assert report["count"] == 4
+    assert report["avg_ttft_ms"] == 10.0
+    assert report["kv"]["handoffs"] == 3
+    assert [w["count"] for w in report["by_worker"]] == [1, 3]
+    assert report["by_worker"][1]["pid"] == pid
+
+
+def test_publish_keeps_unspecified_fields():
+    shared = SharedMetrics(1)
+    shared.publish({"count": 2, "tokens": 7})
+    shared.publish({"count": 5})
+    slot = shared.slots()[0]
+    assert slot["count"] == 5
+    assert slot["tokens"] == 7
@@ -0,0 +1,124 @@
+"""Tests for the coalescing SSE writer."""
+from __future__ import annotations
+
+import json
+
+from relayserve.internal.server.sse import SSEWriter
+from tests.conftest import FakeClock
+
+
+def _writer(clock: FakeClock, **kwargs) -> tuple[SSEWriter, list[bytes]]:
+    out: list[bytes] = []
+    writer = SSEWriter(lambda view: out.append(bytes(view)), "req-1", "m", clock=clock, **kwargs)
+    return writer, out
+
+
+def _events(data: bytes) -> list[str]:
+    return [line[6:] for line in data.decode("utf-8").split("\n") if line.startswith("data: ")]
+
+
+def test_delta_frame_matches_json_encoding():
+    writer, out = _writer(FakeClock())
+    writer.delta('say "hi"\n')
+    expected = {
+        "id": "req-1",
+        "object": "chat.completion.chunk",
+        "model": "m",
+        "choices": [{"index": 0, "delta": {"content": 'say "hi"\n'}, "finish_reason": None}],
+    }
+    assert out == [("data: " + json.dumps(expected) + "\n\n").encode("utf-8")]
+
+
+def test_deltas_within_interval_coalesce_into_one_frame():
+    clock = FakeClock()
+    writer, out = _writer(clock, flush_interval_s=0.05)
+    writer.delta("a")  # first delta is written immediately
+    for token in ("b", " ", "c"):
+        clock.now += 0.01
+        writer.delta(token)
+    assert len(out) == 1
+    assert writer.due_in() is not None
+    clock.now += 0.05
+    writer.delta("d")
+    assert len(out) == 2
+    content = json.loads(_events(out[1])[0])["choices"][0]["delta"]["content"]
+    assert content == "b cd"
+
+
+def test_size_bound_forces_flush():
+    clock = FakeClock()
+    writer, out = _writer(clock, flush_interval_s=10.0, max_frame_bytes=4)
+    writer.delta("x")
+    writer.delta("yy")
+    assert len(out) == 1
+    writer.delta("zz")
+    assert len(out) == 2
+
+
+def test_done_writes_held_deltas_a_stop_chunk_and_marker_in_one_write():
+    clock = FakeClock()
+    writer, out = _writer(clock, flush_interval_s=10.0)
+    writer.delta("a")
+    writer.delta("b")
+    writer.done()
+    assert len(out) == 2
+    held, stop, done = _events(out[1])
+    assert json.loads(held)["choices"][0]["delta"] == {"content": "b"}
+    assert json.loads(stop) == {
+        "id": "req-1",
+        "object": "chat.completion.chunk",
+        "model": "m",
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+    }
+    assert done == "[DONE]"
+
+
+def test_llama_content_chunks_coalesce_like_deltas():
+    clock = FakeClock()
+    writer, out = _writer(clock, flush_interval_s=0.05)
+
+    def chunk(delta: dict, finish_reason=None) -> dict:
+        return {
+            "id": "req-1",
+            "object": "chat.completion.chunk",
+            "created": 1,
+            "model": "m",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    writer.send(chunk({"role": "assistant", "content": None}))
+    for token in ("a", "b", "c"):
+        writer.send(chunk({"content": token}))
+    writer.send(chunk({}, finish_reason="stop"))
+    events = [json.loads(event) for data in out for event in _events(data)]
+    assert [event["choices"][0]["delta"] for event in events] == [
+        {"role": "assistant", "content": None},
+        {"content": "abc"},
+        {},
+    ]
+    # The held deltas go out in the same write as the final chunk.
+    assert len(out) == 2
+    writer.done()
+    # The stream already finished, so no second stop chunk.
+    assert _events(out[-1]) == ["[DONE]"]
+
+
+def test_chunked_framing_round_trips():
+    clock = FakeClock()
+    writer, out = _writer(clock, chunked=True)
+    writer.delta("hello")
+    writer.event({"id": "req-1", "choices": []})
+    writer.done()
+    body = b"".join(out)
+    decoded = b""
+    while True:
+        size_line, body = body.split(b"\r\n", 1)
+        size = int(size_line, 16)
+        if size == 0:
+            assert body == b"\r\n"
+            break
+        decoded += body[:size]
+        assert body[size:size + 2] == b"\r\n"
+        body = body[size + 2:]
+    assert _events(decoded)[-1] == "[DONE]"
+    assert len(_events(decoded)) == 4
@@ -0,0 +1,95 @@
+"""Tests for streaming requests dispatched through the lanes."""
+from __future__ import annotations
+
+import threading
+import time
+from queue import Empty
+
+import pytest
+
+from relayserve.internal.queue.admission import OverloadedError
+from relayserve.internal.queue.channel import END, StreamChannel
+from tests.conftest import make_app
+
+
+class _StreamingBackend:
+    def __init__(self, words: int = 5) -> None:
+        self.words = words
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def generate(self, prompt: str, stream: bool = False, timeout=None, cancel=None, params=None):
+        if not stream:
+            return "done"
+        return self._stream()
+
+    def _stream(self):
+        try:
+            for index in range(self.words):
+                self.produced += 1
+                yield {"content": f"w{index} "}
+        finally:
+            self.closed.set()
+
+
+def test_stream_runs_on_lane_and_is_recorded():
+    app = make_app(_StreamingBackend(words=3))
+    channel = app.submit_stream("hi", "req-1")
+    assert list(channel) == ["w0 ", "w1 ", "w2 "]
+    assert app.wait_idle(timeout=2)
+    report = app.metrics_report()
+    assert report["lanes"]["backend:local:stream"]["requests"] == 1
+    assert report["stats"]["count"] == 1
+
+
+def test_slow_consumer_backpressures_upstream_and_cancel_stops_it():
+    backend = _StreamingBackend(words=1000)
+    app = make_app(backend, stream_buffer_events=4)
+    channel = app.submit_stream("hi", "req-2")
+    assert channel.get(timeout=2) == "w0 "
+    time.sleep(0.1)
+    # Four buffered, one taken, one blocked in put.
+    assert backend.produced <= 6
+    channel.cancel()
+    assert backend.closed.wait(2)
+    assert app.wait_idle(timeout=2)
+
+
+def test_streams_are_shed_by_admission():
+    app = make_app(_StreamingBackend(), max_queue_depth=1)
+    app.admission.admit(1)
+    with pytest.raises(OverloadedError):
+        app.submit_stream("hi", "req-3")
+
+
+def test_channel_get_times_out_then_ends():
+    channel = StreamChannel(maxsize=2)
+    with pytest.raises(Empty):
+        channel.get(timeout=0.01)
+    channel.put("a")
+    channel.finish()
+    assert channel.get(timeout=0) == "a"
+    assert channel.get(timeout=0) is END
+
+
+class _SlowStart:
+    def generate(self, prompt: str, stream: bool = False, timeout=None, cancel=None, params=None):
+        return self._stream()
+
+    def _stream(self):
+        time.sleep(0.3)
+        yield {"content": "first"}
+        time.sleep(0.3)
+        yield {"content": "second"}
+
+
+def test_streams_beyond_lane_concurrency_do_not_wait_for_each_other():
+    app = make_app(_SlowStart(), lane_concurrency=2)
+    started = time.perf_counter()
+    channels = [app.submit_stream("hi", f"req-{i}") for i in range(8)]
+    assert [channel.get(timeout=5) for channel in channels] == ["first"] * 8
+    assert time.perf_counter() - started < 0.55
+    for channel in channels:
+        assert list(channel) == ["second"]
+    assert app.wait_idle(timeout=2)
+    assert app.metrics_report()["lanes"]["backend:local:stream"]["concurrency"] == 512
@@ -14,13 +14,13 @@ os.environ.setdefault("RELAYSERVE_BACKENDS", "")
 os.environ.setdefault("RELAYSERVE_PORT", "0")
 
 from relayserve.internal.config.settings import Settings
-from relayserve.internal.server.app import build_app
+from relayserve.internal.server.app import RelayApp
 from relayserve.internal.server.http_server import _make_handler
 
 
 def _start_server() -> tuple[ThreadingHTTPServer, int]:
     settings = Settings.from_env()
-    app = build_app(settings)
+    app = RelayApp(settings)
     handler_factory = _make_handler(app)
     server = ThreadingHTTPServer(("127.0.0.1", 0), handler_factory)
     port = server.server_address[1]
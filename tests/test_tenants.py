@@ -0,0 +1,98 @@
+"""Tests for per-tenant weighted fair queuing and token budgets."""
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+from relayserve.internal.config.settings import Settings
+from relayserve.internal.queue.queue import RequestQueue
+from relayserve.internal.queue.tenants import TenantConfig, TenantPolicy, tenant_from_headers
+from relayserve.internal.server.app import RelayApp
+from tests.conftest import FakeClock
+
+
+def _drain(queue: RequestQueue) -> list:
+    out = []
+    while len(queue):
+        out.append(queue.dequeue())
+    return out
+
+
+def test_late_tenant_is_not_stuck_behind_a_bulk_backlog():
+    queue = RequestQueue()
+    for index in range(6):
+        queue.enqueue(f"bulk{index}", tenant="bulk", cost=10)
+    queue.enqueue("web0", tenant="web", cost=10)
+    queue.enqueue("web1", tenant="web", cost=10)
+    order = _drain(queue)
+    assert order.index("web0") <= 1
+    assert order.index("web1") <= 3
+    assert [item for item in order if item.startswith("bulk")] == [f"bulk{i}" for i in range(6)]
+
+
+def test_weights_set_each_tenants_share():
+    weights = {"a": 3.0, "b": 1.0}
+    queue = RequestQueue(weight=weights.get)
+    for index in range(12):
+        queue.enqueue(("a", index), tenant="a", cost=5)
+        queue.enqueue(("b", index), tenant="b", cost=5)
+    first = [queue.dequeue()[0] for _ in range(8)]
+    assert first.count("a") == 6
+
+
+def test_over_budget_items_only_use_spare_capacity():
+    queue = RequestQueue()
+    queue.enqueue("bulk-over", tenant="bulk", cost=1, over_budget=True)
+    queue.enqueue("web", tenant="web", cost=50)
+    assert queue.peek() == "web"
+    assert _drain(queue) == ["web", "bulk-over"]
+
+
+def test_removed_item_takes_its_own_tag_with_it():
+    queue = RequestQueue()
+    queue.enqueue("bulk-in", tenant="bulk", cost=1)
+    queue.enqueue("bulk-over", tenant="bulk", cost=1, over_budget=True)
+    queue.enqueue("web", tenant="web", cost=5)
+    assert queue.remove("bulk-in", tenant="bulk")
+    # The over-budget item keeps its flag, so the in-budget tenant goes first.
+    assert _drain(queue) == ["web", "bulk-over"]
+
+
+def test_token_bucket_refills_per_minute():
+    clock = FakeClock(100.0)
+    policy = TenantPolicy({"bulk": TenantConfig(tokens_per_minute=60)}, clock=clock)
+    assert policy.charge("bulk", 50) is False
+    assert policy.charge("bulk", 20) is False
+    assert policy.charge("bulk", 1) is True
+    clock.now += 20.0
+    assert policy.charge("bulk", 1) is False
+    assert policy.charge("web", 10_000) is False
+    assert policy.report()["bulk"]["over_budget"] == 1
+
+
+def test_spec_and_header_parsing():
+    policy = TenantPolicy.from_spec("web:4, bulk:1:20000", default_tokens_per_minute=500)
+    assert policy.weight("web") == 4.0
+    assert policy.weight("someone") == 1.0
+    assert policy._configs["web"].tokens_per_minute == 500
+    assert policy._configs["bulk"].tokens_per_minute == 20000
+    with pytest.raises(ValueError):
+        TenantPolicy.from_spec("web:fast")
+
+    assert tenant_from_headers({"X-Tenant-ID": "web"}, "X-Tenant-ID") == "web"
+    keyed = tenant_from_headers({"Authorization": "Bearer sk-secret"}, "X-Tenant-ID")
+    assert keyed.startswith("key-") and "secret" not in keyed
+    assert tenant_from_headers({}, "X-Tenant-ID") == "default"
+
+
+def test_app_reports_per_tenant_latency():
+    settings = dataclasses.replace(Settings.from_env(), backends=[], tenants="web:4")
+    app = RelayApp(settings)
+    app.handle_chat("hello", tenant="web")
+    app.handle_chat("hello there", tenant="bulk")
+    tenants = app.metrics_report()["tenants"]
+    assert tenants["web"]["completed"] == 1
+    assert tenants["web"]["weight"] == 4.0
+    assert tenants["bulk"]["queued"] == 0
+    assert tenants["bulk"]["avg_queue_ms"] >= 0.0
@@ -0,0 +1,172 @@
+"""Tests for sending a batch of requests upstream as one multi-prompt call."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import pytest
+
+from backends.backend_interface import Backend
+from backends.local_backend import LocalBackend
+from backends.modal_backend import ModalBackend
+from backends.replica_set import ReplicaSet
+from backends.vllm_backend import VllmBackend
+from relayserve.internal.runner.cancel import CancelToken, all_cancelled
+from relayserve.internal.server.app import RelayApp
+from tests.conftest import make_app
+
+
+class _Batching(Backend):
+    supports_batch = True
+
+    def __init__(self, fail_batches: bool = False, unanswered: tuple = ()) -> None:
+        self.gate = threading.Event()
+        self.batches: list[list[str]] = []
+        self.singles: list[str] = []
+        self.fail_batches = fail_batches
+        self.unanswered = unanswered
+
+    def generate(self, prompt, stream=False, timeout=None, cancel=None, params=None):
+        self.gate.wait(5)
+        self.singles.append(prompt)
+        return f"single: {prompt}"
+
+    def generate_batch(self, prompts, timeout=None, cancel=None, params=None):
+        self.batches.append(list(prompts))
+        if self.fail_batches:
+            raise ConnectionError("batch call failed")
+        return [None if p in self.unanswered else f"batched: {p}" for p in prompts]
+
+
+def _run(backend: _Batching) -> tuple[RelayApp, list[dict]]:
+    app = make_app(backend, 1, batch_policy="fixed", batch_size=4, batch_wait_ms=0)
+    # The first request holds the lane's only worker so the next four queue up.
+    blocker = app.submit_chat("first", model="local", key="first")
+    time.sleep(0.05)
+    futures = [app.submit_chat(f"prompt {i}", model="local", key=f"prompt {i}") for i in range(4)]
+    time.sleep(0.05)
+    backend.gate.set()
+    blocker.result(timeout=5)
+    return app, [future.result(timeout=5) for future in futures]
+
+
+def test_queued_batch_goes_upstream_as_one_call():
+    backend = _Batching()
+    app, results = _run(backend)
+    assert backend.batches == [[f"prompt {i}" for i in range(4)]]
+    assert [result["reply"] for result in results] == [f"batched: prompt {i}" for i in range(4)]
+    assert all(result["meta"]["batch_size"] == 4 for result in results)
+    assert app.metrics_report()["upstream_batches"] == {"calls": 1, "requests": 4, "avg_size": 4.0}
+
+
+def test_batched_replies_are_cached():
+    app, _ = _run(_Batching())
+    assert app.cache.get("first") is not None
+    assert all(app.cache.get(f"prompt {i}")[0]["reply"] == f"batched: prompt {i}" for i in range(4))
+
+
+def test_prompt_the_batch_call_left_unanswered_is_served_alone():
+    backend = _Batching(unanswered=("prompt 2",))
+    app, results = _run(backend)
+    assert backend.singles == ["first", "prompt 2"]
+    assert [result["reply"] for result in results][1:3] == ["batched: prompt 1", "single: prompt 2"]
+    assert app.metrics_report()["upstream_batches"]["requests"] == 3
+
+
+def test_failed_batch_call_serves_requests_one_by_one():
+    backend = _Batching(fail_batches=True)
+    _, results = _run(backend)
+    assert len(backend.batches) == 1
+    assert [result["reply"] for result in results] == [f"single: prompt {i}" for i in range(4)]
+
+
+def test_capability_flag():
+    assert VllmBackend("http://a").supports_batch
+    assert not ModalBackend("http://a").supports_batch
+    assert not ReplicaSet({"a": VllmBackend("http://a"), "b": ModalBackend("http://b")}).supports_batch
+
+
+def test_shared_call_is_cancelled_only_when_every_request_is():
+    tokens = [CancelToken(), CancelToken()]
+    combined = all_cancelled(tokens)
+    tokens[0].cancel()
+    assert not combined.cancelled
+    tokens[1].cancel()
+    assert combined.cancelled
+
+
+_TEMPLATE = "<s>[USER] {} [/USER]"
+
+
+class _Completions(BaseHTTPRequestHandler):
+    """vLLM's and llama.cpp's endpoints for templating and completing prompts."""
+
+    protocol_version = "HTTP/1.1"
+    requests: list[dict] = []
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        type(self).requests.append({"path": self.path, "body": body})
+        if self.path == "/tokenize":
+            # Stand-in "tokens": the characters of the rendered chat.
+            text = _TEMPLATE.format(body["messages"][0]["content"])
+            out = {"tokens": [ord(c) for c in text]}
+        elif self.path == "/detokenize":
+            out = {"prompt": "".join(chr(t) for t in body["tokens"])}
+        elif self.path == "/apply-template":
+            out = {"prompt": _TEMPLATE.format(body["messages"][0]["content"])}
+        else:
+            choices = [
+                {"index": i, "text": f" reply to {p}"}
+                for i, p in enumerate(body["prompt"])
+                if "unanswered" not in p
+            ]
+            out = {"choices": list(reversed(choices))}
+        out = json.dumps(out).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+@pytest.fixture()
+def completions_url():
+    _Completions.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Completions)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_vllm_sends_templated_prompts_and_orders_choices_by_index(completions_url):
+    backend = VllmBackend(completions_url)
+    templated = [f"<s>[USER] {p} [/USER]" for p in ("a", "b", "c")]
+    assert backend.generate_batch(["a", "b", "c"]) == [f"reply to {p}" for p in templated]
+    backend.generate_batch(["d", "e"], params={"temperature": 0, "max_tokens": 8})
+    paths = [request["path"] for request in _Completions.requests]
+    # The template is rendered once and reused.
+    assert paths == ["/tokenize", "/detokenize", "/v1/completions", "/v1/completions"]
+    first, second = (request["body"] for request in _Completions.requests[2:])
+    assert first == {
+        "max_tokens": None,
+        "add_special_tokens": False,
+        "model": "default",
+        "prompt": templated,
+        "stream": False,
+    }
+    assert (second["temperature"], second["max_tokens"]) == (0, 8)
+
+
+def test_llama_cpp_batch_uses_the_servers_chat_template(completions_url):
+    backend = LocalBackend(completions_url)
+    assert backend.generate_batch(["a", "unanswered"]) == ["reply to <s>[USER] a [/USER]", None]
+    paths = [request["path"] for request in _Completions.requests]
+    assert paths == ["/apply-template", "/v1/completions"]